@@ -61,6 +61,8 @@ users: {
     create: `${API_BASE_URL}/api/guild/create`,
     leave: `${API_BASE_URL}/api/guild/leave`,
     me: `${API_BASE_URL}/api/guild/me`,
+    membership: (guildName: string) =>
+      `${API_BASE_URL}/api/guild/membership?guild_name=${encodeURIComponent(guildName)}`,
     invite: `${API_BASE_URL}/api/guild/invite`,
     reset: `${API_BASE_URL}/api/guild/reset`,
     search: (keyword: string) =>
@@ -9,7 +9,7 @@ export default function GuildDetailPage() {
   const [error, setError] = useState("");
   interface Guild {
     guild_name: string;
-    members: string[];
+    member_count: number;
     owner_name: string;
   }
 
@@ -31,7 +31,15 @@ export default function GuildDetailPage() {
         const exact = data.find((g: Guild) => g.guild_name === name);
         if (exact) {
           setGuild(exact);
-          setIsMember(exact.members?.includes(user?._id));
+
+          // Danh sách thành viên không còn nằm trong guild: hỏi server user có thuộc guild không
+          if (accessToken) {
+            const memberRes = await fetch(API_ENDPOINTS.guilds.membership(exact.guild_name), {
+              headers: { Authorization: `Bearer ${accessToken}` },
+            });
+            const membership = memberRes.ok ? await memberRes.json() : { is_member: false };
+            setIsMember(membership.is_member);
+          }
 
         } else {
           router.replace("/404");
@@ -44,7 +52,7 @@ export default function GuildDetailPage() {
     };
 
     fetchGuild();
-  }, [name, router, user?._id]);
+  }, [name, router, user?._id, accessToken]);
 
   const handleJoin = async () => {
     if (!guild?.guild_name) {
@@ -75,7 +83,7 @@ export default function GuildDetailPage() {
     if (user?._id) {
       setGuild((prev) => prev && ({
         ...prev,
-        members: [...prev.members, user._id],
+        member_count: prev.member_count + 1,
       }));
     }
     setIsMember(true);
@@ -120,7 +128,7 @@ export default function GuildDetailPage() {
     if (user?._id) {
       setGuild((prev) => prev && ({
         ...prev,
-        members: prev.members.filter((id: string) => id !== user._id),
+        member_count: Math.max(prev.member_count - 1, 0),
       }));
     }
     setIsMember(false);
@@ -171,7 +179,7 @@ export default function GuildDetailPage() {
            <div>
              <p className="text-lg font-bold mb-2">👾 Member</p>
              <p className="text-sm text-gray-400">
-               {guild?.members ? `${guild.members.length} member${guild.members.length !== 1 ? 's' : ''}` : '0 members'}
+               {`${guild.member_count ?? 0} member${guild.member_count !== 1 ? 's' : ''}`}
              </p>
            </div>
 
@@ -141,7 +141,7 @@ export default function Dashboard() {
                     <div className="text-lg font-bold">{guild.guild_name}</div>
                   </div>
                   <p className="text-sm text-gray-400 mb-3">
-                    {guild.members.length} member{guild.members.length > 1 ? "s" : ""}
+                    {guild.member_count} member{guild.member_count > 1 ? "s" : ""}
                   </p>
                 </div>
               ))}
@@ -167,7 +167,7 @@ export default function Dashboard() {
                     <div className="text-lg font-bold">{guild.guild_name}</div>
                   </div>
                   <p className="text-sm text-gray-400 mb-2">
-                    {guild.members.length} member{guild.members.length > 1 ? "s" : ""}
+                    {guild.member_count} member{guild.member_count > 1 ? "s" : ""}
                   </p>
                   {guild.description && (
                     <p className="text-sm text-gray-500 italic mb-3">{guild.description}</p>
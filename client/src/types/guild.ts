@@ -4,6 +4,6 @@ export interface Guild {
   description?: string | null;
   owner_id: string;
   owner_name?: string;
-  members: string[];
+  member_count: number;
   created_at: string;
 }
@@ -26,9 +26,62 @@ class Settings(BaseSettings):
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "repai_kickin")
 
     # === JWT ===
-    SECRET_KEY: str = os.getenv("JWT_SECRET", "supersecret")
+    # JWT_KEY là biến môi trường mà token đang được ký; JWT_SECRET giữ lại cho tương thích
+    SECRET_KEY: str = os.getenv("JWT_KEY", os.getenv("JWT_SECRET", "default_secret_key"))
     ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "180"))  # 3 giờ
+    JWT_CACHE_MAX_SIZE: int = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+
+    # === Password hashing (bcrypt chạy ngoài event loop) ===
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_TARGET_MS: int = int(os.getenv("PASSWORD_HASH_TARGET_MS", "0"))  # 0 = không calibrate
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+    # === Auth user cache (JWTAuthMiddleware) ===
+    AUTH_USER_CACHE_MAX_SIZE: int = int(os.getenv("AUTH_USER_CACHE_MAX_SIZE", "10000"))
+    AUTH_USER_CACHE_TTL: int = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+
+    # === Wallet pool (ví tạo sẵn cho đăng ký) ===
+    WALLET_POOL_SIZE: int = int(os.getenv("WALLET_POOL_SIZE", "200"))
+    WALLET_POOL_BATCH_SIZE: int = int(os.getenv("WALLET_POOL_BATCH_SIZE", "20"))
+    WALLET_POOL_WORKERS: int = int(os.getenv("WALLET_POOL_WORKERS", "2"))
+    WALLET_POOL_REFILL_INTERVAL: int = int(os.getenv("WALLET_POOL_REFILL_INTERVAL", "30"))
+    WALLET_POOL_REFILL_LEASE_SECONDS: int = int(os.getenv("WALLET_POOL_REFILL_LEASE_SECONDS", "120"))
+
+    # === Phân trang danh sách guild ===
+    GUILD_PAGE_SIZE_DEFAULT: int = int(os.getenv("GUILD_PAGE_SIZE_DEFAULT", "20"))
+    GUILD_PAGE_SIZE_MAX: int = int(os.getenv("GUILD_PAGE_SIZE_MAX", "100"))
+    GUILD_BULK_INVITE_MAX: int = int(os.getenv("GUILD_BULK_INVITE_MAX", "100"))
+    GUILD_EVENTS_QUEUE_SIZE: int = int(os.getenv("GUILD_EVENTS_QUEUE_SIZE", "100"))
+    GUILD_EVENTS_OVERFLOW: str = os.getenv("GUILD_EVENTS_OVERFLOW", "disconnect")  # drop | disconnect
+    GUILD_EVENTS_HEARTBEAT: int = int(os.getenv("GUILD_EVENTS_HEARTBEAT", "15"))
+    GUILD_EVENTS_TOKEN_TTL: int = int(os.getenv("GUILD_EVENTS_TOKEN_TTL", "60"))  # giây, token ?token= cho EventSource
+    GUILD_STATS_RECOMPUTE_INTERVAL: int = int(os.getenv("GUILD_STATS_RECOMPUTE_INTERVAL", "3600"))  # 0 = tắt
+    GUILD_LEADERBOARD_MAX: int = int(os.getenv("GUILD_LEADERBOARD_MAX", "100"))
+    LEADERBOARD_PAGE_SIZE_MAX: int = int(os.getenv("LEADERBOARD_PAGE_SIZE_MAX", "100"))
+    LEADERBOARD_AROUND_MAX: int = int(os.getenv("LEADERBOARD_AROUND_MAX", "50"))
+    LEADERBOARD_SNAPSHOT_INTERVAL: int = int(os.getenv("LEADERBOARD_SNAPSHOT_INTERVAL", "300"))  # 0 = tắt
+    LEADERBOARD_SNAPSHOT_MAX_AGE: int = int(os.getenv("LEADERBOARD_SNAPSHOT_MAX_AGE", "3600"))
+    LEADERBOARD_SNAPSHOT_LEASE_SECONDS: int = int(os.getenv("LEADERBOARD_SNAPSHOT_LEASE_SECONDS", "900"))  # > LEADERBOARD_SNAPSHOT_INTERVAL
+    LEADERBOARD_RELOAD_INTERVAL: int = int(os.getenv("LEADERBOARD_RELOAD_INTERVAL", "300"))  # 0 = chỉ nạp khi startup / rollover
+    LEADERBOARD_ROLLOVER_CHECK_INTERVAL: int = int(os.getenv("LEADERBOARD_ROLLOVER_CHECK_INTERVAL", "60"))  # 0 = tắt
+    USER_HISTORY_PAGE_SIZE_MAX: int = int(os.getenv("USER_HISTORY_PAGE_SIZE_MAX", "100"))
+    WEEK_ROLLOVER_CHUNK_SIZE: int = int(os.getenv("WEEK_ROLLOVER_CHUNK_SIZE", "1000"))
+    WEEK_ROLLOVER_LEASE_SECONDS: int = int(os.getenv("WEEK_ROLLOVER_LEASE_SECONDS", "300"))
+    WEEK_ROLLOVER_CHECK_INTERVAL: int = int(os.getenv("WEEK_ROLLOVER_CHECK_INTERVAL", "3600"))  # 0 = tắt
+
+    # === Skill catalog (cache trong bộ nhớ) ===
+    SKILL_CATALOG_TTL: int = int(os.getenv("SKILL_CATALOG_TTL", "600"))
+    SKILL_CATALOG_MISS_RELOAD_INTERVAL: int = int(os.getenv("SKILL_CATALOG_MISS_RELOAD_INTERVAL", "5"))
+
+    # === Email outbox ===
+    EMAIL_OUTBOX_BATCH_SIZE: int = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+    EMAIL_OUTBOX_POLL_INTERVAL: int = int(os.getenv("EMAIL_OUTBOX_POLL_INTERVAL", "10"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "30"))
+    EMAIL_OUTBOX_LEASE_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "300"))
+    EMAIL_SMTP_IDLE_TIMEOUT: int = int(os.getenv("EMAIL_SMTP_IDLE_TIMEOUT", "60"))
 
     # === Cache (nếu có dùng middleware cache) ===
     CACHE_ENABLED: bool = True
@@ -37,6 +90,8 @@ class Settings(BaseSettings):
     CACHE_EXCLUDED_PATHS: List[str] = [
         "/api/ws/*",
         "/api/me",
+        "/metrics",
+        "/health",
     ]
 
     # === Logging ===
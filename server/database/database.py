@@ -3,6 +3,7 @@ from config.settings import settings
 from utils.logger import api_logger
 from dotenv import load_dotenv
 from pymongo.server_api import ServerApi
+from database.indexes import reconcile_indexes
 import asyncio
 import certifi
 import os
@@ -71,7 +72,7 @@ async def init_db():
     """Gọi khi startup: kết nối & khởi tạo index nếu cần"""
     try:
         db = await get_database()
-        await db.guilds.create_index("guild_name", unique=True)
+        await reconcile_indexes(db)
     except Exception as e:
         api_logger.error(f"❌ init_db() failed: {str(e)}")
         raise
@@ -91,8 +92,30 @@ async def get_guilds_collection():
     db = await get_database()
     return db.guilds
 
+async def get_guild_members_collection():
+    db = await get_database()
+    return db.guild_members
+
 async def get_skills_collection():
     db = await get_database()
     return db.skills
 
+async def get_wallets_collection():
+    db = await get_database()
+    return db.wallets
+
+async def get_email_outbox_collection():
+    db = await get_database()
+    return db.email_outbox
+
+async def get_guild_stats_collection():
+    db = await get_database()
+    return db.guild_stats
 
+async def get_leaderboard_snapshots_collection():
+    db = await get_database()
+    return db.leaderboard_snapshots
+
+async def get_job_checkpoints_collection():
+    db = await get_database()
+    return db.job_checkpoints
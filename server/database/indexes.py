@@ -0,0 +1,270 @@
+"""
+Registry khai báo toàn bộ index của các collection.
+
+init_db() gọi reconcile_indexes() lúc startup: tạo index còn thiếu (idempotent) và báo
+index bị lệch định nghĩa (drift) hoặc index thừa không có trong registry.
+
+CLI (chạy từ thư mục server):
+    python -m database.indexes                 # tạo index thiếu, in báo cáo drift
+    python -m database.indexes --fix           # build lại index bị drift
+    python -m database.indexes --drop-extra    # xoá index không có trong registry
+    python -m database.indexes --check-plans   # explain() các query chính, báo COLLSCAN
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from utils.logger import db_logger
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Guest có email null nên chỉ unique với email là string khác rỗng.
+        # Dùng $gt "" (thay vì $type) để query {"email": <str>} dùng được partial index.
+        IndexModel([("email", ASCENDING)], unique=True, partialFilterExpression={"email": {"$gt": ""}}),
+    ],
+    "guilds": [
+        IndexModel([("guild_name", ASCENDING)], unique=True),
+        IndexModel([("owner_id", ASCENDING)]),
+        IndexModel([("member_count", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # Search: mỗi nhóm xếp hạng một index, sort (member_count, _id) đi theo index
+        IndexModel([("name_normalized", ASCENDING), ("member_count", DESCENDING), ("_id", ASCENDING)]),
+        IndexModel([("name_tokens", ASCENDING), ("member_count", DESCENDING), ("_id", ASCENDING)]),
+        IndexModel([("search_tokens", ASCENDING), ("member_count", DESCENDING), ("_id", ASCENDING)]),
+    ],
+    "guild_members": [
+        IndexModel([("guild_id", ASCENDING), ("user_id", ASCENDING)], unique=True),
+        IndexModel([("guild_id", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "guild_stats": [
+        IndexModel([("total_points", DESCENDING), ("_id", ASCENDING)]),
+    ],
+    "leaderboard_snapshots": [
+        IndexModel([("snapshot_id", ASCENDING)]),
+    ],
+    "skills": [
+        IndexModel([("type", ASCENDING)]),
+    ],
+    "user_match_history": [
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)]),
+    ],
+    "user_mystery_box_history": [
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)]),
+    ],
+    "user_week_history": [
+        IndexModel([("user_id", ASCENDING), ("week", DESCENDING)], unique=True),
+        IndexModel([("week", ASCENDING)]),
+    ],
+    "user_invite_codes": [
+        IndexModel([("user_id", ASCENDING), ("code", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("_id", DESCENDING)]),
+    ],
+    "wallets": [
+        IndexModel([("status", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "email_outbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)]),
+        IndexModel([("claim_id", ASCENDING)], sparse=True),
+    ],
+}
+
+# Unique index chặn email trùng khi đăng ký (partial: bỏ qua guest không có email)
+USERS_EMAIL_INDEX = "email_1"
+
+# (collection, tên index) đã được reconcile xác nhận tồn tại đúng định nghĩa trong process này
+_confirmed: Set[Tuple[str, str]] = set()
+
+# Option của index được so sánh khi phát hiện drift
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+# Query cố định của service: (collection, filter, sort). --check-plans chạy explain() từng query
+_STATIC_QUERY_SHAPES = [
+    ("users", {"email": "player@example.com"}, None),
+    ("guilds", {"guild_name": "guild"}, None),
+    ("guilds", {"owner_id": "owner"}, None),
+    ("guilds", {"_id": {"$in": [ObjectId()]}}, None),
+    ("guild_members", {"guild_id": ObjectId(), "user_id": "user"}, None),
+    ("guild_members", {"guild_id": ObjectId()}, [("_id", 1)]),
+    ("guild_members", {"user_id": "user"}, [("_id", 1)]),
+    ("guild_stats", {}, [("total_points", -1), ("_id", 1)]),
+    ("skills", {"type": "kicker"}, None),
+    ("user_week_history", {"user_id": {"$in": ["user"]}, "week": {"$in": ["2025-01"]}}, None),
+    ("user_week_history", {"week": {"$in": ["2025-01"]}}, None),
+    ("wallets", {"status": "available"}, [("_id", 1)]),
+]
+
+
+def query_shapes() -> List[Tuple[str, Dict[str, Any], Optional[List[Tuple[str, int]]]]]:
+    """
+    Query cố định + query sinh từ đúng các hàm dựng filter của service (kể cả điều kiện
+    keyset của trang sau), nên đổi query trong service mà thiếu index thì --check-plans báo.
+    Import service tại chỗ: service import database.database, module đó lại import file này.
+    """
+    from services import email_outbox, guild_service, leaderboard, user_history
+    from utils.text_search import normalize_name, search_terms
+
+    now = datetime.utcnow()
+    last_id = ObjectId()
+    shapes = list(_STATIC_QUERY_SHAPES)
+
+    for after in (None, (5, now, last_id), (5, None, last_id)):
+        shapes.append(("guilds", guild_service._explore_query(5, after), guild_service.EXPLORE_SORT))
+    for keyword in ("rong do", "★★"):
+        for _, tier_query in guild_service._search_tiers(normalize_name(keyword), search_terms(keyword)):
+            for after in (None, (3, last_id)):
+                shapes.append(("guilds", guild_service._search_page_query(tier_query, after), guild_service.SEARCH_SORT))
+
+    shapes.append(("email_outbox", email_outbox._claim_filter(now), email_outbox.CLAIM_SORT))
+    shapes.append(("email_outbox", {"claim_id": "claim"}, email_outbox.CLAIM_SORT))
+
+    for kind, collection in user_history.HISTORY_COLLECTIONS.items():
+        sample_last = "2025-01" if kind in user_history._KEY_FIELDS else last_id
+        for last in (None, sample_last):
+            shapes.append((collection, *user_history._history_query(kind, "user", last)))
+
+    for snapshot_id in ("snapshot", {"$ne": "snapshot"}):
+        shapes.append(("leaderboard_snapshots", leaderboard._snapshot_chunks_query(snapshot_id), None))
+    return shapes
+
+
+def index_confirmed(collection: str, name: str) -> bool:
+    """True nếu reconcile đã xác nhận index tồn tại (vd. unique index mà code dựa vào để chặn trùng)"""
+    return (collection, name) in _confirmed
+
+
+def _spec(index: IndexModel) -> Dict[str, Any]:
+    document = index.document
+    spec = {"key": list(document["key"].items())}
+    for option in _COMPARED_OPTIONS:
+        if option in document:
+            spec[option] = document[option]
+    return spec
+
+
+def _existing_spec(info: Dict[str, Any]) -> Dict[str, Any]:
+    spec = {"key": [(field, direction) for field, direction in info["key"]]}
+    for option in _COMPARED_OPTIONS:
+        if option in info:
+            spec[option] = info[option]
+    return spec
+
+
+async def _reconcile_collection(collection, wanted: List[IndexModel], fix: bool, drop_extra: bool) -> Dict[str, List[str]]:
+    existing = await collection.index_information()
+    report = {"created": [], "drift": [], "extra": [], "rebuilt": [], "dropped": []}
+    missing = []
+
+    for index in wanted:
+        name = index.document["name"]
+        if name not in existing:
+            missing.append(index)
+        elif _existing_spec(existing[name]) != _spec(index):
+            report["drift"].append(name)
+            if fix:
+                await collection.drop_index(name)
+                missing.append(index)
+                report["rebuilt"].append(name)
+
+    if missing:
+        await collection.create_indexes(missing)
+        report["created"] += [i.document["name"] for i in missing if i.document["name"] not in report["rebuilt"]]
+
+    # Index khớp registry (có sẵn hoặc vừa build xong) coi như đã có thể dựa vào
+    for index in wanted:
+        name = index.document["name"]
+        if name not in report["drift"] or name in report["rebuilt"]:
+            _confirmed.add((collection.name, name))
+
+    wanted_names = {i.document["name"] for i in wanted}
+    for name in existing:
+        if name == "_id_" or name in wanted_names:
+            continue
+        report["extra"].append(name)
+        if drop_extra:
+            await collection.drop_index(name)
+            report["dropped"].append(name)
+
+    return report
+
+
+async def reconcile_indexes(db, fix: bool = False, drop_extra: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Đồng bộ index của mọi collection trong registry (chạy song song). Trả về báo cáo.
+    Một collection lỗi (vd. build unique index thất bại vì dữ liệu trùng) chỉ được log và ghi
+    vào report["error"], không chặn các collection khác hay phần còn lại của startup.
+    """
+    names = list(INDEXES)
+    reports = await asyncio.gather(*[
+        _reconcile_collection(db[name], INDEXES[name], fix, drop_extra) for name in names
+    ], return_exceptions=True)
+    result = {}
+
+    for name, report in zip(names, reports):
+        if isinstance(report, BaseException):
+            db_logger.error(f"❌ {name}: index reconcile failed: {str(report)}")
+            result[name] = {"error": [str(report)]}
+            continue
+        result[name] = report
+        if report["created"]:
+            db_logger.info(f"🗂️ {name}: created indexes {report['created']}")
+        if report["drift"] and not fix:
+            db_logger.warning(f"⚠️ {name}: index drift {report['drift']} (run python -m database.indexes --fix)")
+        if report["extra"] and not drop_extra:
+            db_logger.warning(f"⚠️ {name}: indexes not in registry {report['extra']}")
+    return result
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages += _plan_stages(plan[child_key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def check_query_plans(db) -> List[str]:
+    """explain() các query trong query_shapes(), trả về danh sách query bị COLLSCAN"""
+    collscans = []
+    for collection_name, query, sort in query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(f"{collection_name} {query} sort={sort}")
+    return collscans
+
+
+async def main():
+    from database.database import get_database, close_db
+
+    parser = argparse.ArgumentParser(description="Đồng bộ index MongoDB theo registry")
+    parser.add_argument("--fix", action="store_true", help="build lại index bị drift")
+    parser.add_argument("--drop-extra", action="store_true", help="xoá index không có trong registry")
+    parser.add_argument("--check-plans", action="store_true", help="báo query chính nào bị COLLSCAN")
+    args = parser.parse_args()
+
+    db = await get_database()
+    try:
+        report = await reconcile_indexes(db, fix=args.fix, drop_extra=args.drop_extra)
+        for name, collection_report in report.items():
+            print(name, {k: v for k, v in collection_report.items() if v})
+
+        if args.check_plans:
+            collscans = await check_query_plans(db)
+            for line in collscans:
+                print("❌ COLLSCAN:", line)
+            if collscans:
+                raise SystemExit(1)
+            print("✅ No COLLSCAN in service queries")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,22 @@ from routes.users import router as user_router
 from config.settings import settings
 from database.database import init_db, close_db
 from middleware.jwt_auth import JWTAuthMiddleware
+from middleware.error_logging import ErrorLoggingMiddleware
+from middleware.response_cache import ResponseCacheMiddleware
+from utils.auth_cache import user_cache
+from utils.jwt import verified_token_cache
+from utils.password import password_hasher, init_password_hasher, close_password_hasher
+from services.wallet_pool import start_wallet_pool, stop_wallet_pool
+from services.email_outbox import start_email_outbox, stop_email_outbox
+from services.skill_catalog import skill_catalog
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.response_cache import response_cache
+from services.guild_events import guild_event_bus
+from services.guild_stats import start_guild_stats, stop_guild_stats
+from services.leaderboard import player_leaderboard, start_leaderboard, stop_leaderboard
+from routes.leaderboard import router as leaderboard_router
+from routes.history import router as history_router
+from services.week_rollover import start_week_rollover, stop_week_rollover
 
 
 # ✅ Lifespan event handler
@@ -16,12 +32,25 @@ async def lifespan(app: FastAPI):
     try:
         await init_db()
         print("✅ DB Initialized")
+        print("✅ Skill catalog loaded:", await skill_catalog.reload())
     except Exception as e:
         import traceback
         print("❌ Error in init_db:", str(e))
         traceback.print_exc()
+    await init_password_hasher()
+    start_wallet_pool()
+    start_email_outbox()
+    start_guild_stats()
+    await start_leaderboard()
+    start_week_rollover()
     yield
     print("🛑 Shutting down...")
+    await stop_week_rollover()
+    await stop_leaderboard()
+    await stop_guild_stats()
+    await stop_email_outbox()
+    await stop_wallet_pool()
+    close_password_hasher()
     await close_db()
 
 
@@ -43,16 +72,12 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal server error", "error": str(exc)},
     )
 
-@app.middleware("http")
-async def log_requests(request, call_next):
-    try:
-        response = await call_next(request)
-        return response
-    except Exception as e:
-        import traceback
-        print("🔥 Middleware caught error:", str(e))
-        traceback.print_exc()
-        raise e
+# ✅ Log lỗi chưa xử lý (trong cùng, ngay trước router)
+app.add_middleware(ErrorLoggingMiddleware)
+
+# ✅ Cache response của GET public (nằm trong CORS để header CORS luôn tính theo request)
+if settings.CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware)
 
 print("🧪 CORS_ORIGINS =", settings.CORS_ORIGINS)
 
@@ -64,6 +89,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.add_middleware(JWTAuthMiddleware)
@@ -71,6 +97,8 @@ app.add_middleware(JWTAuthMiddleware)
 # ✅ Include guild routes
 app.include_router(guild_router, prefix="/api", tags=["guild"])
 app.include_router(user_router, prefix="/api", tags=["user"])
+app.include_router(leaderboard_router, prefix="/api", tags=["leaderboard"])
+app.include_router(history_router, prefix="/api", tags=["history"])
 
 # ✅ Default route
 from fastapi.responses import JSONResponse
@@ -80,6 +108,19 @@ async def root():
     return {"ok": True}
 
 
+if settings.ENABLE_METRICS:
+    @app.get("/metrics")
+    async def metrics():
+        return {
+            "auth_user_cache": user_cache.stats(),
+            "jwt_cache": verified_token_cache.stats(),
+            "password_hasher": password_hasher.stats(),
+            "response_cache": response_cache.stats(),
+            "guild_events": guild_event_bus.stats(),
+            "leaderboard": player_leaderboard.stats(),
+        }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
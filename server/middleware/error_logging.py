@@ -0,0 +1,21 @@
+import traceback
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class ErrorLoggingMiddleware:
+    """ASGI middleware in ra traceback của exception chưa được xử lý rồi ném lại"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        except Exception as e:
+            print("🔥 Middleware caught error:", str(e))
+            traceback.print_exc()
+            raise
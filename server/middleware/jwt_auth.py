@@ -1,15 +1,14 @@
-from fastapi import Request
 from fastapi.responses import JSONResponse
-from jose import jwt, JWTError
-from starlette.middleware.base import BaseHTTPMiddleware
+from jose import JWTError
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Receive, Scope, Send
 from bson import ObjectId
-import os
+from typing import Dict, Iterable, Optional
 
 from database.database import get_users_collection
-
-# Cấu hình JWT
-SECRET_KEY = os.getenv("JWT_KEY", "default_secret_key")
-ALGORITHM = "HS256"
+from models.user import AuthPrincipal
+from utils.auth_cache import get_cached_user, cache_user
+from utils.jwt import decode_access_token
 
 # Những route public không cần kiểm tra token
 PUBLIC_ROUTES = [
@@ -33,46 +32,122 @@ PUBLIC_ROUTES = [
     "/api/x/callback",
     "/api/guild/explore",
     "/api/guild/search",
+    "/api/guild/leaderboard",
 ]
 
 
-class JWTAuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Cho phép request OPTIONS (CORS preflight)
-        if request.method == "OPTIONS":
-            return await call_next(request)
+# Route nhận token qua query ?token= (EventSource không gửi được header) -> scope bắt buộc.
+# Chỉ chấp nhận token ngắn hạn có đúng scope (utils.jwt.create_scoped_token), không nhận
+# access token thường để token dài hạn không nằm trong URL / log.
+QUERY_TOKEN_ROUTES: Dict[str, str] = {
+    "/api/guild/events": "guild_events",
+}
+
+
+class PublicRouteTable:
+    """
+    Trie theo từng segment của path, dựng một lần khi khởi tạo middleware.
+    Một path là public nếu nó bằng hoặc nằm dưới một route trong PUBLIC_ROUTES.
+    """
+
+    _END = ""  # segment rỗng không bao giờ xuất hiện sau khi split path đã strip "/"
+
+    def __init__(self, routes: Iterable[str]):
+        self._root: dict = {}
+        for route in routes:
+            node = self._root
+            for part in route.strip("/").split("/"):
+                node = node.setdefault(part, {})
+            node[self._END] = True
+
+    def is_public(self, path: str) -> bool:
+        node = self._root
+        for part in path.strip("/").split("/"):
+            if self._END in node:
+                return True
+            node = node.get(part)
+            if node is None:
+                return False
+        return self._END in node
+
 
-        # Cho phép các route public không cần xác thực
-        if any(request.url.path.startswith(route.rstrip("/")) for route in PUBLIC_ROUTES):
-            return await call_next(request)
+def _unauthorized(detail: str) -> JSONResponse:
+    return JSONResponse(status_code=401, content={"detail": detail})
 
-        # Kiểm tra Authorization header
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return JSONResponse(status_code=401, content={"detail": "Not authorized to access this resource"})
 
-        token = auth_header.replace("Bearer ", "")
+class JWTAuthMiddleware:
+    """ASGI middleware xác thực Bearer token và gắn user vào request.state"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        public_routes: Iterable[str] = PUBLIC_ROUTES,
+        query_token_routes: Dict[str, str] = QUERY_TOKEN_ROUTES,
+    ):
+        self.app = app
+        self.public_routes = PublicRouteTable(public_routes)
+        self.query_token_routes = dict(query_token_routes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Bỏ qua websocket/lifespan, request OPTIONS (CORS preflight) và route public
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or self.public_routes.is_public(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        error_response = await self.authenticate(scope)
+        if error_response is not None:
+            await error_response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def authenticate(self, scope: Scope) -> Optional[JSONResponse]:
+        """Trả về response 401 nếu xác thực thất bại, ngược lại gắn user vào scope"""
+        # Kiểm tra Authorization header, hoặc ?token= với route trong QUERY_TOKEN_ROUTES
+        auth_header = Headers(scope=scope).get("Authorization")
+        required_scope = None
+        if auth_header and auth_header.startswith("Bearer "):
+            token = auth_header.replace("Bearer ", "")
+        else:
+            required_scope = self.query_token_routes.get(scope["path"].rstrip("/"))
+            token = QueryParams(scope.get("query_string", b"")).get("token") if required_scope else None
+            if not token:
+                return _unauthorized("Not authorized to access this resource")
 
         try:
-            # Giải mã token
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            # Giải mã token (có cache các token đã verify)
+            payload = decode_access_token(token)
+            # Token qua query phải có đúng scope; token có scope không dùng được như access token
+            if payload.get("scope") != required_scope:
+                return _unauthorized("Invalid token")
             user_id = payload.get("_id")
             if not user_id:
-                return JSONResponse(status_code=401, content={"detail": "Token missing user ID"})
-
-            users_collection = await get_users_collection()
-            user = await users_collection.find_one({"_id": ObjectId(user_id)})
+                return _unauthorized("Token missing user ID")
 
-            if not user:
-                return JSONResponse(status_code=401, content={"detail": "User not found"})
+            user = get_cached_user(user_id)
+            if user is None:
+                users_collection = await get_users_collection()
+                user_doc = await users_collection.find_one(
+                    {"_id": ObjectId(user_id)}, AuthPrincipal.PROJECTION
+                )
 
-            # Gắn user và token vào request để sử dụng sau này
-            request.state.user = user
-            request.state.token = token
+                if not user_doc:
+                    return _unauthorized("User not found")
+                user = AuthPrincipal.from_document(user_doc)
+                cache_user(user_id, user)
 
         except JWTError:
-            return JSONResponse(status_code=401, content={"detail": "Invalid token"})
+            return _unauthorized("Invalid token")
         except Exception as e:
-            return JSONResponse(status_code=401, content={"detail": f"Authentication failed: {str(e)}"})
+            return _unauthorized(f"Authentication failed: {str(e)}")
 
-        return await call_next(request)
+        # Gắn principal và token vào request.state để sử dụng sau này
+        state = scope.setdefault("state", {})
+        state["user"] = user
+        state["token"] = token
+        state["token_claims"] = payload
+        return None
@@ -0,0 +1,60 @@
+from fnmatch import fnmatch
+from typing import Iterable
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config.settings import settings
+from middleware.jwt_auth import PUBLIC_ROUTES, PublicRouteTable
+from utils.response_cache import response_cache, tag_for_path
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware cache response 200 của các GET public (không cần token, nên không
+    phụ thuộc user) có trong allowlist CACHEABLE_PATHS (kèm tag để invalidate).
+    Path khớp CACHE_EXCLUDED_PATHS (hỗ trợ *) không bao giờ được cache.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        public_routes: Iterable[str] = PUBLIC_ROUTES,
+        excluded_paths: Iterable[str] = settings.CACHE_EXCLUDED_PATHS,
+    ):
+        self.app = app
+        self.public_routes = PublicRouteTable(public_routes)
+        self.excluded_paths = list(excluded_paths)
+
+    def _is_cacheable(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return False
+        path = scope["path"]
+        if tag_for_path(path) is None or not self.public_routes.is_public(path):
+            return False
+        return not any(fnmatch(path, pattern) for pattern in self.excluded_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if not self._is_cacheable(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = response_cache.make_key(scope["path"], scope.get("query_string", b""))
+        cached = response_cache.get(key)
+        if cached is not None:
+            status, headers, body = cached
+            await send({"type": "http.response.start", "status": status, "headers": headers + [(b"x-cache", b"HIT")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start_message: dict = {}
+        body_parts = []
+
+        async def send_and_store(message: Message):
+            if message["type"] == "http.response.start":
+                start_message.update(message)
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-cache", b"MISS")]}
+            elif message["type"] == "http.response.body":
+                body_parts.append(message.get("body", b""))
+                if not message.get("more_body", False) and start_message.get("status") == 200:
+                    response_cache.set(key, (200, list(start_message.get("headers", [])), b"".join(body_parts)))
+            await send(message)
+
+        await self.app(scope, receive, send_and_store)
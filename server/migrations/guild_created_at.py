@@ -0,0 +1,32 @@
+"""
+Backfill `created_at` cho guild cũ chưa có field này, lấy từ thời điểm tạo trong _id.
+
+Chạy từ thư mục server:  python -m migrations.guild_created_at
+Keyset phân trang guild (member_count, created_at, _id) cần created_at trên mọi guild.
+Một update pipeline phía server, chỉ chạm guild còn thiếu nên chạy lại được nhiều lần.
+"""
+import asyncio
+from database.database import init_db, close_db, get_guilds_collection
+from utils.logger import api_logger
+
+
+async def backfill_created_at() -> int:
+    guilds = await get_guilds_collection()
+    result = await guilds.update_many(
+        {"created_at": None},
+        [{"$set": {"created_at": {"$toDate": "$_id"}}}],
+    )
+    return result.modified_count
+
+
+async def main():
+    await init_db()
+    try:
+        updated = await backfill_created_at()
+        api_logger.info(f"✅ created_at backfilled on {updated} guilds")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
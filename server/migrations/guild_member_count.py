@@ -0,0 +1,50 @@
+"""
+Đặt lại `member_count` của mọi guild theo số document trong `guild_members`.
+
+Chạy từ thư mục server:  python -m migrations.guild_member_count
+Dùng để backfill guild cũ và sửa lệch (drift) nếu có; chỉ ghi guild có giá trị sai.
+"""
+import asyncio
+from pymongo import UpdateOne
+from database.database import init_db, close_db, get_guilds_collection, get_guild_members_collection
+from utils.logger import api_logger
+
+
+async def backfill_member_count(batch_size: int = 500) -> int:
+    guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
+
+    counts = {
+        row["_id"]: row["count"]
+        async for row in members.aggregate([
+            {"$group": {"_id": "$guild_id", "count": {"$sum": 1}}},
+        ])
+    }
+
+    updated = 0
+    batch = []
+    async for guild in guilds.find({}, {"member_count": 1}):
+        count = counts.get(guild["_id"], 0)
+        if guild.get("member_count") == count:
+            continue
+        batch.append(UpdateOne({"_id": guild["_id"]}, {"$set": {"member_count": count}}))
+        if len(batch) >= batch_size:
+            updated += (await guilds.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await guilds.bulk_write(batch, ordered=False)).modified_count
+
+    return updated
+
+
+async def main():
+    await init_db()
+    try:
+        updated = await backfill_member_count()
+        api_logger.info(f"✅ member_count fixed on {updated} guilds")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
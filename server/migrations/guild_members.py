@@ -0,0 +1,53 @@
+"""
+Chuyển mảng `members` nhúng trong guild sang collection `guild_members`.
+
+Chạy từ thư mục server:  python -m migrations.guild_members
+Chạy lại nhiều lần vẫn an toàn: membership được upsert, guild đã chuyển thì không còn `members`.
+"""
+import asyncio
+from pymongo import UpdateOne
+from database.database import init_db, close_db, get_guilds_collection, get_guild_members_collection
+from utils.logger import api_logger
+
+
+async def migrate_guild_members(batch_size: int = 500) -> int:
+    guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
+    migrated = 0
+
+    cursor = guilds.find({"members": {"$exists": True}}, {"members": 1, "created_at": 1})
+    async for guild in cursor:
+        member_ids = list(dict.fromkeys(guild.get("members") or []))
+        # Guild cũ có thể chưa có created_at (xem migrations.guild_created_at): lấy theo _id
+        joined_at = guild.get("created_at") or guild["_id"].generation_time
+        for i in range(0, len(member_ids), batch_size):
+            await members.bulk_write([
+                UpdateOne(
+                    {"guild_id": guild["_id"], "user_id": user_id},
+                    {"$setOnInsert": {"joined_at": joined_at}},
+                    upsert=True,
+                )
+                for user_id in member_ids[i:i + batch_size]
+            ], ordered=False)
+
+        member_count = await members.count_documents({"guild_id": guild["_id"]})
+        await guilds.update_one(
+            {"_id": guild["_id"]},
+            {"$set": {"member_count": member_count}, "$unset": {"members": ""}},
+        )
+        migrated += 1
+
+    return migrated
+
+
+async def main():
+    await init_db()
+    try:
+        migrated = await migrate_guild_members()
+        api_logger.info(f"✅ Migrated members of {migrated} guilds to guild_members")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
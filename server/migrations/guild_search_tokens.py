@@ -0,0 +1,39 @@
+"""
+Tính lại các field search (name_normalized, name_tokens, search_tokens) cho mọi guild.
+
+Chạy từ thư mục server:  python -m migrations.guild_search_tokens
+Cần chạy một lần cho guild tạo trước khi có search index, và khi đổi cách tách token.
+"""
+import asyncio
+from pymongo import UpdateOne
+from database.database import init_db, close_db, get_guilds_collection
+from utils.logger import api_logger
+from utils.text_search import build_search_fields
+
+
+async def rebuild_search_tokens(batch_size: int = 500) -> int:
+    guilds = await get_guilds_collection()
+    updated = 0
+    batch = []
+    async for guild in guilds.find({}, {"guild_name": 1, "description": 1}):
+        fields = build_search_fields(guild["guild_name"], guild.get("description"))
+        batch.append(UpdateOne({"_id": guild["_id"]}, {"$set": fields}))
+        if len(batch) >= batch_size:
+            updated += (await guilds.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await guilds.bulk_write(batch, ordered=False)).modified_count
+    return updated
+
+
+async def main():
+    await init_db()
+    try:
+        updated = await rebuild_search_tokens()
+        api_logger.info(f"✅ Search tokens rebuilt on {updated} guilds")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+"""
+Dựng `guild_stats` cho các guild đã có (tổng điểm, số thành viên, tổng trận thắng).
+
+Chạy từ thư mục server:  python -m migrations.guild_stats
+Cùng logic với task recompute định kỳ (GUILD_STATS_RECOMPUTE_INTERVAL), chạy được nhiều lần.
+"""
+import asyncio
+from database.database import init_db, close_db
+from services.guild_stats import recompute_guild_stats
+from utils.logger import api_logger
+
+
+async def main():
+    await init_db()
+    try:
+        count = await recompute_guild_stats()
+        api_logger.info(f"✅ guild_stats built for {count} guilds")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""
+Chuyển các mảng lịch sử trong users (match_history, mystery_box_history, week_history,
+used_invite_codes) sang các collection lịch sử riêng, rồi $unset khỏi document user.
+
+Chạy từ thư mục server:  python -m migrations.user_history
+Đi theo batch _id và chỉ đọc user còn mảng cũ. Chạy lại được nhiều lần: entry match /
+mystery box của batch dở dang được xoá (cờ migrated) trước khi ghi lại; week và invite code
+có unique index nên bản trùng bị bỏ qua.
+"""
+import asyncio
+from typing import Dict, List
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database.database import init_db, close_db, get_users_collection
+from services.user_history import LEGACY_USER_FIELDS, get_history_collection
+from utils.logger import api_logger
+
+
+def _history_docs(user: Dict) -> Dict[str, List[Dict]]:
+    user_id = str(user["_id"])
+    docs = {kind: [] for kind in LEGACY_USER_FIELDS}
+
+    # _id sinh theo thứ tự mảng để phân trang theo _id giữ đúng thứ tự cũ
+    for kind in ("match", "mystery_box"):
+        for entry in user.get(LEGACY_USER_FIELDS[kind]) or []:
+            doc = dict(entry) if isinstance(entry, dict) else {"entry": entry}
+            doc.update({"_id": ObjectId(), "user_id": user_id, "migrated": True})
+            docs[kind].append(doc)
+
+    for entry in user.get("week_history") or []:
+        if isinstance(entry, dict) and entry.get("week"):
+            docs["week"].append({**entry, "user_id": user_id})
+
+    for code in user.get("used_invite_codes") or []:
+        docs["invite_code"].append({"user_id": user_id, "code": code})
+
+    return docs
+
+
+async def _insert_ignoring_duplicates(collection, docs: List[Dict]) -> None:
+    if not docs:
+        return
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+async def migrate_user_history(batch_size: int = 200) -> int:
+    users = await get_users_collection()
+    collections = {kind: await get_history_collection(kind) for kind in LEGACY_USER_FIELDS}
+    legacy_fields = list(LEGACY_USER_FIELDS.values())
+    projection = {field: 1 for field in legacy_fields}
+    has_legacy = {"$or": [{field: {"$exists": True}} for field in legacy_fields]}
+
+    migrated = 0
+    last_id = None
+    while True:
+        query = dict(has_legacy)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await users.find(query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+
+        user_ids = [str(user["_id"]) for user in batch]
+        docs = {kind: [] for kind in LEGACY_USER_FIELDS}
+        for user in batch:
+            for kind, kind_docs in _history_docs(user).items():
+                docs[kind] += kind_docs
+
+        # Lần chạy trước có thể đã ghi một phần batch này
+        for kind in ("match", "mystery_box"):
+            await collections[kind].delete_many({"user_id": {"$in": user_ids}, "migrated": True})
+            if docs[kind]:
+                await collections[kind].insert_many(docs[kind], ordered=False)
+        await _insert_ignoring_duplicates(collections["week"], docs["week"])
+        await _insert_ignoring_duplicates(collections["invite_code"], docs["invite_code"])
+
+        # Tuần đã có trong week_history coi như đã rollover (không rollover lại)
+        latest_weeks = {}
+        for doc in docs["week"]:
+            if doc["week"] > latest_weeks.get(doc["user_id"], ""):
+                latest_weeks[doc["user_id"]] = doc["week"]
+
+        await users.bulk_write([
+            UpdateOne(
+                {"_id": user["_id"]},
+                {
+                    "$unset": {field: "" for field in legacy_fields},
+                    **({"$max": {"last_rollover_week": latest_weeks[str(user["_id"])]}}
+                       if str(user["_id"]) in latest_weeks else {}),
+                },
+            )
+            for user in batch
+        ], ordered=False)
+
+        migrated += len(batch)
+        last_id = batch[-1]["_id"]
+
+    return migrated
+
+
+async def main():
+    await init_db()
+    try:
+        migrated = await migrate_user_history()
+        api_logger.info(f"✅ History moved out of {migrated} user documents")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
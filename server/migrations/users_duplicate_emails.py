@@ -0,0 +1,81 @@
+"""
+Báo cáo và cách ly email trùng để build được unique index users.email.
+
+Chạy từ thư mục server:
+    python -m migrations.users_duplicate_emails --dry-run   # chỉ báo cáo các nhóm trùng
+    python -m migrations.users_duplicate_emails             # báo cáo và cách ly email
+Mỗi nhóm trùng giữ email trên một tài khoản chính (đã xác thực trước, rồi cũ nhất theo _id).
+Tài khoản còn lại chỉ bị chuyển email sang duplicate_email (kèm duplicate_of = tài khoản chính);
+điểm, lịch sử, ví và guild giữ nguyên. Gộp tài khoản (nếu cần) là job riêng, làm sau khi đã
+review danh sách duplicate_email. Chạy lại được: nhóm đã cách ly không còn trùng.
+Sau đó chạy lại python -m database.indexes để build index.
+"""
+import argparse
+import asyncio
+from typing import Dict, List
+from bson import ObjectId
+from database.database import init_db, close_db, get_users_collection
+from utils.logger import api_logger
+
+
+async def find_duplicate_emails() -> List[Dict]:
+    """Các nhóm email trùng: {"email", "primary_id", "duplicate_ids"}"""
+    users = await get_users_collection()
+    groups = users.aggregate([
+        {"$match": {"email": {"$gt": ""}}},
+        {"$group": {"_id": "$email", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    report = []
+    async for group in groups:
+        accounts = await (
+            users.find({"_id": {"$in": group["ids"]}}, {"_id": 1})
+            .sort([("is_verified", -1), ("_id", 1)])
+            .to_list(length=None)
+        )
+        report.append({
+            "email": group["_id"],
+            "primary_id": str(accounts[0]["_id"]),
+            "duplicate_ids": [str(account["_id"]) for account in accounts[1:]],
+        })
+    return report
+
+
+async def quarantine_duplicate_emails(dry_run: bool = False) -> List[Dict]:
+    """Báo cáo các nhóm trùng; trừ khi dry_run, bỏ email khỏi các tài khoản không phải tài khoản chính"""
+    users = await get_users_collection()
+    report = await find_duplicate_emails()
+    for group in report:
+        api_logger.warning(
+            f"⚠️ {group['email']}: keep {group['primary_id']}, duplicates {', '.join(group['duplicate_ids'])}"
+        )
+        if dry_run:
+            continue
+        for duplicate_id in group["duplicate_ids"]:
+            await users.update_one(
+                {"_id": ObjectId(duplicate_id), "email": group["email"]},
+                {
+                    "$set": {"duplicate_email": group["email"], "duplicate_of": group["primary_id"]},
+                    "$unset": {"email": ""},
+                },
+            )
+    return report
+
+
+async def main(dry_run: bool):
+    await init_db()
+    try:
+        report = await quarantine_duplicate_emails(dry_run=dry_run)
+        duplicates = sum(len(group["duplicate_ids"]) for group in report)
+        action = "found" if dry_run else "quarantined"
+        api_logger.info(f"✅ {duplicates} duplicate accounts in {len(report)} emails {action}")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Báo cáo / cách ly email trùng trong users")
+    parser.add_argument("--dry-run", action="store_true", help="chỉ báo cáo, không sửa dữ liệu")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
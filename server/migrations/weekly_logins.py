@@ -0,0 +1,44 @@
+"""
+Thu nhỏ `weekly_logins` của user cũ: gộp các tuần ngoài cửa sổ 5 tuần vào
+`weekly_login_summary` (cùng pipeline với lúc login đầu tuần).
+
+Chạy từ thư mục server:  python -m migrations.weekly_logins
+Đi theo batch _id; chạy lại được nhiều lần (tuần đã gộp không còn trong weekly_logins).
+"""
+import asyncio
+from database.database import init_db, close_db, get_users_collection
+from utils.weekly_utils import weekly_login_retention_cutoff, weekly_login_compaction_pipeline
+from utils.logger import api_logger
+
+
+async def compact_weekly_logins(batch_size: int = 500) -> int:
+    users = await get_users_collection()
+    pipeline = weekly_login_compaction_pipeline(weekly_login_retention_cutoff())
+
+    compacted = 0
+    last_id = None
+    while True:
+        query = {"weekly_logins": {"$exists": True}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        ids = [u["_id"] async for u in users.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+        if not ids:
+            break
+        result = await users.update_many({"_id": {"$in": ids}}, pipeline)
+        compacted += result.modified_count
+        last_id = ids[-1]
+
+    return compacted
+
+
+async def main():
+    await init_db()
+    try:
+        compacted = await compact_weekly_logins()
+        api_logger.info(f"✅ weekly_logins compacted on {compacted} users")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
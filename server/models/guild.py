@@ -1,16 +1,28 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 from bson import ObjectId
 
 
+class GuildMemberModel(BaseModel):
+    user_id: str
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+    joined_at: datetime
+
+
+class GuildMembersPage(BaseModel):
+    members: List[GuildMemberModel]
+    next_after: Optional[str] = None
+
+
 class GuildModel(BaseModel):
     id: str = Field(..., alias="_id")
     guild_name: str
     description: Optional[str] = None  # ✅ mới
     owner_id: str
     owner_name: Optional[str] = ""
-    members: List[str] = []
+    member_count: int = 0  # Thành viên lưu ở collection guild_members
     created_at: datetime
 
     model_config = {
@@ -18,3 +30,49 @@ class GuildModel(BaseModel):
         "json_encoders": {ObjectId: str}
     }
 
+
+class BulkInviteResult(BaseModel):
+    user_id: str
+    status: Literal["added", "already_member", "not_found"]
+
+
+class BulkInviteResponse(BaseModel):
+    guild: GuildModel
+    results: List[BulkInviteResult]
+
+
+class GuildStatsModel(BaseModel):
+    id: str = Field(..., alias="_id")
+    guild_name: str
+    member_count: int = 0
+    total_points: int = 0
+    kicked_wins: int = 0
+    keep_wins: int = 0
+
+
+# Chỉ đọc các field của GuildModel (bỏ qua search_tokens, name_tokens...)
+GUILD_PROJECTION = {
+    "guild_name": 1,
+    "description": 1,
+    "owner_id": 1,
+    "owner_name": 1,
+    "member_count": 1,
+    "created_at": 1,
+}
+
+
+def guild_to_dict(doc: dict) -> dict:
+    """
+    Chuyển document guild đọc từ DB thành dict đúng shape JSON của GuildModel,
+    không validate lại. Dùng cho đường trả về nhanh qua ORJSONResponse.
+    """
+    return {
+        "_id": str(doc["_id"]),
+        "guild_name": doc["guild_name"],
+        "description": doc.get("description"),
+        "owner_id": doc["owner_id"],
+        "owner_name": doc.get("owner_name", ""),
+        "member_count": doc.get("member_count", 0),
+        # Guild cũ chưa backfill created_at (migrations.guild_created_at): lấy từ _id
+        "created_at": doc.get("created_at") or doc["_id"].generation_time.replace(tzinfo=None),
+    }
@@ -32,8 +32,8 @@ class UserBase(BaseModel):
     kicker_skills: List[str] = []
     goalkeeper_skills: List[str] = []
     total_point: int = 0  # Điểm tuần hiện tại
+    week_points: Dict[str, int] = Field(default_factory=dict)  # {"YYYY-WW": điểm} phần của total_point theo tuần, xem weekly_points_update
     bonus_point: float = 0.0
-    match_history: List[Any] = []
     created_at: str = Field(default_factory=lambda: get_vietnam_time().isoformat())
     updated_at: str = Field(default_factory=lambda: get_vietnam_time().isoformat())
     last_activity: str = Field(default_factory=lambda: get_vietnam_time().isoformat())
@@ -52,14 +52,16 @@ class UserBase(BaseModel):
     vip_amount: float = 0.0
     vip_year: Optional[int] = None
     vip_payment_method: str = "NONE"  # VISA, NFT, NONE
-    # --- Thay thế các trường điểm tuần và lịch sử điểm tuần riêng biệt bằng trường chung ---
-    week_history: List[dict] = []  # Lịch sử điểm tuần, mỗi entry: {"week": ..., "point": ..., "total_point": ..., "reset_at": ...}
+    # Lịch sử (match, mystery box, điểm tuần {"week", "point", "total_point", "reset_at"}, invite code đã dùng)
+    # nằm ở các collection user_*_history / user_invite_codes, xem services/user_history.py
     # --- Thêm các trường mới ---
     last_box_open: Optional[str] = None
-    mystery_box_history: List[dict] = []
     last_claim_matches: Optional[str] = None
     # --- Thêm trường daily_tasks ---
     daily_tasks: Dict[str, Dict[str, bool]] = Field(default_factory=dict)  # {"task_id": {"completed": bool, "claimed": bool}}
+    # Key material chỉ lưu một lần ở evm_*; sol/sui dùng chung ví nên chỉ giữ địa chỉ.
+    # wallet_id trỏ tới document (đã xoá key) trong collection `wallets` mà user đã claim.
+    wallet_id: Optional[str] = None
     evm_mnemonic: Optional[str] = None
     evm_private_key: Optional[str] = None
     evm_address: Optional[str] = None
@@ -70,7 +72,10 @@ class UserBase(BaseModel):
     sui_private_key: Optional[str] = None
     sui_address: Optional[str] = None
     # Thêm trường mới để lưu thông tin đăng nhập theo tuần
-    weekly_logins: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # Format: {"YYYY-WW": {"login": bool, "points": int}}
+    weekly_logins: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # Format: {"YYYY-WW": {"YYYY-MM-DD": {"login": bool, "points": int}}}, chỉ giữ 5 tuần gần nhất
+    weekly_login_summary: Optional[Dict[str, Any]] = None  # Gộp các tuần cũ: {"weeks", "days", "points", "last_week"}
+    last_login_week: Optional[str] = None
+    last_rollover_week: Optional[str] = None  # Tuần gần nhất đã rollover total_point vào user_week_history
     
     # NFT minted count
     nft_minted: int = 0
@@ -84,7 +89,6 @@ class UserBase(BaseModel):
     x_main_account_id: Optional[str] = None 
     x_connected_at: Optional[datetime] = None 
     x_auth_state: Optional[str] = None
-    used_invite_codes: List[str] = []
 
     class Config:
         json_encoders = {
@@ -114,7 +118,6 @@ class UserUpdate(BaseModel):
     goalkeeper_skills: Optional[List[str]] = None
     total_point: Optional[int] = None
     bonus_point: Optional[float] = None
-    match_history: Optional[List[Any]] = None
     updated_at: str = Field(default_factory=lambda: get_vietnam_time().isoformat())
     last_login: Optional[str] = None
     # Leaderboard fields
@@ -126,7 +129,6 @@ class UserUpdate(BaseModel):
     extra_point: Optional[int] = None
     level: Optional[int] = None
     last_box_open: Optional[str] = None
-    mystery_box_history: Optional[List[dict]] = None
     last_claim_matches: Optional[str] = None
     # weekly_logins: Optional[Dict[str, Dict[str, int]]] = None
     # NFT minted count
@@ -158,6 +160,54 @@ class UserInDB(UserBase):
 class User(UserInDB):
     pass
 
+class AuthPrincipal:
+    """
+    User tối giản mà JWTAuthMiddleware gắn vào request.state.user.
+    Chỉ load các field trong PROJECTION; route cần full profile phải tự query.
+    """
+
+    __slots__ = ("id", "name", "user_type", "role")
+
+    PROJECTION = {"_id": 1, "name": 1, "user_type": 1, "role": 1}
+
+    def __init__(self, id: str, name: str = "Guest Player", user_type: str = "guest", role: str = "user"):
+        self.id = id
+        self.name = name
+        self.user_type = user_type
+        self.role = role
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "AuthPrincipal":
+        return cls(
+            id=str(doc["_id"]),
+            name=doc.get("name", "Guest Player"),
+            user_type=doc.get("user_type", "guest"),
+            role=doc.get("role", "user"),
+        )
+
+    def __repr__(self) -> str:
+        return f"AuthPrincipal(id={self.id!r}, name={self.name!r})"
+
+# Field nhạy cảm không bao giờ trả về qua /api/me
+USER_PROFILE_PROJECTION = {
+    "password": 0,
+    "email_verification_token": 0,
+    "evm_mnemonic": 0,
+    "evm_private_key": 0,
+    "sol_mnemonic": 0,
+    "sol_private_key": 0,
+    "sui_mnemonic": 0,
+    "sui_private_key": 0,
+    "x_access_token": 0,
+    "x_refresh_token": 0,
+    "x_auth_state": 0,
+    # Mảng lịch sử cũ của user chưa chạy migrations.user_history
+    "match_history": 0,
+    "mystery_box_history": 0,
+    "week_history": 0,
+    "used_invite_codes": 0,
+}
+
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
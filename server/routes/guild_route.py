@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.params import Query
-from models.guild import GuildModel
+from models.guild import GuildModel, GuildMembersPage, BulkInviteResponse, GuildStatsModel
 from services.guild_service import (
     create_guild,
     get_guilds_by_user,
     invite_user_to_guild,
+    bulk_invite_users_to_guild,
     reset_guild_for_user,
     search_guilds_by_keyword,
     join_guild,
     leave_guild, 
-    get_guilds_with_min_members
+    get_guilds_with_min_members,
+    get_guild_members,
+    get_member_guild_id,
 )
+from services.guild_events import guild_event_bus, format_sse
+from services.guild_stats import get_guild_leaderboard
 from routes.users import get_current_user
-from pydantic import BaseModel
+from utils.pagination import InvalidCursor, NEXT_CURSOR_HEADER
+from utils.jwt import create_scoped_token
+from config.settings import settings
+from pydantic import BaseModel, Field
 from typing import Optional
 # Thêm List vào đây
 from typing import Optional, List
@@ -26,15 +36,42 @@ class GuildCreateRequest(BaseModel):
 class LeaveGuildRequest(BaseModel):
     guild_name: str
 
+class GuildEventsTokenRequest(BaseModel):
+    guild_name: str
+
+class GuildMembershipResponse(BaseModel):
+    guild_name: str
+    is_member: bool
+
+class GuildEventsTokenResponse(BaseModel):
+    token: str
+    expires_in: int
+
+class BulkInviteRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=settings.GUILD_BULK_INVITE_MAX)
+
 router = APIRouter()
 
 explore_router = APIRouter()
 
 
-@router.post("/guild/create", response_model=GuildModel)
+# Service trả về dict đã đúng shape của GuildModel (đọc từ DB, tin cậy được), nên route
+# trả thẳng ORJSONResponse: FastAPI không validate/serialize lại qua response_model.
+# response_model vẫn giữ để sinh OpenAPI.
+def guild_response(guild: dict) -> ORJSONResponse:
+    return ORJSONResponse(guild)
+
+def guild_list_response(guilds: List[dict], next_cursor: Optional[str] = None) -> ORJSONResponse:
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return ORJSONResponse(guilds, headers=headers)
+
+
+@router.post("/guild/create", response_model=GuildModel, response_class=ORJSONResponse)
 async def create_my_guild(payload: GuildCreateRequest, current_user=Depends(get_current_user)):
     try:
-        return await create_guild(str(current_user["_id"]), payload.guild_name, payload.description)
+        return guild_response(await create_guild(
+            current_user.id, payload.guild_name, payload.description, owner_name=current_user.name
+        ))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -44,48 +81,161 @@ async def leave_guild_by_name_route(
     current_user=Depends(get_current_user)
 ):
     try:
-        await leave_guild(str(current_user["_id"]), payload.guild_name)
+        await leave_guild(current_user.id, payload.guild_name)
         return {"message": "Rời guild thành công"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/guild/me", response_model=List[GuildModel])
-async def get_my_guilds(current_user=Depends(get_current_user)):
+@router.get("/guild/me", response_model=List[GuildModel], response_class=ORJSONResponse)
+async def get_my_guilds(
+        limit: int = Query(settings.GUILD_PAGE_SIZE_DEFAULT, ge=1, le=settings.GUILD_PAGE_SIZE_MAX),
+        cursor: Optional[str] = None,
+        current_user=Depends(get_current_user)):
     try:
-        return await get_guilds_by_user(str(current_user["_id"]))
+        guilds, next_cursor = await get_guilds_by_user(current_user.id, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    return guild_list_response(guilds, next_cursor)
 
 
-@router.post("/guild/invite", response_model=GuildModel)
+@router.post("/guild/invite", response_model=GuildModel, response_class=ORJSONResponse)
 async def invite_to_guild(user_id: str, current_user=Depends(get_current_user)):
     try:
-        return await invite_user_to_guild(str(current_user["_id"]), user_id)
+        return guild_response(await invite_user_to_guild(current_user.id, user_id))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/guild/invite/bulk", response_model=BulkInviteResponse, response_class=ORJSONResponse)
+async def bulk_invite_to_guild(payload: BulkInviteRequest, current_user=Depends(get_current_user)):
+    try:
+        return ORJSONResponse(await bulk_invite_users_to_guild(current_user.id, payload.user_ids))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/guild/reset")
 async def reset_my_guild(current_user=Depends(get_current_user)):
-    await reset_guild_for_user(str(current_user["_id"]))
+    await reset_guild_for_user(current_user.id)
     return {"message": "Guild đã được reset"}
 
 
-@router.get("/guild/search", response_model=List[GuildModel])
-async def search_guilds(keyword: str):
-    return await search_guilds_by_keyword(keyword)
+@router.get("/guild/search", response_model=List[GuildModel], response_class=ORJSONResponse)
+async def search_guilds(
+        keyword: str = Query(..., max_length=100),
+        limit: int = Query(10, ge=1, le=settings.GUILD_PAGE_SIZE_MAX),
+        cursor: Optional[str] = None):
+    try:
+        guilds, next_cursor = await search_guilds_by_keyword(keyword, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return guild_list_response(guilds, next_cursor)
 
 
-@router.post("/guild/join", response_model=GuildModel)
+@router.post("/guild/join", response_model=GuildModel, response_class=ORJSONResponse)
 async def join_guild_route(
         payload: GuildCreateRequest,
         current_user=Depends(get_current_user)):
     try:
-        return await join_guild(str(current_user["_id"]), payload.guild_name)
+        return guild_response(await join_guild(current_user.id, payload.guild_name))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/guild/explore", response_model=List[GuildModel])
-async def explore_guilds(min_members: int = Query(5, ge=1)):
-    return await get_guilds_with_min_members(min_members=min_members)
+@router.get("/guild/explore", response_model=List[GuildModel], response_class=ORJSONResponse)
+async def explore_guilds(
+        min_members: int = Query(5, ge=1),
+        limit: int = Query(settings.GUILD_PAGE_SIZE_DEFAULT, ge=1, le=settings.GUILD_PAGE_SIZE_MAX),
+        cursor: Optional[str] = None):
+    try:
+        guilds, next_cursor = await get_guilds_with_min_members(
+            min_members=min_members, limit=limit, cursor=cursor
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return guild_list_response(guilds, next_cursor)
+
+@router.get("/guild/leaderboard", response_model=List[GuildStatsModel], response_class=ORJSONResponse)
+async def guild_leaderboard(limit: int = Query(10, ge=1, le=settings.GUILD_LEADERBOARD_MAX)):
+    return ORJSONResponse(await get_guild_leaderboard(limit=limit))
+
+@router.get("/guild/members", response_model=GuildMembersPage)
+async def list_guild_members(
+        guild_name: str,
+        limit: int = Query(50, ge=1, le=200),
+        after: Optional[str] = None,
+        current_user=Depends(get_current_user)):
+    try:
+        return await get_guild_members(guild_name, limit=limit, after=after)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/guild/membership", response_model=GuildMembershipResponse, summary="User hiện tại có thuộc guild không")
+async def get_guild_membership(guild_name: str, current_user=Depends(get_current_user)):
+    """Một lookup theo (guild_id, user_id) thay vì client quét /guild/me (có phân trang)"""
+    try:
+        await get_member_guild_id(current_user.id, guild_name)
+    except ValueError:
+        return {"guild_name": guild_name, "is_member": False}
+    return {"guild_name": guild_name, "is_member": True}
 
+
+@router.post("/guild/events/token", response_model=GuildEventsTokenResponse, summary="Token ngắn hạn cho SSE guild events")
+async def create_guild_events_token(
+        payload: GuildEventsTokenRequest,
+        current_user=Depends(get_current_user)):
+    """
+    EventSource không gửi được header Authorization: client lấy token này (gắn với user và
+    guild, sống GUILD_EVENTS_TOKEN_TTL giây) rồi mở /guild/events?guild_name=...&token=...
+    """
+    try:
+        guild_id = await get_member_guild_id(current_user.id, payload.guild_name)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    token = create_scoped_token(
+        current_user.id, "guild_events", settings.GUILD_EVENTS_TOKEN_TTL, guild_id=guild_id
+    )
+    return {"token": token, "expires_in": settings.GUILD_EVENTS_TOKEN_TTL}
+
+
+@router.get("/guild/events", summary="SSE các thay đổi thành viên của guild")
+async def stream_guild_events(
+        request: Request,
+        guild_name: str,
+        current_user=Depends(get_current_user)):
+    """Xác thực bằng header Authorization, hoặc ?token= lấy từ POST /guild/events/token"""
+    try:
+        guild_id = await get_member_guild_id(current_user.id, guild_name)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+    claims = getattr(request.state, "token_claims", None) or {}
+    if claims.get("scope") == "guild_events" and claims.get("guild_id") != guild_id:
+        raise HTTPException(status_code=403, detail="Token không dùng được cho guild này")
+
+    subscription = guild_event_bus.subscribe(guild_id, current_user.id)
+
+    async def event_stream():
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=settings.GUILD_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            guild_event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
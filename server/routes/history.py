@@ -0,0 +1,25 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.params import Query
+from fastapi.responses import ORJSONResponse
+from config.settings import settings
+from models.user import AuthPrincipal
+from routes.users import get_current_user
+from services.user_history import get_history_page
+from utils.pagination import InvalidCursor, NEXT_CURSOR_HEADER
+
+router = APIRouter()
+
+
+@router.get("/me/history/{kind}", response_class=ORJSONResponse, summary="Lịch sử của user hiện tại, mới nhất trước")
+async def get_my_history(
+        kind: Literal["match", "mystery_box", "week", "invite_code"],
+        limit: int = Query(20, ge=1, le=settings.USER_HISTORY_PAGE_SIZE_MAX),
+        cursor: Optional[str] = None,
+        current_user: AuthPrincipal = Depends(get_current_user)):
+    try:
+        items, next_cursor = await get_history_page(kind, current_user.id, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return ORJSONResponse(items, headers=headers)
@@ -0,0 +1,52 @@
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.params import Query
+from pydantic import BaseModel
+from config.settings import settings
+from models.user import AuthPrincipal
+from routes.users import get_current_user
+from services.leaderboard import player_leaderboard
+
+router = APIRouter()
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    name: Optional[str] = None
+    avatar: Optional[str] = None
+    score: int
+
+
+class MyRankResponse(BaseModel):
+    board: str
+    rank: int
+    score: int
+    total: int
+    around: List[LeaderboardEntry] = []
+
+
+@router.get("/leaderboard", response_model=List[LeaderboardEntry], summary="Top người chơi theo số trận thắng")
+async def leaderboard_all(limit: int = Query(10, ge=1, le=settings.LEADERBOARD_PAGE_SIZE_MAX)):
+    return await player_leaderboard.top("all", limit)
+
+
+@router.get("/leaderboard/weekly", response_model=List[LeaderboardEntry], summary="Top người chơi theo điểm tuần")
+async def leaderboard_weekly(limit: int = Query(10, ge=1, le=settings.LEADERBOARD_PAGE_SIZE_MAX)):
+    return await player_leaderboard.top("weekly", limit)
+
+
+@router.get("/leaderboard/monthly", response_model=List[LeaderboardEntry], summary="Top người chơi theo điểm tháng")
+async def leaderboard_monthly(limit: int = Query(10, ge=1, le=settings.LEADERBOARD_PAGE_SIZE_MAX)):
+    return await player_leaderboard.top("monthly", limit)
+
+
+@router.get("/me/rank", response_model=MyRankResponse, summary="Hạng của tôi và những người xung quanh")
+async def my_rank(
+        board: Literal["all", "weekly", "monthly"] = "weekly",
+        radius: int = Query(0, ge=0, le=settings.LEADERBOARD_AROUND_MAX),
+        current_user: AuthPrincipal = Depends(get_current_user)):
+    result = await player_leaderboard.my_rank(board, current_user.id, radius)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Chưa có trong bảng xếp hạng")
+    return result
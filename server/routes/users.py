@@ -1,30 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from utils.time_utils import get_vietnam_time
-from database.database import get_users_collection, get_skills_collection
+from database.database import get_users_collection
+from database.indexes import index_confirmed, USERS_EMAIL_INDEX
 import uuid
-import random
+import asyncio
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from utils.jwt import create_access_token
-from models.user import User, UserCreate, TokenResponse
+from models.user import User, UserCreate, TokenResponse, AuthPrincipal, USER_PROFILE_PROJECTION
 from utils.logger import api_logger
-from utils.password import get_password_hash, verify_password
-from utils.weekly_utils import update_weekly_login, get_weekly_stats
+from utils.password import hash_password_async, verify_and_update_password, PasswordHashQueueFull
+from utils.weekly_utils import (
+    weekly_login_update,
+    weekly_login_retention_cutoff,
+    weekly_login_compaction_pipeline,
+)
 from pydantic import BaseModel, EmailStr
 from utils.content_filter import contains_sensitive_content, validate_username
-from utils.wallet_generator import generate_evm_wallet
-from utils.email_utils import send_verification_email
-
-def generate_wallets():
-    """
-    Tạo ví cho người dùng mới.
-    Hiện tại chỉ hỗ trợ EVM wallet.
-    """
-    wallet = generate_evm_wallet()
-    return {
-        "mnemonic": wallet["mnemonic"],
-        "private_key": wallet["private_key"],
-        "public_address": wallet["public_address"]
-    }
+from services.email_outbox import enqueue_verification_email
+from utils.auth_cache import invalidate_user
+from services.wallet_pool import claim_wallet, release_wallet
+from services.skill_catalog import skill_catalog
+from services.leaderboard import player_leaderboard
+from services.user_stats import load_weekly_stats
 
 
 from typing import Optional
@@ -38,20 +37,45 @@ class RegularAuthRequest(BaseModel):
     password: str
     name: Optional[str] = None
 
-async def get_random_skill(skills_collection, skill_type: str) -> str:
-    skills = await skills_collection.find({"type": skill_type}).to_list(length=None)
-    if not skills:
+async def _release_unless_inserted(wallet: dict, users_collection, user_id: ObjectId) -> None:
+    """
+    Trả ví về pool khi đăng ký thất bại sau khi claim. Lỗi mạng có thể xảy ra sau khi
+    insert đã ghi xong, nên chỉ trả ví nếu user thực sự chưa được ghi.
+    """
+    try:
+        if await users_collection.find_one({"_id": user_id}, {"_id": 1}) is None:
+            await release_wallet(wallet)
+    except Exception as e:
+        api_logger.error(f"❌ Failed to release wallet {wallet.get('_id')} for user {user_id}: {str(e)}")
+
+
+async def _discard_claim(claim_task: asyncio.Future) -> None:
+    """Đăng ký thất bại trước khi dùng tới ví: đợi claim xong (nếu thành công) rồi trả ví về pool"""
+    try:
+        wallet = await claim_task
+    except BaseException:
+        return
+    try:
+        await release_wallet(wallet)
+    except Exception as e:
+        api_logger.error(f"❌ Failed to release wallet {wallet.get('_id')}: {str(e)}")
+
+
+async def get_random_skill(skill_type: str) -> str:
+    skill = await skill_catalog.random_skill(skill_type)
+    if not skill:
         raise HTTPException(status_code=500, detail=f"No {skill_type} skills found in database")
-    return random.choice(skills)["name"]
+    return skill
 
 @router.post("/guest")
 async def create_guest_user(request: Request):
     """Tạo guest user với 5 lượt chơi và random 1 kỹ năng mỗi loại"""
-    users_collection = await get_users_collection()
-    skills_collection = await get_skills_collection()
+    users_collection, kicker_skill, goalkeeper_skill = await asyncio.gather(
+        get_users_collection(),
+        get_random_skill("kicker"),
+        get_random_skill("goalkeeper"),
+    )
     session_id = str(uuid.uuid4())
-    kicker_skill = await get_random_skill(skills_collection, "kicker")
-    goalkeeper_skill = await get_random_skill(skills_collection, "goalkeeper")
     avatar_seed = str(uuid.uuid4())
     avatar_url = f"https://api.dicebear.com/7.x/adventurer/svg?seed={avatar_seed}"
     now = get_vietnam_time()
@@ -69,33 +93,59 @@ async def create_guest_user(request: Request):
         bonus_point=0.0,
     ).dict(by_alias=True)
     result = await users_collection.insert_one(guest_user)
-    created_user = await users_collection.find_one({"_id": result.inserted_id})
+    # Trả về chính document vừa insert, không đọc lại từ DB
+    guest_user["_id"] = result.inserted_id
+    player_leaderboard.add_user(str(result.inserted_id))
     # Generate JWT for guest user
-    token = create_access_token({"_id": str(created_user["_id"])})
+    token = create_access_token({"_id": str(result.inserted_id)})
     return {
-        "user": User(**created_user),
+        "user": User(**guest_user),
         "access_token": token,
         "token_type": "bearer"
     }
 
 
+async def get_current_user(request: Request) -> AuthPrincipal:
+    """Dependency: lấy principal mà JWTAuthMiddleware đã gắn vào request"""
+    user = getattr(request.state, "user", None)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return user
+
+
 @router.get("/me")
-async def get_current_user(request: Request):
+async def get_me(current_user: AuthPrincipal = Depends(get_current_user)):
     """Lấy thông tin user hiện tại từ JWT"""
-    user = getattr(request.state, "user", None)
+    users_collection = await get_users_collection()
+    user = await users_collection.find_one({"_id": ObjectId(current_user.id)}, USER_PROFILE_PROJECTION)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     user["_id"] = str(user["_id"])
     return user
 
+@router.get("/me/weekly-stats")
+async def get_my_weekly_stats(current_user: AuthPrincipal = Depends(get_current_user)):
+    """Thống kê đăng nhập và điểm 5 tuần gần nhất của user hiện tại"""
+    stats = await load_weekly_stats([current_user.id])
+    if current_user.id not in stats:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return stats[current_user.id]
+
+@router.post("/admin/skills/reload")
+async def reload_skill_catalog(current_user: AuthPrincipal = Depends(get_current_user)):
+    """Đọc lại skill catalog từ DB (chỉ admin)"""
+    if current_user.role != "admin" and current_user.user_type != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    return {"skills": await skill_catalog.reload()}
+
 @router.post("/auth/login")
 async def login_user(data: RegularAuthRequest):
     """Đăng nhập với email và mật khẩu"""
     try:
         users_collection = await get_users_collection()
         
-        # Tìm user theo email
-        existing_user = await users_collection.find_one({"email": data.email})
+        # Tìm user theo email (không đọc map weekly_logins: login chỉ ghi một field của nó)
+        existing_user = await users_collection.find_one({"email": data.email}, {"password": 1, "last_login_week": 1})
         
         if not existing_user:
             raise HTTPException(
@@ -103,8 +153,9 @@ async def login_user(data: RegularAuthRequest):
                 detail="User not found. Please register first."
             )
             
-        # Kiểm tra mật khẩu
-        if not verify_password(data.password, existing_user.get("password", "")):
+        # Kiểm tra mật khẩu (chạy trên pool bcrypt, không block event loop)
+        is_valid, new_hash = await verify_and_update_password(data.password, existing_user.get("password", ""))
+        if not is_valid:
             raise HTTPException(
                 status_code=401,
                 detail="Invalid password"
@@ -115,18 +166,24 @@ async def login_user(data: RegularAuthRequest):
             "last_login": get_vietnam_time().isoformat(),
             "updated_at": get_vietnam_time().isoformat(),
         }
+        # Cost bcrypt đã thay đổi: lưu lại hash mới
+        if new_hash:
+            update_data["password"] = new_hash
         
-        # Cập nhật thông tin đăng nhập theo tuần
-        user_data = update_weekly_login(existing_user)
-        update_data.update({
-            "weekly_logins": user_data["weekly_logins"],
-            "total_point": user_data["total_point"]
-        })
-        
+        # Ghi nhận đăng nhập theo tuần bằng một dotted-path $set
+        update_data.update(weekly_login_update())
+
         await users_collection.update_one(
             {"_id": existing_user["_id"]},
             {"$set": update_data}
         )
+        # Lần đăng nhập đầu tiên của tuần mới: gộp các tuần ngoài cửa sổ 5 tuần vào summary
+        if existing_user.get("last_login_week") != update_data["last_login_week"]:
+            await users_collection.update_one(
+                {"_id": existing_user["_id"]},
+                weekly_login_compaction_pipeline(weekly_login_retention_cutoff()),
+            )
+        invalidate_user(existing_user["_id"])
         
         # Tạo access token
         access_token = create_access_token({"_id": str(existing_user["_id"])})
@@ -135,6 +192,10 @@ async def login_user(data: RegularAuthRequest):
             access_token=access_token
         )
         
+    except HTTPException as he:
+        raise he
+    except PasswordHashQueueFull:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
     except Exception as e:
         api_logger.error(f"Error in login: {str(e)}")
         raise HTTPException(
@@ -146,17 +207,6 @@ async def login_user(data: RegularAuthRequest):
 async def register_user(data: RegularAuthRequest):
     """Đăng ký tài khoản mới với email và mật khẩu"""
     try:
-        users_collection = await get_users_collection()
-        skills_collection = await get_skills_collection()
-        
-        # Kiểm tra email đã tồn tại chưa
-        existing_user = await users_collection.find_one({"email": data.email})
-        if existing_user:
-            raise HTTPException(
-                status_code=400,
-                detail="Email already registered. Please login instead."
-            )
-
         # Kiểm tra nội dung nhạy cảm trong tên
         if data.name:
             is_sensitive, reason = contains_sensitive_content(data.name)
@@ -166,58 +216,95 @@ async def register_user(data: RegularAuthRequest):
                     detail=f"Name contains sensitive content: {reason}"
                 )
 
+        # Email trùng được chặn bởi unique index users.email. Khi index chưa được xác nhận
+        # (vd. build lỗi vì dữ liệu trùng cũ, xem migrations.users_duplicate_emails) thì
+        # vẫn kiểm tra trước để không tạo thêm tài khoản trùng
+        if not index_confirmed("users", USERS_EMAIL_INDEX):
+            users_collection = await get_users_collection()
+            if await users_collection.find_one({"email": data.email}, {"_id": 1}):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Email already registered. Please login instead."
+                )
+
         # Sinh token xác thực email
         email_verification_token = str(uuid.uuid4())
         session_id = str(uuid.uuid4())
-        kicker_skill = await get_random_skill(skills_collection, "kicker")
-        goalkeeper_skill = await get_random_skill(skills_collection, "goalkeeper")
-        hashed_password = get_password_hash(data.password)
         now = get_vietnam_time().isoformat()
         avatar_seed = str(uuid.uuid4())
         avatar_url = f"https://api.dicebear.com/7.x/adventurer/svg?seed={avatar_seed}"
         
-        # Tạo ví cho user
-        wallets = generate_wallets()
-        
-        new_user = UserCreate(
-            user_type="user",
-            session_id=session_id,
-            avatar=avatar_url,
-            email=data.email,
-            password=hashed_password,
-            auth_provider="email",
-            name=data.name or "Player",
-            kicker_skills=[kicker_skill],
-            goalkeeper_skills=[goalkeeper_skill],
-            created_at=now,
-            updated_at=now,
-            last_login=now,
-            is_verified=False,
-            email_verification_token=email_verification_token,
-            # Thông tin ví
-            evm_mnemonic=wallets["mnemonic"],
-            evm_private_key=wallets["private_key"],
-            evm_address=wallets["public_address"],
-            sol_mnemonic=wallets["mnemonic"],
-            sol_private_key=wallets["private_key"],
-            sol_address=wallets["public_address"],
-            sui_mnemonic=wallets["mnemonic"],
-            sui_private_key=wallets["private_key"],
-            sui_address=wallets["public_address"]
-        ).dict(by_alias=True)
+        # Các bước độc lập chạy song song: hash mật khẩu, claim ví đã tạo sẵn
+        # (id user sinh trước để gắn vào ví), random skill, lấy collection.
+        # Claim chạy thành task riêng: bước khác lỗi hoặc request bị huỷ giữa chừng thì
+        # vẫn đợi claim xong để trả ví về pool
+        user_id = ObjectId()
+        claim_task = asyncio.ensure_future(claim_wallet(str(user_id)))
+        try:
+            hashed_password, kicker_skill, goalkeeper_skill, users_collection = await asyncio.gather(
+                hash_password_async(data.password),
+                get_random_skill("kicker"),
+                get_random_skill("goalkeeper"),
+                get_users_collection(),
+            )
+            wallet = await asyncio.shield(claim_task)
+        except BaseException:
+            await asyncio.shield(_discard_claim(claim_task))
+            raise
         
+        # Ví đã claim: mọi lỗi trước khi user được ghi (build model, insert, huỷ request)
+        # đều phải trả ví về pool
         try:
+            new_user = UserCreate(
+                user_type="user",
+                session_id=session_id,
+                avatar=avatar_url,
+                email=data.email,
+                password=hashed_password,
+                auth_provider="email",
+                name=data.name or "Player",
+                kicker_skills=[kicker_skill],
+                goalkeeper_skills=[goalkeeper_skill],
+                created_at=now,
+                updated_at=now,
+                last_login=now,
+                is_verified=False,
+                email_verification_token=email_verification_token,
+                # Thông tin ví: key material lưu một lần, sol/sui chỉ tham chiếu địa chỉ
+                wallet_id=str(wallet["_id"]),
+                evm_mnemonic=wallet["mnemonic"],
+                evm_private_key=wallet["private_key"],
+                evm_address=wallet["public_address"],
+                sol_address=wallet["public_address"],
+                sui_address=wallet["public_address"]
+            ).dict(by_alias=True)
+            new_user["_id"] = user_id
             result = await users_collection.insert_one(new_user)
+        except DuplicateKeyError:
+            await _release_unless_inserted(wallet, users_collection, user_id)
+            raise HTTPException(
+                status_code=400,
+                detail="Email already registered. Please login instead."
+            )
+        except BaseException:
+            await _release_unless_inserted(wallet, users_collection, user_id)
+            raise
+
+        try:
             if not result.inserted_id:
                 raise Exception("Failed to insert user into database")
-            send_verification_email(data.email, email_verification_token)
+            invalidate_user(result.inserted_id)
+            player_leaderboard.add_user(str(result.inserted_id))
+            await enqueue_verification_email(data.email, email_verification_token)
             # Trả về cho FE chỉ địa chỉ ví
             return {
                 "message": "Registration successful. Please check your email to verify your account.",
-                "evm_address": wallets["public_address"],
-                "sol_address": wallets["public_address"],
-                "sui_address": wallets["public_address"]
+                "evm_address": wallet["public_address"],
+                "sol_address": wallet["public_address"],
+                "sui_address": wallet["public_address"]
             }
+        except HTTPException:
+            raise
         except Exception as db_error:
             api_logger.error(f"Database error during registration: {str(db_error)}")
             raise HTTPException(
@@ -226,6 +313,8 @@ async def register_user(data: RegularAuthRequest):
             )
     except HTTPException as he:
         raise he
+    except PasswordHashQueueFull:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again")
     except Exception as e:
         api_logger.error(f"Error in registration: {str(e)}", exc_info=True)
         raise HTTPException(
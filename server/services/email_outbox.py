@@ -0,0 +1,185 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+from config.settings import settings
+from database.database import get_email_outbox_collection
+from utils.email_utils import SMTPConnection, build_verification_email
+from utils.logger import api_logger
+
+# Outbox email lưu trong Mongo; task nền gửi qua một kết nối SMTP dùng lại.
+# Trạng thái: pending -> sending -> sent | failed (hết số lần retry)
+
+_smtp = SMTPConnection(idle_timeout=settings.EMAIL_SMTP_IDLE_TIMEOUT)
+_sender_task: Optional[asyncio.Task] = None
+_sender_wakeup: Optional[asyncio.Event] = None
+
+
+async def enqueue_email(to: str, subject: str, body: str, kind: str = "generic") -> str:
+    """Ghi email vào outbox và báo cho sender; trả về id của message"""
+    outbox = await get_email_outbox_collection()
+    now = datetime.utcnow()
+    result = await outbox.insert_one({
+        "kind": kind,
+        "to": to,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "last_error": None,
+        "created_at": now,
+        "next_attempt_at": now,
+        "sent_at": None,
+    })
+    if _sender_wakeup is not None:
+        _sender_wakeup.set()
+    return str(result.inserted_id)
+
+
+async def enqueue_verification_email(email: str, token: str) -> str:
+    message = build_verification_email(email, token)
+    return await enqueue_email(message["to"], message["subject"], message["body"], kind="verify_email")
+
+
+async def _fail_exhausted(outbox) -> int:
+    """
+    Message kẹt ở sending quá lease mà đã dùng hết số lần thử (sender chết / treo giữa lúc gửi)
+    chuyển sang failed, không claim lại nữa.
+    """
+    now = datetime.utcnow()
+    result = await outbox.update_many(
+        {
+            "status": "sending",
+            "lease_until": {"$lte": now},
+            "attempts": {"$gte": settings.EMAIL_OUTBOX_MAX_ATTEMPTS},
+        },
+        {"$set": {"status": "failed", "next_attempt_at": None, "last_error": "lease expired while sending"},
+         "$unset": {"lease_until": "", "claim_id": ""}},
+    )
+    if result.modified_count:
+        api_logger.error(f"❌ {result.modified_count} emails failed permanently: lease expired while sending")
+    return result.modified_count
+
+
+CLAIM_SORT = [("next_attempt_at", 1)]
+
+
+def _claim_filter(now: datetime) -> Dict:
+    """Message đến hạn gửi (hoặc bị kẹt ở sending quá lease) mà chưa dùng hết số lần thử"""
+    return {
+        "attempts": {"$lt": settings.EMAIL_OUTBOX_MAX_ATTEMPTS},
+        "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}},
+        ],
+    }
+
+
+async def _claim_batch(outbox, limit: int) -> List[Dict]:
+    """
+    Claim tối đa `limit` message trong 3 round trip: đọc _id đến hạn, update_many gắn claim_id
+    (lặp lại điều kiện claim nên message process khác vừa giành trước bị bỏ qua), rồi đọc lại
+    đúng các message đã gắn claim_id. attempts tăng ngay khi claim nên lần gửi làm sender
+    crash / treo vẫn được tính.
+    """
+    now = datetime.utcnow()
+    cursor = outbox.find(_claim_filter(now), {"_id": 1}).sort(CLAIM_SORT).limit(limit)
+    ids = [doc["_id"] async for doc in cursor]
+    if not ids:
+        return []
+
+    claim_id = uuid4().hex
+    await outbox.update_many(
+        {"_id": {"$in": ids}, **_claim_filter(now)},
+        {
+            "$set": {
+                "status": "sending",
+                "claim_id": claim_id,
+                "lease_until": now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+    )
+    return await outbox.find({"claim_id": claim_id}).sort(CLAIM_SORT).to_list(length=limit)
+
+
+async def _mark_failed(outbox, message: Dict, error: Exception) -> None:
+    # attempts đã được tăng lúc claim
+    attempts = message["attempts"]
+    if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        status, next_attempt_at = "failed", None
+        api_logger.error(f"❌ Email {message['_id']} to {message['to']} failed permanently: {str(error)}")
+    else:
+        status = "pending"
+        backoff = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+        next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff)
+
+    await outbox.update_one(
+        {"_id": message["_id"], "claim_id": message["claim_id"]},
+        {"$set": {"status": status, "next_attempt_at": next_attempt_at, "last_error": str(error)},
+         "$unset": {"lease_until": "", "claim_id": ""}},
+    )
+
+
+async def process_outbox_batch() -> int:
+    """Gửi tối đa EMAIL_OUTBOX_BATCH_SIZE message đến hạn. Trả về số message đã xử lý"""
+    outbox = await get_email_outbox_collection()
+    await _fail_exhausted(outbox)
+    messages = await _claim_batch(outbox, settings.EMAIL_OUTBOX_BATCH_SIZE)
+    sent_ids = []
+    for message in messages:
+        try:
+            # smtplib là đồng bộ: chạy trên thread, kết nối vẫn được dùng lại giữa các lần gửi
+            await asyncio.to_thread(_smtp.send, message["to"], message["subject"], message["body"])
+        except Exception as e:
+            await asyncio.to_thread(_smtp.close)
+            await _mark_failed(outbox, message, e)
+        else:
+            sent_ids.append(message["_id"])
+
+    if sent_ids:
+        # Gửi thành công ghi một lần cho cả batch; lỗi (hiếm) ghi riêng vì backoff theo attempts
+        await outbox.update_many(
+            {"_id": {"$in": sent_ids}, "claim_id": messages[0]["claim_id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.utcnow(), "last_error": None},
+             "$unset": {"lease_until": "", "claim_id": ""}},
+        )
+    return len(messages)
+
+
+async def _sender_loop():
+    while True:
+        _sender_wakeup.clear()
+        try:
+            processed = await process_outbox_batch()
+        except Exception as e:
+            api_logger.error(f"❌ Email outbox sender failed: {str(e)}")
+            processed = 0
+
+        # Còn message thì gửi tiếp ngay, không thì chờ enqueue mới hoặc tới kỳ poll
+        if processed >= settings.EMAIL_OUTBOX_BATCH_SIZE:
+            continue
+        try:
+            await asyncio.wait_for(_sender_wakeup.wait(), timeout=settings.EMAIL_OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_email_outbox() -> None:
+    """Gọi khi startup: chạy task nền gửi email trong outbox"""
+    global _sender_task, _sender_wakeup
+    if _sender_task is None:
+        _sender_wakeup = asyncio.Event()
+        _sender_task = asyncio.create_task(_sender_loop())
+
+
+async def stop_email_outbox() -> None:
+    global _sender_task
+    if _sender_task is not None:
+        _sender_task.cancel()
+        try:
+            await _sender_task
+        except asyncio.CancelledError:
+            pass
+        _sender_task = None
+    await asyncio.to_thread(_smtp.close)
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set
+import orjson
+from config.settings import settings
+from utils.logger import api_logger
+
+
+class GuildSubscription:
+    """Một client đang nghe event của một guild, với hàng đợi có giới hạn"""
+
+    __slots__ = ("guild_id", "user_id", "queue", "dropped", "closed")
+
+    def __init__(self, guild_id: str, user_id: str, max_queue: int):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+
+    async def get(self) -> Optional[dict]:
+        """Event tiếp theo; None nghĩa là subscription đã bị đóng"""
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+
+class GuildEventBus:
+    """
+    Pub/sub trong process cho các thay đổi membership của guild. Không cần replica set
+    (không dùng change stream): guild_service publish ngay sau khi ghi DB thành công.
+    Mỗi subscriber có hàng đợi giới hạn; client chậm bị bỏ event ("drop") hoặc bị ngắt
+    ("disconnect") thay vì làm phình bộ nhớ hay chặn người publish.
+    """
+
+    def __init__(self, max_queue: int, overflow: str = "disconnect"):
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self._subscribers: Dict[str, Set[GuildSubscription]] = {}
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def subscribe(self, guild_id: str, user_id: str) -> GuildSubscription:
+        subscription = GuildSubscription(guild_id, user_id, self.max_queue)
+        self._subscribers.setdefault(guild_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: GuildSubscription) -> None:
+        subscription.closed = True
+        subscribers = self._subscribers.get(subscription.guild_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.guild_id]
+
+    def _close(self, subscription: GuildSubscription) -> None:
+        """Ngắt subscriber: xả hàng đợi và đặt sentinel None để stream kết thúc"""
+        self.unsubscribe(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def publish(self, guild_id: str, event_type: str, **data) -> int:
+        """Đẩy event tới mọi subscriber của guild. Trả về số subscriber nhận được"""
+        subscribers = self._subscribers.get(guild_id)
+        if not subscribers:
+            return 0
+
+        event = {"type": event_type, "guild_id": guild_id, "at": datetime.utcnow().isoformat(), **data}
+        self.published += 1
+        delivered = 0
+        for subscription in list(subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+                delivered += 1
+            except asyncio.QueueFull:
+                if self.overflow == "drop":
+                    subscription.dropped += 1
+                    self.dropped += 1
+                else:
+                    self.disconnected += 1
+                    api_logger.warning(
+                        f"Disconnecting slow guild event subscriber {subscription.user_id} ({guild_id})"
+                    )
+                    self._close(subscription)
+        return delivered
+
+    def close_user(self, guild_id: str, user_id: str) -> int:
+        """Ngắt các stream của user trong guild (user rời guild). Trả về số stream bị ngắt"""
+        closing = [s for s in self._subscribers.get(guild_id, ()) if s.user_id == user_id]
+        for subscription in closing:
+            self._close(subscription)
+        return len(closing)
+
+    def close_guild(self, guild_id: str) -> None:
+        """Ngắt mọi subscriber của guild (guild bị xoá)"""
+        for subscription in list(self._subscribers.get(guild_id, ())):
+            self._close(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "guilds": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+            "disconnected": self.disconnected,
+            "max_queue": self.max_queue,
+            "overflow": self.overflow,
+        }
+
+
+def format_sse(event: dict) -> bytes:
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+
+
+guild_event_bus = GuildEventBus(
+    max_queue=settings.GUILD_EVENTS_QUEUE_SIZE,
+    overflow=settings.GUILD_EVENTS_OVERFLOW,
+)
@@ -1,155 +1,505 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
-from database.database import  get_users_collection, get_guilds_collection
-from models.guild import GuildModel
+from database.database import  get_users_collection, get_guilds_collection, get_guild_members_collection
+from models.guild import GUILD_PROJECTION, guild_to_dict
+from utils.text_search import build_search_fields, normalize_name, search_terms
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+from utils.response_cache import invalidate_cache_tag
+from services.guild_events import guild_event_bus
+from services.guild_stats import (
+    USER_STATS_PROJECTION,
+    init_guild_stats,
+    add_members_to_stats,
+    remove_member_from_stats,
+    delete_guild_stats,
+)
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import random
+import re
 
 
-async def create_guild(user_id: str, guild_name: str, description: Optional[str] = None) -> GuildModel:
+async def create_guild(
+    user_id: str,
+    guild_name: str,
+    description: Optional[str] = None,
+    owner_name: Optional[str] = None,
+) -> dict:
     guilds = await get_guilds_collection()
-    users = await get_users_collection()
-
-    # Tên không được trùng
-    existing = await guilds.find_one({"guild_name": guild_name})
-    if existing:
-        raise ValueError("Tên guild đã tồn tại. Vui lòng chọn tên khác.")
 
-    user = await users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise ValueError("User không tồn tại")
-
-    user_name = user.get("name", "unknown")
+    # Route đã có tên user từ principal thì không cần đọc lại user
+    if owner_name is None:
+        users = await get_users_collection()
+        user = await users.find_one({"_id": ObjectId(user_id)}, {"name": 1})
+        if not user:
+            raise ValueError("User không tồn tại")
+        owner_name = user.get("name", "unknown")
 
     guild_data = {
         "guild_name": guild_name,
         "description": description,
         "owner_id": user_id,
-        "owner_name": user_name,
-        "members": [user_id],
+        "owner_name": owner_name,
+        "member_count": 1,
         "created_at": datetime.utcnow(),
+        **build_search_fields(guild_name, description),
     }
 
-    result = await guilds.insert_one(guild_data)
-    guild_data["_id"] = str(result.inserted_id)
-    return GuildModel(**guild_data)
+    # Tên không được trùng: unique index trên guild_name
+    try:
+        result = await guilds.insert_one(guild_data)
+    except DuplicateKeyError:
+        raise ValueError("Tên guild đã tồn tại. Vui lòng chọn tên khác.")
+
+    members = await get_guild_members_collection()
+    await members.insert_one({
+        "guild_id": result.inserted_id,
+        "user_id": user_id,
+        "joined_at": guild_data["created_at"],
+    })
+    await init_guild_stats(result.inserted_id, guild_name, user_id)
+    invalidate_cache_tag("guilds")
+
+    guild_data["_id"] = result.inserted_id
+    return guild_to_dict(guild_data)
+
+async def _add_member(guild_id: ObjectId, user_id: str, already_member_error: str) -> dict:
+    """
+    Thêm user vào guild: unique index (guild_id, user_id) chặn thêm trùng kể cả khi
+    có request đồng thời, sau đó tăng member_count và trả về guild sau khi cập nhật.
+    """
+    guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
+
+    try:
+        await members.insert_one({
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "joined_at": datetime.utcnow(),
+        })
+    except DuplicateKeyError:
+        raise ValueError(already_member_error)
+
+    updated = await guilds.find_one_and_update(
+        {"_id": guild_id},
+        {"$inc": {"member_count": 1}},
+        projection=GUILD_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if updated is None:
+        # Guild bị xoá giữa chừng: bỏ membership vừa thêm
+        await members.delete_one({"guild_id": guild_id, "user_id": user_id})
+        raise ValueError("Không tìm thấy guild")
+
+    await add_members_to_stats(guild_id, [user_id])
+    return guild_to_dict(updated)
 
 async def leave_guild(user_id: str, guild_name: str):
     guilds = await get_guilds_collection()
-    guild = await guilds.find_one({"guild_name": guild_name})
-    
+    members = await get_guild_members_collection()
+
+    guild = await guilds.find_one({"guild_name": guild_name}, {"owner_id": 1})
     if not guild:
         raise ValueError("Không tìm thấy guild")
 
-    if user_id not in guild["members"]:
-        raise ValueError("Bạn không thuộc guild này")
-
     # Nếu là chủ guild thì không cho rời (hoặc có logic khác tuỳ bạn)
     if guild["owner_id"] == user_id:
         raise ValueError("Chủ guild không thể rời guild")
 
-    await guilds.update_one(
+    result = await members.delete_one({"guild_id": guild["_id"], "user_id": user_id})
+    if not result.deleted_count:
+        raise ValueError("Bạn không thuộc guild này")
+
+    await remove_member_from_stats(guild["_id"], user_id)
+    updated = await guilds.find_one_and_update(
         {"_id": guild["_id"]},
-        {"$pull": {"members": user_id}}
+        {"$inc": {"member_count": -1}},
+        projection={"member_count": 1},
+        return_document=ReturnDocument.AFTER,
     )
+    invalidate_cache_tag("guilds")
+    if updated is not None:
+        guild_event_bus.publish(
+            str(guild["_id"]), "member_left", user_id=user_id, member_count=updated["member_count"]
+        )
+    # Không còn là thành viên: đóng stream event đang mở của user
+    guild_event_bus.close_user(str(guild["_id"]), user_id)
+
+
+async def get_guilds_by_user(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Guild mà user tham gia, theo thứ tự tham gia; keyset trên _id của membership.
+    Trả về (guilds, cursor trang sau).
+    """
+    guilds_collection = await get_guilds_collection()
+    members = await get_guild_members_collection()
 
+    query = {"user_id": user_id}
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        if not ObjectId.is_valid(last_id):
+            raise InvalidCursor("Cursor không hợp lệ")
+        query["_id"] = {"$gt": ObjectId(last_id)}
 
+    memberships = await (
+        members.find(query, {"guild_id": 1}).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    )
+    next_cursor = None
+    if len(memberships) > limit:
+        memberships = memberships[:limit]
+        next_cursor = encode_cursor([str(memberships[-1]["_id"])])
+
+    guild_ids = [m["guild_id"] for m in memberships]
+    guilds_by_id = {
+        guild["_id"]: guild
+        async for guild in guilds_collection.find({"_id": {"$in": guild_ids}}, GUILD_PROJECTION)
+    }
 
-
-async def get_guilds_by_user(user_id: str) -> List[GuildModel]:
-    guilds_collection = await get_guilds_collection()
-    cursor = guilds_collection.find({"members": user_id})
-
+    # Giữ thứ tự tham gia ($in không đảm bảo thứ tự)
     results = []
-    async for guild in cursor:
-        guild["_id"] = str(guild["_id"])
-        results.append(GuildModel(**guild))
+    for guild_id in guild_ids:
+        guild = guilds_by_id.get(guild_id)
+        if guild is not None:
+            results.append(guild_to_dict(guild))
     
-    if not results:
+    if not results and not cursor and next_cursor is None:
         raise ValueError("User chưa tham gia guild nào")
     
-    return results
+    return results, next_cursor
 
 
-
-async def invite_user_to_guild(owner_id: str, user_to_invite_id: str) -> GuildModel:
+async def get_guild_members(guild_name: str, limit: int = 50, after: Optional[str] = None) -> dict:
+    """
+    Danh sách thành viên theo thứ tự tham gia, phân trang theo _id của membership.
+    `after` là `next_after` của trang trước.
+    """
     guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
     users = await get_users_collection()
 
-    # Chỉ chủ guild mới được mời người
-    guild = await guilds.find_one({"owner_id": owner_id})
+    guild = await guilds.find_one({"guild_name": guild_name}, {"_id": 1})
     if not guild:
-        raise ValueError("Bạn không phải chủ guild")
-
-    if user_to_invite_id in guild["members"]:
-        raise ValueError("Người dùng đã có trong guild")
+        raise ValueError("Không tìm thấy guild")
 
-    await guilds.update_one(
-        {"_id": guild["_id"]},
-        {"$push": {"members": user_to_invite_id}}
-    )
+    query = {"guild_id": guild["_id"]}
+    if after:
+        if not ObjectId.is_valid(after):
+            raise ValueError("Cursor không hợp lệ")
+        query["_id"] = {"$gt": ObjectId(after)}
+
+    page = await members.find(query).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    # Lấy tên/avatar của cả trang bằng một query $in
+    user_ids = [ObjectId(m["user_id"]) for m in page if ObjectId.is_valid(m["user_id"])]
+    profiles = {
+        str(u["_id"]): u
+        async for u in users.find({"_id": {"$in": user_ids}}, {"name": 1, "avatar": 1})
+    }
 
-    updated = await guilds.find_one({"_id": guild["_id"]})
-    updated["_id"] = str(updated["_id"])  # ép ObjectId thành str
-    return GuildModel(**updated)
+    return {
+        "members": [
+            {
+                "user_id": m["user_id"],
+                "name": profiles.get(m["user_id"], {}).get("name"),
+                "avatar": profiles.get(m["user_id"], {}).get("avatar"),
+                "joined_at": m["joined_at"],
+            }
+            for m in page
+        ],
+        "next_after": str(page[-1]["_id"]) if has_more else None,
+    }
 
 
-async def reset_guild_for_user(user_id: str):
+async def get_member_guild_id(user_id: str, guild_name: str) -> str:
+    """_id (str) của guild nếu user là thành viên; ValueError nếu không"""
     guilds = await get_guilds_collection()
-    await guilds.delete_many({"owner_id": user_id})
+    members = await get_guild_members_collection()
 
-async def search_guilds_by_keyword(keyword: str) -> list[GuildModel]:
-    guilds = await get_guilds_collection()
-    cursor = guilds.find({"guild_name": {"$regex": keyword, "$options": "i"}}).limit(10)
-    results = []
-    async for guild in cursor:
-        guild["_id"] = str(guild["_id"])
-        results.append(GuildModel(**guild))
-    return results
+    guild = await guilds.find_one({"guild_name": guild_name}, {"_id": 1})
+    if not guild:
+        raise ValueError("Không tìm thấy guild")
+    if not await members.find_one({"guild_id": guild["_id"], "user_id": user_id}, {"_id": 1}):
+        raise ValueError("Bạn không thuộc guild này")
+    return str(guild["_id"])
 
-async def join_guild(user_id: str, guild_name: str) -> GuildModel:
+
+async def invite_user_to_guild(owner_id: str, user_to_invite_id: str) -> dict:
     guilds = await get_guilds_collection()
-    users = await get_users_collection()
 
-    # Tìm guild theo tên
-    guild = await guilds.find_one({"guild_name": guild_name})
+    # Chỉ chủ guild mới được mời người
+    guild = await guilds.find_one({"owner_id": owner_id}, {"_id": 1})
     if not guild:
-        raise ValueError("Không tìm thấy guild với tên đã nhập")
-
-    # Kiểm tra người dùng đã tham gia chưa
-    if user_id in guild["members"]:
-        raise ValueError("Bạn đã tham gia guild này rồi")
+        raise ValueError("Bạn không phải chủ guild")
 
-    # Cập nhật thêm user vào guild
-    await guilds.update_one(
-        {"_id": guild["_id"]},
-        {"$push": {"members": user_id}}
+    updated = await _add_member(guild["_id"], user_to_invite_id, "Người dùng đã có trong guild")
+    invalidate_cache_tag("guilds")
+    guild_event_bus.publish(
+        updated["_id"], "member_invited", user_id=user_to_invite_id, member_count=updated["member_count"]
     )
+    return updated
 
-    # Trả lại guild đã cập nhật
-    updated = await guilds.find_one({"_id": guild["_id"]})
-    updated["_id"] = str(updated["_id"])  # Convert ObjectId -> str
-    return GuildModel(**updated)
 
+async def bulk_invite_users_to_guild(owner_id: str, user_ids: List[str]) -> dict:
+    """
+    Mời nhiều user vào guild của owner. User được kiểm tra tồn tại bằng một query $in,
+    membership được thêm bằng một insert_many (unique index loại các user đã là thành viên)
+    và member_count tăng bằng một $inc. Trả về guild và trạng thái từng user:
+    added / already_member / not_found.
+    """
+    guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
+    users = await get_users_collection()
 
-async def get_guilds_with_min_members(min_members: int = 5) -> List[GuildModel]:
-    guilds_collection = await get_guilds_collection()
+    # Chỉ chủ guild mới được mời người
+    guild = await guilds.find_one({"owner_id": owner_id}, GUILD_PROJECTION)
+    if not guild:
+        raise ValueError("Bạn không phải chủ guild")
 
-    cursor = guilds_collection.find({
-        "$expr": {
-            "$gte": [
-                { "$size": "$members" },
-                min_members
-            ]
-        }
-    })
+    unique_ids = list(dict.fromkeys(user_ids))
+    object_ids = [ObjectId(user_id) for user_id in unique_ids if ObjectId.is_valid(user_id)]
+    found = {str(u["_id"]): u async for u in users.find({"_id": {"$in": object_ids}}, USER_STATS_PROJECTION)}
+
+    statuses = {user_id: "not_found" for user_id in unique_ids}
+    to_add = [user_id for user_id in unique_ids if user_id in found]
+    added = set()
+
+    if to_add:
+        now = datetime.utcnow()
+        try:
+            await members.insert_many(
+                [{"guild_id": guild["_id"], "user_id": user_id, "joined_at": now} for user_id in to_add],
+                ordered=False,
+            )
+            added = set(to_add)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            duplicates = {to_add[err["index"]] for err in errors}
+            added = set(to_add) - duplicates
+
+        for user_id in to_add:
+            statuses[user_id] = "added" if user_id in added else "already_member"
+
+    if added:
+        updated = await guilds.find_one_and_update(
+            {"_id": guild["_id"]},
+            {"$inc": {"member_count": len(added)}},
+            projection=GUILD_PROJECTION,
+            return_document=ReturnDocument.AFTER,
+        )
+        if updated is None:
+            # Guild bị xoá giữa chừng: bỏ các membership vừa thêm
+            await members.delete_many({"guild_id": guild["_id"], "user_id": {"$in": list(added)}})
+            raise ValueError("Không tìm thấy guild")
+        guild = updated
+        await add_members_to_stats(guild["_id"], list(added), [found[user_id] for user_id in added])
+        invalidate_cache_tag("guilds")
+        for user_id in to_add:
+            if user_id in added:
+                guild_event_bus.publish(
+                    str(guild["_id"]), "member_invited", user_id=user_id, member_count=guild["member_count"]
+                )
+
+    return {
+        "guild": guild_to_dict(guild),
+        "results": [{"user_id": user_id, "status": statuses[user_id]} for user_id in unique_ids],
+    }
 
-    results = []
-    async for guild in cursor:
-        guild["_id"] = str(guild["_id"])
-        results.append(GuildModel(**guild))
-    return results
 
+async def reset_guild_for_user(user_id: str):
+    guilds = await get_guilds_collection()
+    members = await get_guild_members_collection()
+
+    guild_ids = [g["_id"] async for g in guilds.find({"owner_id": user_id}, {"_id": 1})]
+    if not guild_ids:
+        return
+    await guilds.delete_many({"_id": {"$in": guild_ids}})
+    await members.delete_many({"guild_id": {"$in": guild_ids}})
+    await delete_guild_stats(guild_ids)
+    invalidate_cache_tag("guilds")
+    for guild_id in guild_ids:
+        guild_event_bus.publish(str(guild_id), "guild_deleted")
+        guild_event_bus.close_guild(str(guild_id))
+
+def _search_tiers(query_text: str, terms: List[str]) -> List[Tuple[int, dict]]:
+    """
+    Các nhóm xếp hạng của search, từ cao xuống thấp, mỗi nhóm là một filter riêng trên field
+    lưu sẵn (có index kèm member_count, _id) và loại trừ các nhóm cao hơn:
+      3 - trùng tên                  name_normalized == từ khoá
+      2 - tên bắt đầu bằng từ khoá   name_normalized ^từ khoá
+      1 - mọi từ khớp trong tên      name_tokens $all
+      0 - khớp mô tả                 search_tokens $all
+    Nhóm 2, 3 kéo theo name_tokens $all terms, nhóm 1 kéo theo search_tokens $all terms.
+    Từ khoá không có term nào (toàn ký hiệu) chỉ so khớp theo tên (nhóm 3, 2).
+    """
+    name_prefix = re.compile("^" + re.escape(query_text))
+    tiers = [
+        (3, {"name_normalized": query_text}),
+        (2, {"name_normalized": {"$regex": name_prefix, "$ne": query_text}}),
+    ]
+    if terms:
+        tiers += [
+            (1, {"name_tokens": {"$all": terms}, "name_normalized": {"$not": name_prefix}}),
+            (0, {"search_tokens": {"$all": terms}, "name_tokens": {"$not": {"$all": terms}}}),
+        ]
+    return tiers
+
+
+SEARCH_SORT = [("member_count", -1), ("_id", 1)]
+
+
+def _search_page_query(tier_query: dict, after: Optional[Tuple[int, ObjectId]] = None) -> dict:
+    """Filter của một nhóm search; after = (member_count, _id) của guild cuối trang trước trong nhóm"""
+    if after is None:
+        return tier_query
+    member_count, last_id = after
+    return {**tier_query, "$or": [
+        {"member_count": {"$lt": member_count}},
+        {"member_count": member_count, "_id": {"$gt": last_id}},
+    ]}
+
+
+async def search_guilds_by_keyword(
+    keyword: str,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Tìm guild theo tên/mô tả (không phân biệt hoa thường, dấu tiếng Việt; khớp prefix từng từ).
+    Xếp hạng: trùng tên > tên bắt đầu bằng từ khoá > mọi từ khớp trong tên > khớp mô tả,
+    sau đó theo số thành viên. Trả về (guilds, cursor trang sau).
+
+    Mỗi nhóm xếp hạng là một find riêng sort theo (member_count, _id) trên index của nhóm đó,
+    keyset nằm trong filter nên mỗi trang chỉ đọc tới limit + 1 key mỗi nhóm thay vì chấm điểm
+    toàn bộ guild khớp rồi mới sort.
+    """
+    terms = search_terms(keyword)
+    query_text = normalize_name(keyword)
+    if not query_text:
+        return [], None
+
+    after = None
+    if cursor:
+        tier, member_count, last_id = decode_cursor(cursor, 3)
+        if tier not in (0, 1, 2, 3) or not isinstance(member_count, int) or not ObjectId.is_valid(last_id):
+            raise InvalidCursor("Cursor không hợp lệ")
+        after = (tier, member_count, ObjectId(last_id))
 
+    guilds = await get_guilds_collection()
+    docs: List[dict] = []
+    for tier, query in _search_tiers(query_text, terms):
+        if after is not None and tier > after[0]:
+            continue
+        query = _search_page_query(query, after[1:] if after is not None and tier == after[0] else None)
+        remaining = limit + 1 - len(docs)
+        page = await (
+            guilds.find(query, GUILD_PROJECTION)
+            .sort(SEARCH_SORT)
+            .limit(remaining)
+            .to_list(length=remaining)
+        )
+        docs += [{**doc, "_score": tier} for doc in page]
+        if len(docs) > limit:
+            break
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor([last["_score"], last.get("member_count", 0), str(last["_id"])])
+
+    return [guild_to_dict(guild) for guild in docs], next_cursor
+
+async def join_guild(user_id: str, guild_name: str) -> dict:
+    guilds = await get_guilds_collection()
+
+    # Tìm guild theo tên
+    guild = await guilds.find_one({"guild_name": guild_name}, {"_id": 1})
+    if not guild:
+        raise ValueError("Không tìm thấy guild với tên đã nhập")
+
+    updated = await _add_member(guild["_id"], user_id, "Bạn đã tham gia guild này rồi")
+    invalidate_cache_tag("guilds")
+    guild_event_bus.publish(updated["_id"], "member_joined", user_id=user_id, member_count=updated["member_count"])
+    return updated
+
+
+EXPLORE_SORT = [("member_count", -1), ("created_at", -1), ("_id", -1)]
+
+
+def _explore_query(
+    min_members: int,
+    after: Optional[Tuple[int, Optional[datetime], ObjectId]] = None,
+) -> dict:
+    """Filter của explore; after = (member_count, created_at, _id) của guild cuối trang trước"""
+    query = {"member_count": {"$gte": min_members}}
+    if after is None:
+        return query
+    member_count, created_at, last_id = after
+    if created_at is None:
+        # Guild chưa có created_at xếp sau cùng trong nhóm cùng member_count
+        query["$or"] = [
+            {"member_count": {"$lt": member_count}},
+            {"member_count": member_count, "created_at": None, "_id": {"$lt": last_id}},
+        ]
+    else:
+        query["$or"] = [
+            {"member_count": {"$lt": member_count}},
+            {"member_count": member_count, "created_at": {"$lt": created_at}},
+            {"member_count": member_count, "created_at": None},
+            {"member_count": member_count, "created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    return query
+
+
+async def get_guilds_with_min_members(
+    min_members: int = 5,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Guild đông nhất (hoà thì mới nhất trước), keyset trên (member_count, created_at, _id)
+    theo đúng thứ tự của index. Trả về (guilds, cursor trang sau).
+    """
+    guilds_collection = await get_guilds_collection()
+
+    after = None
+    if cursor:
+        member_count, created_at, last_id = decode_cursor(cursor, 3)
+        if not ObjectId.is_valid(last_id):
+            raise InvalidCursor("Cursor không hợp lệ")
+        if created_at is not None:
+            try:
+                created_at = datetime.fromisoformat(created_at)
+            except (TypeError, ValueError):
+                raise InvalidCursor("Cursor không hợp lệ")
+        after = (member_count, created_at, ObjectId(last_id))
+
+    docs = await (
+        guilds_collection.find(_explore_query(min_members, after), GUILD_PROJECTION)
+        .sort(EXPLORE_SORT)
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
 
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        created_at = last.get("created_at")
+        next_cursor = encode_cursor([
+            last["member_count"],
+            created_at.isoformat() if created_at is not None else None,
+            str(last["_id"]),
+        ])
+
+    return [guild_to_dict(guild) for guild in docs], next_cursor
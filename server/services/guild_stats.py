@@ -0,0 +1,201 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from config.settings import settings
+from database.database import (
+    get_guild_members_collection,
+    get_guild_stats_collection,
+    get_users_collection,
+)
+from utils.logger import api_logger
+from utils.response_cache import invalidate_cache_tag
+
+# guild_stats (_id = _id của guild): tổng điểm, số thành viên và tổng trận thắng của
+# các thành viên. Cập nhật bằng $inc khi join/leave và khi điểm đổi (services.user_stats);
+# task nền recompute định kỳ từ guild_members + users để sửa drift.
+
+# field của user -> field tổng tương ứng trong guild_stats
+STAT_FIELDS = {
+    "total_point": "total_points",
+    "kicked_win": "kicked_wins",
+    "keep_win": "keep_wins",
+}
+USER_STATS_PROJECTION = {field: 1 for field in STAT_FIELDS}
+
+_recompute_task: Optional[asyncio.Task] = None
+
+
+def _stat_increments(users: Iterable[dict], sign: int = 1) -> Dict[str, int]:
+    increments = {total: 0 for total in STAT_FIELDS.values()}
+    count = 0
+    for user in users:
+        count += 1
+        for field, total in STAT_FIELDS.items():
+            increments[total] += sign * (user.get(field) or 0)
+    increments["member_count"] = sign * count
+    return increments
+
+
+async def load_user_stats(user_ids: List[str]) -> List[dict]:
+    """Các field điểm của user (bỏ qua id không hợp lệ / không tồn tại)"""
+    users = await get_users_collection()
+    object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+    if not object_ids:
+        return []
+    return await users.find({"_id": {"$in": object_ids}}, USER_STATS_PROJECTION).to_list(length=len(object_ids))
+
+
+async def init_guild_stats(guild_id: ObjectId, guild_name: str, owner_id: str) -> None:
+    """Tạo stats cho guild mới, với owner là thành viên đầu tiên"""
+    stats = await get_guild_stats_collection()
+    doc = {"_id": guild_id, "guild_name": guild_name, "updated_at": datetime.utcnow()}
+    doc.update(_stat_increments(await load_user_stats([owner_id])))
+    doc["member_count"] = 1
+    await stats.replace_one({"_id": guild_id}, doc, upsert=True)
+
+
+async def add_members_to_stats(guild_id: ObjectId, user_ids: List[str], users: Optional[List[dict]] = None) -> None:
+    """users: document điểm của user_ids nếu caller đã đọc sẵn (tránh đọc lại)"""
+    stats = await get_guild_stats_collection()
+    if users is None:
+        users = await load_user_stats(user_ids)
+    increments = _stat_increments(users)
+    increments["member_count"] = len(user_ids)
+    await stats.update_one({"_id": guild_id}, {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}})
+
+
+async def remove_member_from_stats(guild_id: ObjectId, user_id: str) -> None:
+    stats = await get_guild_stats_collection()
+    increments = _stat_increments(await load_user_stats([user_id]), sign=-1)
+    increments["member_count"] = -1
+    await stats.update_one({"_id": guild_id}, {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}})
+
+
+async def delete_guild_stats(guild_ids: List[ObjectId]) -> None:
+    stats = await get_guild_stats_collection()
+    await stats.delete_many({"_id": {"$in": guild_ids}})
+
+
+async def apply_user_stat_delta(user_id: str, total_point: int = 0, kicked_win: int = 0, keep_win: int = 0) -> None:
+    """Cộng delta điểm / trận thắng của user vào stats của mọi guild user đang ở"""
+    increments = {
+        STAT_FIELDS["total_point"]: total_point,
+        STAT_FIELDS["kicked_win"]: kicked_win,
+        STAT_FIELDS["keep_win"]: keep_win,
+    }
+    increments = {field: value for field, value in increments.items() if value}
+    if not increments:
+        return
+
+    members = await get_guild_members_collection()
+    guild_ids = [m["guild_id"] async for m in members.find({"user_id": user_id}, {"guild_id": 1})]
+    if not guild_ids:
+        return
+
+    stats = await get_guild_stats_collection()
+    await stats.update_many(
+        {"_id": {"$in": guild_ids}},
+        {"$inc": increments, "$set": {"updated_at": datetime.utcnow()}},
+    )
+    invalidate_cache_tag("guilds")
+
+
+async def recompute_guild_stats() -> int:
+    """
+    Tính lại toàn bộ guild_stats từ guild_members + users ($lookup theo _id của user,
+    dùng index _id) và $merge vào guild_stats. Stats của guild không còn được xoá.
+    Trả về số guild còn stats.
+
+    $merge chỉ ghi các field tính lại, và bỏ qua guild có $inc (join/leave/điểm đổi) từ lúc
+    bắt đầu: giá trị tính lại đã cũ so với $inc đó, lần recompute sau sẽ sửa nếu còn drift.
+    """
+    members = await get_guild_members_collection()
+    stats = await get_guild_stats_collection()
+    started = datetime.utcnow()
+
+    group = {"_id": "$guild_id", "member_count": {"$sum": 1}}
+    for field, total in STAT_FIELDS.items():
+        group[total] = {"$sum": {"$ifNull": [f"$user.{field}", 0]}}
+
+    pipeline = [
+        {"$project": {
+            "guild_id": 1,
+            "user_oid": {"$convert": {"input": "$user_id", "to": "objectId", "onError": None, "onNull": None}},
+        }},
+        {"$lookup": {"from": "users", "localField": "user_oid", "foreignField": "_id", "as": "user"}},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {"$group": group},
+        {"$lookup": {"from": "guilds", "localField": "_id", "foreignField": "_id", "as": "guild"}},
+        {"$unwind": "$guild"},
+        {"$addFields": {
+            "guild_name": "$guild.guild_name",
+            "updated_at": {"$literal": started},
+            "recomputed_at": {"$literal": started},
+        }},
+        {"$project": {"guild": 0}},
+        {"$merge": {
+            "into": stats.name,
+            "on": "_id",
+            "whenMatched": [{"$replaceWith": {"$cond": [
+                {"$gt": ["$updated_at", started]},
+                "$$ROOT",
+                {"$mergeObjects": ["$$ROOT", "$$new"]},
+            ]}}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await members.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+    # Guild bị xoá: stats không được merge lại và cũng không có cập nhật nào từ lúc bắt đầu
+    await stats.delete_many({"recomputed_at": {"$ne": started}, "updated_at": {"$lt": started}})
+    invalidate_cache_tag("guilds")
+    return await stats.count_documents({})
+
+
+async def get_guild_leaderboard(limit: int = 10) -> List[dict]:
+    """Top guild theo tổng điểm thành viên (index total_points -1, _id 1)"""
+    stats = await get_guild_stats_collection()
+    cursor = stats.find(
+        {},
+        {"guild_name": 1, "member_count": 1, "total_points": 1, "kicked_wins": 1, "keep_wins": 1},
+    ).sort([("total_points", -1), ("_id", 1)]).limit(limit)
+    return [
+        {
+            "_id": str(doc["_id"]),
+            "guild_name": doc["guild_name"],
+            "member_count": doc.get("member_count", 0),
+            "total_points": doc.get("total_points", 0),
+            "kicked_wins": doc.get("kicked_wins", 0),
+            "keep_wins": doc.get("keep_wins", 0),
+        }
+        async for doc in cursor
+    ]
+
+
+async def _recompute_loop():
+    while True:
+        await asyncio.sleep(settings.GUILD_STATS_RECOMPUTE_INTERVAL)
+        try:
+            count = await recompute_guild_stats()
+            api_logger.info(f"📊 Guild stats recomputed for {count} guilds")
+        except Exception as e:
+            api_logger.error(f"❌ Guild stats recompute failed: {str(e)}")
+
+
+def start_guild_stats() -> None:
+    """Gọi khi startup: chạy task nền recompute guild_stats định kỳ"""
+    global _recompute_task
+    if _recompute_task is None and settings.GUILD_STATS_RECOMPUTE_INTERVAL > 0:
+        _recompute_task = asyncio.create_task(_recompute_loop())
+
+
+async def stop_guild_stats() -> None:
+    global _recompute_task
+    if _recompute_task is not None:
+        _recompute_task.cancel()
+        try:
+            await _recompute_task
+        except asyncio.CancelledError:
+            pass
+        _recompute_task = None
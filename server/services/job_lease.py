@@ -0,0 +1,53 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database.database import get_job_checkpoints_collection
+
+# Lease dùng chung giữa các worker / process cho job nền chỉ được chạy ở một nơi
+# (vd. refill wallet pool). Lưu trong job_checkpoints với _id = lease:<tên job>.
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _lease_id(name: str) -> str:
+    return f"lease:{name}"
+
+
+async def acquire_lease(name: str, seconds: int, owner: Optional[str] = None) -> bool:
+    """
+    Giữ (hoặc gia hạn) lease `name` trong `seconds` giây. True nếu process này đang giữ lease;
+    False nếu process khác đang giữ và lease chưa hết hạn.
+    """
+    owner = owner or PROCESS_ID
+    checkpoints = await get_job_checkpoints_collection()
+    now = datetime.utcnow()
+    try:
+        lease = await checkpoints.find_one_and_update(
+            {
+                "_id": _lease_id(name),
+                "$or": [
+                    {"lease_owner": owner},
+                    {"lease_until": {"$lt": now}},
+                    {"lease_until": {"$exists": False}},
+                ],
+            },
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(seconds=seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Document lease đã tồn tại nhưng không khớp filter: process khác đang giữ
+        return False
+    return lease is not None
+
+
+async def release_lease(name: str, owner: Optional[str] = None) -> None:
+    checkpoints = await get_job_checkpoints_collection()
+    await checkpoints.update_one(
+        {"_id": _lease_id(name), "lease_owner": owner or PROCESS_ID},
+        {"$unset": {"lease_owner": "", "lease_until": ""}},
+    )
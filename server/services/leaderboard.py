@@ -0,0 +1,381 @@
+import asyncio
+import time
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from config.settings import settings
+from database.database import get_users_collection, get_leaderboard_snapshots_collection
+from services.job_lease import acquire_lease, release_lease
+from services.user_history import get_history_collection
+from services.week_rollover import get_rollover_watermark
+from utils.logger import api_logger
+from utils.weekly_utils import get_current_month_weeks, get_last_weeks
+
+# Bảng xếp hạng người chơi giữ trong bộ nhớ:
+#   all     - tổng trận thắng (kicked_win + keep_win)
+#   weekly  - điểm tuần hiện tại (total_point)
+#   monthly - điểm các tuần trong tháng (user_week_history của tháng + total_point)
+# Nạp khi startup (từ snapshot nếu còn mới, không thì quét users), cập nhật ngay khi điểm
+# thay đổi qua services.user_stats (process ghi), quét lại định kỳ (LEADERBOARD_RELOAD_INTERVAL)
+# để các worker khác thấy thay đổi, snapshot định kỳ vào Mongo để restart không phải quét lại.
+# Mỗi process đọc watermark của week rollover (tối đa mỗi LEADERBOARD_ROLLOVER_CHECK_INTERVAL,
+# khi có truy vấn) và quét lại khi watermark đổi: không process nào giữ điểm tuần đã rollover.
+
+BOARDS = ("all", "weekly", "monthly")
+SNAPSHOT_CHUNK_SIZE = 20000
+SNAPSHOT_META_ID = "meta"
+# Chỉ một worker ghi snapshot; worker giữ lease gia hạn mỗi lần ghi
+SNAPSHOT_LEASE = "leaderboard_snapshot"
+
+_snapshot_task: Optional[asyncio.Task] = None
+
+
+def _snapshot_chunks_query(snapshot_id) -> dict:
+    """Filter các chunk của snapshot (snapshot_id là giá trị hoặc điều kiện, vd. {"$ne": id})"""
+    return {"_id": {"$ne": SNAPSHOT_META_ID}, "snapshot_id": snapshot_id}
+
+
+class RankedBoard:
+    """
+    Mảng (-score, user_id) luôn được sắp xếp + map user_id -> score.
+    Rank / top / around tìm bằng bisect O(log n); cập nhật điểm là xoá + insort
+    (dịch mảng bằng memmove, rất nhanh với vài triệu phần tử).
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[int, str]] = []
+        self._scores: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def load(self, scores: Dict[str, int]) -> None:
+        self._scores = dict(scores)
+        self._keys = sorted((-score, user_id) for user_id, score in self._scores.items())
+
+    def entries(self) -> List[Tuple[str, int]]:
+        return [(user_id, -neg_score) for neg_score, user_id in self._keys]
+
+    def score(self, user_id: str) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def set(self, user_id: str, score: int) -> None:
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+        self._scores[user_id] = score
+        insort(self._keys, (-score, user_id))
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """Hạng (bắt đầu từ 1); cùng điểm thì xếp theo user_id"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, user_id)) + 1
+
+    def slice(self, start: int, stop: int) -> List[Tuple[int, str, int]]:
+        """(rank, user_id, score) của các vị trí [start, stop)"""
+        start = max(start, 0)
+        return [
+            (start + offset + 1, user_id, -neg_score)
+            for offset, (neg_score, user_id) in enumerate(self._keys[start:stop])
+        ]
+
+    def top(self, limit: int) -> List[Tuple[int, str, int]]:
+        return self.slice(0, limit)
+
+    def around(self, user_id: str, radius: int) -> List[Tuple[int, str, int]]:
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        return self.slice(rank - 1 - radius, rank + radius)
+
+
+class PlayerLeaderboard:
+    def __init__(self):
+        self.boards: Dict[str, RankedBoard] = {name: RankedBoard() for name in BOARDS}
+        self.week: Optional[str] = None
+        self.month: Optional[str] = None
+        self.rolled_week: Optional[str] = None
+        self.rollover_checked_at = 0.0
+        self.loaded_at: Optional[float] = None
+        self.source: Optional[str] = None
+        self._reload_lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+
+    # --- Nạp dữ liệu ---
+
+    async def load(self) -> Dict[str, int]:
+        """Gọi khi startup: dùng snapshot nếu còn hợp lệ, không thì quét users"""
+        if not await self._load_snapshot():
+            await self.reload()
+        return self.counts()
+
+    async def reload(self) -> Dict[str, int]:
+        """Quét lại toàn bộ users (chỉ 2 con số mỗi user) và điểm tuần trong tháng"""
+        async with self._reload_lock:
+            users = await get_users_collection()
+            # Đọc trước khi quét: rollover xong giữa chừng thì lần kiểm tra sau sẽ quét lại
+            rolled_week = await get_rollover_watermark()
+            week = get_last_weeks(1)[0]
+            month, month_weeks = get_current_month_weeks()
+
+            pipeline = [
+                {"$project": {
+                    "_id": 1,
+                    "weekly": {"$ifNull": ["$total_point", 0]},
+                    "wins": {"$add": [{"$ifNull": ["$kicked_win", 0]}, {"$ifNull": ["$keep_win", 0]}]},
+                }},
+            ]
+            scores = {name: {} for name in BOARDS}
+            async for row in users.aggregate(pipeline, allowDiskUse=True):
+                user_id = str(row["_id"])
+                scores["all"][user_id] = int(row["wins"])
+                scores["weekly"][user_id] = int(row["weekly"])
+                scores["monthly"][user_id] = int(row["weekly"])
+
+            # Điểm các tuần đã rollover trong tháng (index week của user_week_history)
+            history = await get_history_collection("week")
+            async for row in history.aggregate([
+                {"$match": {"week": {"$in": month_weeks}}},
+                {"$group": {"_id": "$user_id", "points": {"$sum": "$point"}}},
+            ]):
+                if row["_id"] in scores["monthly"]:
+                    scores["monthly"][row["_id"]] += int(row["points"])
+
+            for name, board in self.boards.items():
+                board.load(scores[name])
+            self.week, self.month, self.rolled_week = week, month, rolled_week
+            self.loaded_at = self.rollover_checked_at = time.time()
+            self.source = "users"
+        return self.counts()
+
+    def _is_stale(self) -> bool:
+        interval = settings.LEADERBOARD_RELOAD_INTERVAL
+        return interval > 0 and (self.loaded_at is None or time.time() - self.loaded_at > interval)
+
+    def _rollover_check_due(self) -> bool:
+        interval = settings.LEADERBOARD_ROLLOVER_CHECK_INTERVAL
+        return interval > 0 and time.time() - self.rollover_checked_at > interval
+
+    def _reload_in_background(self, only_if_rolled_over: bool = False) -> None:
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._background_reload(only_if_rolled_over))
+
+    async def _background_reload(self, only_if_rolled_over: bool) -> None:
+        try:
+            if only_if_rolled_over:
+                self.rollover_checked_at = time.time()
+                if await get_rollover_watermark() == self.rolled_week:
+                    return
+                api_logger.info("🏆 Week rollover detected, reloading leaderboard")
+            await self.reload()
+        except Exception as e:
+            api_logger.error(f"❌ Leaderboard reload failed: {str(e)}")
+
+    def _board(self, name: str) -> RankedBoard:
+        if self._is_stale():
+            self._reload_in_background()
+        elif self._rollover_check_due():
+            self._reload_in_background(only_if_rolled_over=True)
+        return self.boards[name]
+
+    # --- Cập nhật tăng dần ---
+
+    def add_user(self, user_id: str) -> None:
+        """User mới: điểm 0 ở mọi bảng"""
+        for board in self.boards.values():
+            if board.score(user_id) is None:
+                board.set(user_id, 0)
+
+    def update_user(self, user_id: str, user: dict, point_delta: int = 0) -> None:
+        """Điểm / trận thắng của user vừa đổi (document sau $inc): đặt điểm mới trên các bảng"""
+        self.boards["all"].set(user_id, (user.get("kicked_win") or 0) + (user.get("keep_win") or 0))
+        self.boards["weekly"].set(user_id, user.get("total_point") or 0)
+        if point_delta:
+            monthly = self.boards["monthly"]
+            monthly.set(user_id, (monthly.score(user_id) or 0) + point_delta)
+
+    # --- Truy vấn ---
+
+    async def top(self, board: str, limit: int) -> List[dict]:
+        return await _with_profiles(self._board(board).top(limit))
+
+    async def my_rank(self, board: str, user_id: str, radius: int = 0) -> Optional[dict]:
+        ranked = self._board(board)
+        rank = ranked.rank(user_id)
+        if rank is None:
+            return None
+        return {
+            "board": board,
+            "rank": rank,
+            "score": ranked.score(user_id),
+            "total": len(ranked),
+            "around": await _with_profiles(ranked.around(user_id, radius)) if radius else [],
+        }
+
+    def counts(self) -> Dict[str, int]:
+        return {name: len(board) for name, board in self.boards.items()}
+
+    def stats(self) -> dict:
+        return {
+            "players": self.counts(),
+            "week": self.week,
+            "month": self.month,
+            "rolled_week": self.rolled_week,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+        }
+
+    # --- Snapshot ---
+
+    async def save_snapshot(self) -> bool:
+        """
+        Ghi snapshot theo chunk với snapshot_id mới, đổi meta rồi xoá chunk cũ. Chỉ worker giữ
+        lease SNAPSHOT_LEASE được ghi; False nếu worker khác đang giữ lease.
+        """
+        if self.loaded_at is None:
+            return False
+        lease_seconds = settings.LEADERBOARD_SNAPSHOT_LEASE_SECONDS
+        if not await acquire_lease(SNAPSHOT_LEASE, lease_seconds):
+            return False
+        snapshots = await get_leaderboard_snapshots_collection()
+        snapshot_id = uuid.uuid4().hex
+        chunks = {}
+        for name, board in self.boards.items():
+            entries = board.entries()
+            docs = [
+                {
+                    "_id": f"{snapshot_id}:{name}:{index}",
+                    "snapshot_id": snapshot_id,
+                    "board": name,
+                    "chunk": index,
+                    "entries": entries[start:start + SNAPSHOT_CHUNK_SIZE],
+                }
+                for index, start in enumerate(range(0, len(entries), SNAPSHOT_CHUNK_SIZE))
+            ]
+            if docs:
+                await snapshots.insert_many(docs, ordered=False)
+            chunks[name] = len(docs)
+
+        # Ghi chunk lâu hơn lease: worker khác có thể đã nhận lease, bỏ snapshot này
+        if not await acquire_lease(SNAPSHOT_LEASE, lease_seconds):
+            await snapshots.delete_many(_snapshot_chunks_query(snapshot_id))
+            return False
+        await snapshots.replace_one(
+            {"_id": SNAPSHOT_META_ID},
+            {
+                "_id": SNAPSHOT_META_ID,
+                "snapshot_id": snapshot_id,
+                "week": self.week,
+                "month": self.month,
+                "rolled_week": self.rolled_week,
+                "chunks": chunks,
+                "saved_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+        # Chỉ xoá chunk cũ khi meta vẫn trỏ tới snapshot này
+        meta = await snapshots.find_one({"_id": SNAPSHOT_META_ID}, {"snapshot_id": 1})
+        if meta and meta["snapshot_id"] == snapshot_id:
+            await snapshots.delete_many(_snapshot_chunks_query({"$ne": snapshot_id}))
+        return True
+
+    async def _load_snapshot(self) -> bool:
+        snapshots = await get_leaderboard_snapshots_collection()
+        meta = await snapshots.find_one({"_id": SNAPSHOT_META_ID})
+        if not meta:
+            return False
+        age = (datetime.utcnow() - meta["saved_at"]).total_seconds()
+        week = get_last_weeks(1)[0]
+        month, _ = get_current_month_weeks()
+        # Snapshot của tuần / tháng trước hoặc chụp trước lần rollover mới nhất: bỏ, quét lại users
+        if age > settings.LEADERBOARD_SNAPSHOT_MAX_AGE or meta.get("week") != week or meta.get("month") != month:
+            return False
+        rolled_week = await get_rollover_watermark()
+        if meta.get("rolled_week") != rolled_week:
+            return False
+
+        scores = {name: {} for name in BOARDS}
+        chunks = dict.fromkeys(BOARDS, 0)
+        async for chunk in snapshots.find(_snapshot_chunks_query(meta["snapshot_id"])):
+            scores[chunk["board"]].update((user_id, score) for user_id, score in chunk["entries"])
+            chunks[chunk["board"]] += 1
+        # Snapshot thiếu chunk (ghi dở / đã bị xoá) thì bỏ, quét lại users
+        if any(chunks[name] != meta["chunks"].get(name, 0) for name in BOARDS):
+            return False
+
+        for name, board in self.boards.items():
+            board.load(scores[name])
+        self.week, self.month, self.rolled_week = meta["week"], meta["month"], rolled_week
+        self.loaded_at = time.time() - age
+        self.rollover_checked_at = time.time()
+        self.source = "snapshot"
+        return True
+
+
+async def _with_profiles(rows: List[Tuple[int, str, int]]) -> List[dict]:
+    """Gắn tên / avatar cho các dòng xếp hạng (một query $in)"""
+    if not rows:
+        return []
+    users = await get_users_collection()
+    ids = [ObjectId(user_id) for _, user_id, _ in rows if ObjectId.is_valid(user_id)]
+    profiles = {
+        str(u["_id"]): u
+        async for u in users.find({"_id": {"$in": ids}}, {"name": 1, "avatar": 1})
+    }
+    return [
+        {
+            "rank": rank,
+            "user_id": user_id,
+            "name": profiles.get(user_id, {}).get("name"),
+            "avatar": profiles.get(user_id, {}).get("avatar"),
+            "score": score,
+        }
+        for rank, user_id, score in rows
+    ]
+
+
+player_leaderboard = PlayerLeaderboard()
+
+
+async def _snapshot_loop():
+    while True:
+        await asyncio.sleep(settings.LEADERBOARD_SNAPSHOT_INTERVAL)
+        try:
+            await player_leaderboard.save_snapshot()
+        except Exception as e:
+            api_logger.error(f"❌ Leaderboard snapshot failed: {str(e)}")
+
+
+async def start_leaderboard() -> None:
+    """Gọi khi startup: nạp bảng xếp hạng và chạy task snapshot định kỳ"""
+    global _snapshot_task
+    try:
+        counts = await player_leaderboard.load()
+        api_logger.info(f"🏆 Leaderboard loaded from {player_leaderboard.source}: {counts}")
+    except Exception as e:
+        api_logger.error(f"❌ Leaderboard load failed: {str(e)}")
+    if _snapshot_task is None and settings.LEADERBOARD_SNAPSHOT_INTERVAL > 0:
+        _snapshot_task = asyncio.create_task(_snapshot_loop())
+
+
+async def stop_leaderboard() -> None:
+    """Gọi khi shutdown: dừng task, ghi snapshot cuối rồi nhả lease cho worker khác"""
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        try:
+            await _snapshot_task
+        except asyncio.CancelledError:
+            pass
+        _snapshot_task = None
+    try:
+        await player_leaderboard.save_snapshot()
+        await release_lease(SNAPSHOT_LEASE)
+    except Exception as e:
+        api_logger.error(f"❌ Leaderboard snapshot failed: {str(e)}")
@@ -0,0 +1,89 @@
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional
+from config.settings import settings
+from database.database import get_skills_collection
+from utils.logger import api_logger
+
+
+class SkillCatalog:
+    """
+    Danh sách skill (nhóm theo type) giữ trong bộ nhớ của process.
+    Hết TTL thì reload ở nền và vẫn trả dữ liệu cũ, nên random skill không bao giờ chờ DB
+    (trừ lần đầu khi catalog còn rỗng).
+    """
+
+    def __init__(self, ttl: float, miss_reload_interval: float = 5):
+        self.ttl = ttl
+        self.miss_reload_interval = miss_reload_interval
+        self._by_type: Dict[str, List[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._reload_lock = asyncio.Lock()
+        self._reload_task: Optional[asyncio.Task] = None
+
+    async def _load(self) -> None:
+        """
+        Đọc catalog từ DB (gọi khi đang giữ _reload_lock). Kết quả rỗng coi như chưa load:
+        giữ dữ liệu cũ và để _loaded_at như cũ để lần gọi sau thử lại thay vì cache rỗng hết TTL.
+        """
+        skills_collection = await get_skills_collection()
+        by_type: Dict[str, List[str]] = {}
+        async for skill in skills_collection.find({}, {"_id": 0, "type": 1, "name": 1}):
+            if skill.get("type") and skill.get("name"):
+                by_type.setdefault(skill["type"], []).append(skill["name"])
+        if not by_type:
+            api_logger.warning("⚠️ Skill catalog is empty, will retry on next request")
+            return
+        self._by_type = by_type
+        self._loaded_at = time.monotonic()
+
+    async def reload(self) -> Dict[str, int]:
+        """Đọc lại toàn bộ catalog từ DB. Trả về số skill theo từng type"""
+        async with self._reload_lock:
+            await self._load()
+        return self.counts()
+
+    async def _ensure_loaded(self) -> None:
+        async with self._reload_lock:
+            # Caller khác có thể vừa load xong trong lúc chờ lock
+            if self._loaded_at is None:
+                await self._load()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _reload_in_background(self) -> None:
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._safe_reload())
+
+    async def _safe_reload(self) -> None:
+        try:
+            await self.reload()
+        except Exception as e:
+            api_logger.error(f"❌ Skill catalog reload failed: {str(e)}")
+
+    async def random_skill(self, skill_type: str) -> Optional[str]:
+        """Trả về tên một skill ngẫu nhiên của type, None nếu catalog không có type đó"""
+        if self._loaded_at is None:
+            # Lần đầu (hoặc các lần load trước rỗng / lỗi): chờ load, chỉ một caller đọc DB
+            await self._ensure_loaded()
+        elif self._is_stale():
+            self._reload_in_background()
+
+        names = self._by_type.get(skill_type)
+        if not names:
+            # Type chưa có trong catalog (skill mới thêm vào DB): reload ở nền, có giãn cách
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at > self.miss_reload_interval:
+                self._reload_in_background()
+            return None
+        return random.choice(names)
+
+    def counts(self) -> Dict[str, int]:
+        return {skill_type: len(names) for skill_type, names in self._by_type.items()}
+
+
+skill_catalog = SkillCatalog(
+    ttl=settings.SKILL_CATALOG_TTL,
+    miss_reload_interval=settings.SKILL_CATALOG_MISS_RELOAD_INTERVAL,
+)
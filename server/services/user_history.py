@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from database.database import get_database
+from utils.pagination import encode_cursor, decode_cursor, InvalidCursor
+
+# Lịch sử "lạnh" của user tách khỏi document users (chỉ còn field nóng, kích thước gần như
+# cố định). Mỗi loại một collection, document có user_id (str) và được đánh index theo user.
+#   match       - user_match_history        (user_id, _id)    mới nhất trước
+#   mystery_box - user_mystery_box_history  (user_id, _id)    mới nhất trước
+#   week        - user_week_history         (user_id, week)   unique, tuần mới nhất trước
+#   invite_code - user_invite_codes         (user_id, code)   unique; phân trang theo (user_id, _id)
+
+HISTORY_COLLECTIONS = {
+    "match": "user_match_history",
+    "mystery_box": "user_mystery_box_history",
+    "week": "user_week_history",
+    "invite_code": "user_invite_codes",
+}
+
+# Field mảng cũ trong users tương ứng với từng loại (dùng cho migration)
+LEGACY_USER_FIELDS = {
+    "match": "match_history",
+    "mystery_box": "mystery_box_history",
+    "week": "week_history",
+    "invite_code": "used_invite_codes",
+}
+
+# Loại lịch sử có khoá tự nhiên tăng theo thời gian: phân trang theo khoá đó thay vì _id.
+# code của invite_code là ngẫu nhiên nên vẫn phân trang theo _id (mới nhất trước)
+_KEY_FIELDS = {"week": "week"}
+
+
+def _history_query(kind: str, user_id: str, last: Any = None) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+    """(filter, sort) một trang lịch sử, mới nhất trước; last = khoá của item cuối trang trước"""
+    key = _KEY_FIELDS.get(kind, "_id")
+    query: Dict[str, Any] = {"user_id": user_id}
+    if last is not None:
+        query[key] = {"$lt": last}
+    return query, [(key, -1)]
+
+
+async def get_history_collection(kind: str):
+    db = await get_database()
+    return db[HISTORY_COLLECTIONS[kind]]
+
+
+async def get_week_points(user_ids: List[str], weeks: List[str]) -> Dict[str, List[dict]]:
+    """Entry week_history của nhiều user trong các tuần cho trước: user_id -> [entry]"""
+    collection = await get_history_collection("week")
+    result: Dict[str, List[dict]] = {user_id: [] for user_id in user_ids}
+    async for entry in collection.find(
+        {"user_id": {"$in": user_ids}, "week": {"$in": weeks}},
+        {"_id": 0, "user_id": 1, "week": 1, "point": 1},
+    ):
+        result[entry["user_id"]].append(entry)
+    return result
+
+
+async def get_history_page(
+    kind: str,
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Một trang lịch sử của user, mới nhất trước. Trả về (items, cursor trang sau)"""
+    collection = await get_history_collection(kind)
+    key = _KEY_FIELDS.get(kind, "_id")
+
+    last = None
+    if cursor:
+        (last,) = decode_cursor(cursor, 1)
+        if key == "_id":
+            if not ObjectId.is_valid(last):
+                raise InvalidCursor("Cursor không hợp lệ")
+            last = ObjectId(last)
+
+    query, sort = _history_query(kind, user_id, last)
+    docs = await collection.find(query).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([str(docs[-1][key])])
+
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from database.database import get_users_collection
+from services.guild_stats import apply_user_stat_delta
+from services.leaderboard import player_leaderboard
+from services.user_history import get_week_points
+from utils.weekly_utils import get_last_weeks, get_weekly_stats_batch, weekly_points_update
+
+
+async def increment_user_stats(user_id: str, total_point: int = 0, kicked_win: int = 0, keep_win: int = 0) -> Optional[dict]:
+    """
+    Đường ghi duy nhất cho thay đổi điểm / trận thắng của user: $inc trên users (điểm được gắn
+    tuần qua weekly_points_update để week rollover tách đúng tuần) rồi cập nhật leaderboard
+    trong bộ nhớ theo document sau khi ghi và guild_stats bằng cùng delta. Trả về các field
+    điểm mới, None nếu không có delta.
+    """
+    increments = {field: value for field, value in (("kicked_win", kicked_win), ("keep_win", keep_win)) if value}
+    if total_point:
+        increments.update(weekly_points_update(total_point))
+    if not increments:
+        return None
+
+    users = await get_users_collection()
+    user = await users.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": increments},
+        projection={"total_point": 1, "kicked_win": 1, "keep_win": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if user is None:
+        raise ValueError("User not found")
+
+    player_leaderboard.update_user(user_id, user, total_point)
+    await apply_user_stat_delta(user_id, total_point, kicked_win, keep_win)
+    return user
+
+
+async def load_weekly_stats(user_ids: List[str], now: Optional[datetime] = None) -> Dict[str, List[dict]]:
+    """
+    Thống kê 5 tuần gần nhất của nhiều user: một query users ($in) và một query
+    user_week_history cho cả batch. user_id không tồn tại thì không có trong kết quả.
+    """
+    object_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+    if not object_ids:
+        return {}
+    users = await get_users_collection()
+    docs = await users.find(
+        {"_id": {"$in": object_ids}},
+        {"weekly_logins": 1, "total_point": 1},
+    ).to_list(length=len(object_ids))
+
+    found = [str(doc["_id"]) for doc in docs]
+    week_points = await get_week_points(found, get_last_weeks(5, now))
+    for user_id, doc in zip(found, docs):
+        doc["week_history"] = week_points[user_id]
+    return dict(zip(found, get_weekly_stats_batch(docs, now)))
@@ -0,0 +1,160 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+from config.settings import settings
+from database.database import get_wallets_collection
+from utils.logger import api_logger
+from utils.wallet_generator import generate_evm_wallet
+from services.job_lease import acquire_lease, release_lease
+
+# Dự trữ ví đã tạo sẵn (mnemonic + private key đã mã hoá) trong collection `wallets`.
+# Đăng ký chỉ cần claim một ví bằng một lệnh find_one_and_update.
+
+REFILL_LEASE = "wallet_pool_refill"
+
+_executor: Optional[ProcessPoolExecutor] = None
+_refill_task: Optional[asyncio.Task] = None
+_refill_wakeup: Optional[asyncio.Event] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.WALLET_POOL_WORKERS)
+    return _executor
+
+
+async def _generate_wallets(count: int) -> list[Dict]:
+    """Sinh `count` ví trên process pool (PBKDF2 + eth_account + Fernet đều tốn CPU)"""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    return await asyncio.gather(*[
+        loop.run_in_executor(executor, generate_evm_wallet) for _ in range(count)
+    ])
+
+
+async def refill_wallet_pool() -> int:
+    """
+    Bổ sung ví cho đến khi đủ WALLET_POOL_SIZE ví chưa claim. Trả về số ví đã thêm.
+    Chỉ chạy khi giữ lease "wallet_pool_refill": nhiều worker cùng refill sẽ mỗi worker đếm
+    rồi tự thêm đủ phần thiếu, làm pool vượt quá kích thước.
+    """
+    if not await acquire_lease(REFILL_LEASE, settings.WALLET_POOL_REFILL_LEASE_SECONDS):
+        return 0
+
+    wallets = await get_wallets_collection()
+    added = 0
+    try:
+        while True:
+            # Đếm lại mỗi batch trong lease: claim có thể đã lấy bớt ví trong lúc sinh
+            available = await wallets.count_documents({"status": "available"})
+            missing = settings.WALLET_POOL_SIZE - available
+            if missing <= 0:
+                break
+            batch = min(missing, settings.WALLET_POOL_BATCH_SIZE)
+            generated = await _generate_wallets(batch)
+            # Lease hết hạn trong lúc sinh ví (process khác đã nhận): bỏ batch này
+            if not await acquire_lease(REFILL_LEASE, settings.WALLET_POOL_REFILL_LEASE_SECONDS):
+                break
+            now = datetime.utcnow()
+            await wallets.insert_many([
+                {**wallet, "status": "available", "created_at": now}
+                for wallet in generated
+            ])
+            added += batch
+    finally:
+        await release_lease(REFILL_LEASE)
+
+    return added
+
+
+async def claim_wallet(user_id: str) -> Dict:
+    """
+    Gán một ví trong pool cho user và trả về ví kèm key material.
+    Key material bị xoá khỏi collection `wallets` khi claim, để nó chỉ còn được lưu
+    một lần trong document user. Pool rỗng thì sinh ngay một ví (vẫn ngoài event loop).
+    """
+    wallets = await get_wallets_collection()
+    now = datetime.utcnow()
+    wallet = await wallets.find_one_and_update(
+        {"status": "available"},
+        {
+            "$set": {"status": "claimed", "user_id": user_id, "claimed_at": now},
+            "$unset": {"mnemonic": "", "private_key": ""},
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    if _refill_wakeup is not None:
+        _refill_wakeup.set()
+
+    if wallet is None:
+        api_logger.warning("⚠️ Wallet pool empty, generating wallet inline")
+        wallet = (await _generate_wallets(1))[0]
+        result = await wallets.insert_one({
+            "public_address": wallet["public_address"],
+            "status": "claimed",
+            "user_id": user_id,
+            "created_at": now,
+            "claimed_at": now,
+        })
+        wallet["_id"] = result.inserted_id
+
+    return wallet
+
+
+async def release_wallet(wallet: Dict) -> None:
+    """Trả ví đã claim (kèm key material) về pool, vd. khi đăng ký thất bại sau khi claim"""
+    wallets = await get_wallets_collection()
+    await wallets.update_one(
+        {"_id": wallet["_id"]},
+        {
+            "$set": {
+                "status": "available",
+                "mnemonic": wallet["mnemonic"],
+                "private_key": wallet["private_key"],
+            },
+            "$unset": {"user_id": "", "claimed_at": ""},
+        },
+    )
+
+
+async def _refill_loop():
+    while True:
+        try:
+            added = await refill_wallet_pool()
+            if added:
+                api_logger.info(f"👛 Wallet pool refilled with {added} wallets")
+        except Exception as e:
+            api_logger.error(f"❌ Wallet pool refill failed: {str(e)}")
+
+        _refill_wakeup.clear()
+        try:
+            await asyncio.wait_for(_refill_wakeup.wait(), timeout=settings.WALLET_POOL_REFILL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_wallet_pool() -> None:
+    """Gọi khi startup: chạy task nền giữ pool luôn đủ ví"""
+    global _refill_task, _refill_wakeup
+    if _refill_task is None:
+        _refill_wakeup = asyncio.Event()
+        _refill_task = asyncio.create_task(_refill_loop())
+
+
+async def stop_wallet_pool() -> None:
+    global _refill_task, _executor
+    if _refill_task is not None:
+        _refill_task.cancel()
+        try:
+            await _refill_task
+        except asyncio.CancelledError:
+            pass
+        _refill_task = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
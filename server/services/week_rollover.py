@@ -0,0 +1,265 @@
+"""
+Rollover điểm tuần: đưa điểm của tuần đã kết thúc vào user_week_history và trừ khỏi total_point.
+
+Watermark (job_checkpoints, _id = week_rollover:watermark) là tuần mới nhất đã rollover; các tuần
+được rollover lần lượt, chỉ tuần ngay sau watermark và chỉ khi tuần đó đã kết thúc. Lần chạy đầu
+tiên (chưa có watermark) chỉ đặt watermark là tuần vừa kết thúc, không rollover: total_point lúc
+đó không biết thuộc tuần nào nên được tính cho tuần hiện tại.
+
+Điểm được gắn tuần bằng weekly_points_update (week_points.<tuần> cộng cùng total_point). Điểm của
+tuần W = total_point trừ phần đã gắn các tuần sau W, nên điểm kiếm được sau 0h thứ 2 (trước khi
+job chạy) vẫn ở lại tuần mới; điểm cộng không qua weekly_points_update tính cho tuần đang rollover.
+
+Quét users theo _id từng chunk, mỗi chunk bulk_write upsert entry (user_id, week) rồi bulk_write
+$inc total_point âm. Tiến độ lưu ở job_checkpoints (_id = week_rollover:<tuần>) nên chạy lại sẽ
+tiếp từ chunk cuối; users.last_rollover_week (< tuần) làm mỗi user chỉ được rollover một lần.
+
+Task nền kiểm tra định kỳ (WEEK_ROLLOVER_CHECK_INTERVAL) và rollover các tuần đã kết thúc.
+CLI (chạy từ thư mục server):
+    python -m services.week_rollover                  # rollover tuần tiếp theo đã kết thúc
+    python -m services.week_rollover --week 2025-07   # chỉ chạy nếu 2025-07 là tuần tiếp theo
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from config.settings import settings
+from database.database import get_users_collection, get_job_checkpoints_collection
+from services.user_history import get_history_collection
+from services.guild_stats import recompute_guild_stats
+from utils.logger import api_logger
+from utils.time_utils import get_vietnam_time
+from utils.weekly_utils import get_last_weeks, next_week
+
+WATERMARK_ID = "week_rollover:watermark"
+
+_rollover_task: Optional[asyncio.Task] = None
+
+
+def previous_week() -> str:
+    """Tuần vừa kết thúc (nhãn theo thứ 2 của tuần, như get_weekly_stats dùng)"""
+    return get_last_weeks(2)[0]
+
+
+def _checkpoint_id(week: str) -> str:
+    return f"week_rollover:{week}"
+
+
+async def _pending_week(checkpoints) -> Optional[str]:
+    """
+    Tuần tiếp theo cần rollover (ngay sau watermark, đã kết thúc). Chưa có watermark thì đặt
+    watermark là tuần vừa kết thúc và không rollover gì.
+    """
+    watermark = await checkpoints.find_one_and_update(
+        {"_id": WATERMARK_ID},
+        {"$setOnInsert": {"week": previous_week(), "seeded_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if watermark is None:
+        api_logger.info(f"🔁 Week rollover watermark seeded at {previous_week()}")
+        return None
+    week = next_week(watermark["week"])
+    return week if week <= previous_week() else None
+
+
+async def get_rollover_watermark() -> Optional[str]:
+    """Tuần mới nhất đã rollover (None nếu job chưa chạy lần nào)"""
+    checkpoints = await get_job_checkpoints_collection()
+    watermark = await checkpoints.find_one({"_id": WATERMARK_ID}, {"week": 1})
+    return watermark["week"] if watermark else None
+
+
+async def _advance_watermark(checkpoints, week: str) -> None:
+    await checkpoints.update_one(
+        {"_id": WATERMARK_ID, "week": {"$lt": week}},
+        {"$set": {"week": week, "updated_at": datetime.utcnow()}},
+    )
+
+
+async def _acquire(checkpoints, week: str) -> Optional[Dict]:
+    """Giữ lease của job tuần `week`. None nếu tuần đã xong hoặc đang có process khác chạy"""
+    now = datetime.utcnow()
+    try:
+        return await checkpoints.find_one_and_update(
+            {
+                "_id": _checkpoint_id(week),
+                "status": {"$ne": "done"},
+                "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}],
+            },
+            {
+                "$set": {"status": "running", "lease_until": now + timedelta(seconds=settings.WEEK_ROLLOVER_LEASE_SECONDS)},
+                "$setOnInsert": {"week": week, "last_id": None, "scanned": 0, "rolled": 0, "started_at": now},
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # Checkpoint đã tồn tại nhưng không khớp filter: đã xong hoặc lease còn hạn
+        return None
+
+
+def _closed_points(user: Dict, week: str) -> int:
+    """Điểm của tuần `week` trong total_point: phần chưa gắn cho các tuần sau `week`"""
+    later = sum(points for tagged, points in (user.get("week_points") or {}).items() if tagged > week)
+    return (user.get("total_point") or 0) - later
+
+
+async def _roll_chunk(users, history, week: str, chunk: List[Dict], reset_at: str) -> int:
+    """
+    Hai bulk_write: upsert entry (user_id, week) vào user_week_history rồi $inc total_point âm
+    đúng phần điểm của tuần và xoá week_points của các tuần đã đóng. Điểm cộng thêm giữa lúc
+    đọc và ghi thuộc tuần mới (cả total_point lẫn week_points.<tuần mới>) nên vẫn ở lại.
+    """
+    pending = []
+    for u in chunk:
+        if (u.get("last_rollover_week") or "") >= week:
+            continue
+        points = _closed_points(u, week)
+        closed = [tagged for tagged in (u.get("week_points") or {}) if tagged <= week]
+        if points or closed:
+            pending.append((u, points, closed))
+    if not pending:
+        return 0
+
+    entries = [
+        UpdateOne(
+            {"user_id": str(u["_id"]), "week": week},
+            {"$set": {"point": points, "total_point": points, "reset_at": reset_at}},
+            upsert=True,
+        )
+        for u, points, _ in pending
+        if points
+    ]
+    if entries:
+        await history.bulk_write(entries, ordered=False)
+
+    resets = []
+    for u, points, closed in pending:
+        update = {"$inc": {"total_point": -points}, "$set": {"last_rollover_week": week}}
+        if closed:
+            update["$unset"] = {f"week_points.{tagged}": "" for tagged in closed}
+        resets.append(UpdateOne({"_id": u["_id"], "last_rollover_week": {"$not": {"$gte": week}}}, update))
+    result = await users.bulk_write(resets, ordered=False)
+    return result.modified_count
+
+
+async def run_week_rollover(week: Optional[str] = None) -> Optional[Dict]:
+    """
+    Chạy (hoặc chạy tiếp) rollover của tuần ngay sau watermark. Trả về checkpoint cuối, hoặc None
+    nếu chưa có tuần nào cần rollover / đang được process khác chạy. `week` (CLI) phải đúng là
+    tuần đó: tuần cũ hơn đã rollover, tuần mới hơn thì phải rollover các tuần trước nó trước.
+    """
+    users = await get_users_collection()
+    history = await get_history_collection("week")
+    checkpoints = await get_job_checkpoints_collection()
+
+    pending = await _pending_week(checkpoints)
+    if week is not None and week != pending:
+        raise ValueError(f"Week {week} is not the next week to roll over (next: {pending or 'none ended yet'})")
+    week = pending
+    if week is None:
+        return None
+
+    checkpoint = await _acquire(checkpoints, week)
+    if checkpoint is None:
+        # Tuần đã xong nhưng process dừng trước khi dời watermark
+        if await checkpoints.find_one({"_id": _checkpoint_id(week), "status": "done"}, {"_id": 1}):
+            await _advance_watermark(checkpoints, week)
+        return None
+
+    last_id = checkpoint.get("last_id")
+    scanned, rolled = checkpoint.get("scanned", 0), checkpoint.get("rolled", 0)
+    reset_at = get_vietnam_time().isoformat()
+    api_logger.info(f"🔁 Week rollover {week} starting after {last_id} ({scanned} scanned so far)")
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        chunk = await (
+            users.find(query, {"total_point": 1, "week_points": 1, "last_rollover_week": 1})
+            .sort("_id", 1)
+            .limit(settings.WEEK_ROLLOVER_CHUNK_SIZE)
+            .to_list(length=settings.WEEK_ROLLOVER_CHUNK_SIZE)
+        )
+        if not chunk:
+            break
+
+        rolled += await _roll_chunk(users, history, week, chunk, reset_at)
+        scanned += len(chunk)
+        last_id = chunk[-1]["_id"]
+        # Lưu tiến độ và gia hạn lease sau mỗi chunk
+        await checkpoints.update_one(
+            {"_id": _checkpoint_id(week)},
+            {"$set": {
+                "last_id": last_id,
+                "scanned": scanned,
+                "rolled": rolled,
+                "lease_until": datetime.utcnow() + timedelta(seconds=settings.WEEK_ROLLOVER_LEASE_SECONDS),
+            }},
+        )
+
+    checkpoint = await checkpoints.find_one_and_update(
+        {"_id": _checkpoint_id(week)},
+        {"$set": {"status": "done", "finished_at": datetime.utcnow()}, "$unset": {"lease_until": ""}},
+        return_document=ReturnDocument.AFTER,
+    )
+    await _advance_watermark(checkpoints, week)
+    api_logger.info(f"✅ Week rollover {week} done: {scanned} scanned, {rolled} rolled")
+
+    # Bảng dẫn xuất theo điểm tuần. Leaderboard của mọi process tự quét lại khi thấy watermark đổi
+    await recompute_guild_stats()
+    return checkpoint
+
+
+async def _rollover_loop():
+    while True:
+        try:
+            # Các tuần đã kết thúc được rollover lần lượt (bù khi task dừng nhiều tuần)
+            while await run_week_rollover() is not None:
+                pass
+        except Exception as e:
+            api_logger.error(f"❌ Week rollover failed: {str(e)}")
+        await asyncio.sleep(settings.WEEK_ROLLOVER_CHECK_INTERVAL)
+
+
+def start_week_rollover() -> None:
+    """Gọi khi startup: task nền rollover các tuần đã kết thúc mà chưa được rollover"""
+    global _rollover_task
+    if _rollover_task is None and settings.WEEK_ROLLOVER_CHECK_INTERVAL > 0:
+        _rollover_task = asyncio.create_task(_rollover_loop())
+
+
+async def stop_week_rollover() -> None:
+    global _rollover_task
+    if _rollover_task is not None:
+        _rollover_task.cancel()
+        try:
+            await _rollover_task
+        except asyncio.CancelledError:
+            pass
+        _rollover_task = None
+
+
+async def _main(args):
+    from database.database import init_db, close_db
+    await init_db()
+    try:
+        try:
+            checkpoint = await run_week_rollover(args.week)
+        except ValueError as e:
+            print(str(e))
+            return
+        if checkpoint is None:
+            print("No ended week waiting for rollover, or it is running elsewhere")
+        else:
+            print(f"Week {checkpoint['week']}: {checkpoint['scanned']} scanned, {checkpoint['rolled']} rolled")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rollover điểm tuần vào user_week_history")
+    parser.add_argument("--week", help="Nhãn tuần YYYY-WW, phải là tuần tiếp theo cần rollover (mặc định: tuần đó)")
+    asyncio.run(_main(parser.parse_args()))
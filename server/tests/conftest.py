@@ -0,0 +1,59 @@
+"""
+Fixture dùng chung cho test.
+
+- mock_db:  database mongomock-motor trong bộ nhớ, cho test logic (không cần server).
+- mongo_db: database thật trên TEST_MONGODB_URL (mặc định mongodb://localhost:27017), mỗi test
+            một database riêng, xoá sau khi chạy. Không kết nối được thì test bị skip.
+Cả hai thay singleton của database.database nên các get_*_collection() trỏ vào database test.
+"""
+import os
+import sys
+import uuid
+from cryptography.fernet import Fernet
+
+# Module import lúc load cần các biến môi trường này
+os.environ.setdefault("FERNET_KEY", Fernet.generate_key().decode())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from database import database as database_module
+from database.indexes import reconcile_indexes
+
+
+class _TestDatabase:
+    def __init__(self, db):
+        self._db = db
+
+    async def get_database(self):
+        return self._db
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    db = mongomock_motor.AsyncMongoMockClient()[f"guild_wow_test_{uuid.uuid4().hex[:8]}"]
+    monkeypatch.setattr(database_module, "_db_instance", _TestDatabase(db))
+    return db
+
+
+@pytest.fixture
+async def mongo_db(monkeypatch):
+    url = os.getenv("TEST_MONGODB_URL", "mongodb://localhost:27017")
+    client = AsyncIOMotorClient(url, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip(f"MongoDB not available at {url} (set TEST_MONGODB_URL)")
+
+    name = f"guild_wow_test_{uuid.uuid4().hex[:8]}"
+    db = client[name]
+    await reconcile_indexes(db)
+    monkeypatch.setattr(database_module, "_db_instance", _TestDatabase(db))
+    yield db
+    await client.drop_database(name)
+    client.close()
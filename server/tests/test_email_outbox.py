@@ -0,0 +1,171 @@
+import socket
+from datetime import datetime, timedelta
+import pytest
+from config.settings import settings
+from services import email_outbox
+from utils.email_utils import SMTPConnection
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class _Handler:
+    """SMTP server giả: đếm EHLO (mỗi kết nối một lần) và có thể từ chối DATA"""
+
+    def __init__(self):
+        self.ehlo_count = 0
+        self.messages = []
+        self.reject = False
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.ehlo_count += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return "451 Temporary failure"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = _Handler()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield handler, controller
+    controller.stop()
+
+
+def _connection(controller, idle_timeout=60) -> SMTPConnection:
+    return SMTPConnection(
+        idle_timeout=idle_timeout,
+        host=controller.hostname,
+        port=controller.port,
+        username="",
+        starttls=False,
+        from_addr="noreply@example.com",
+    )
+
+
+def test_connection_is_reused_between_sends(smtp_server):
+    handler, controller = smtp_server
+    connection = _connection(controller)
+    try:
+        for i in range(3):
+            connection.send(f"user{i}@example.com", "subject", "body")
+    finally:
+        connection.close()
+
+    assert len(handler.messages) == 3
+    assert handler.ehlo_count == 1
+
+
+def test_connection_reconnects_after_disconnect_and_idle(smtp_server):
+    handler, controller = smtp_server
+    connection = _connection(controller)
+    try:
+        connection.send("a@example.com", "subject", "body")
+        # Kết nối bị đóng (smtplib báo SMTPServerDisconnected): lần gửi sau mở lại và gửi tiếp
+        connection._server.close()
+        connection.send("b@example.com", "subject", "body")
+        # Idle quá timeout: đóng rồi mở kết nối mới
+        connection.idle_timeout = -1
+        connection.send("c@example.com", "subject", "body")
+    finally:
+        connection.close()
+
+    assert [m.rcpt_tos for m in handler.messages] == [["a@example.com"], ["b@example.com"], ["c@example.com"]]
+    assert handler.ehlo_count == 3
+
+
+@pytest.fixture
+def outbox(mock_db, smtp_server, monkeypatch):
+    _, controller = smtp_server
+    monkeypatch.setattr(email_outbox, "_smtp", _connection(controller))
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30)
+    yield mock_db.email_outbox
+    email_outbox._smtp.close()
+
+
+async def test_outbox_sends_queued_emails(outbox, smtp_server):
+    handler, _ = smtp_server
+    for i in range(3):
+        await email_outbox.enqueue_email(f"user{i}@example.com", "subject", "body")
+
+    assert await email_outbox.process_outbox_batch() == 3
+    assert await email_outbox.process_outbox_batch() == 0
+
+    assert len(handler.messages) == 3
+    assert handler.ehlo_count == 1
+    async for message in outbox.find():
+        assert message["status"] == "sent"
+        assert message["attempts"] == 1
+        assert "lease_until" not in message
+        assert "claim_id" not in message
+
+
+async def test_claimed_batch_is_not_claimed_twice(outbox):
+    for i in range(5):
+        await email_outbox.enqueue_email(f"user{i}@example.com", "subject", "body")
+
+    first = await email_outbox._claim_batch(outbox, 3)
+    second = await email_outbox._claim_batch(outbox, 3)
+
+    assert len(first) == 3
+    assert len(second) == 2
+    assert {m["_id"] for m in first}.isdisjoint(m["_id"] for m in second)
+    assert all(m["status"] == "sending" and m["attempts"] == 1 for m in first + second)
+    assert await email_outbox._claim_batch(outbox, 3) == []
+
+
+async def test_outbox_backs_off_then_fails(outbox, smtp_server):
+    handler, _ = smtp_server
+    handler.reject = True
+    message_id = await email_outbox.enqueue_email("user@example.com", "subject", "body")
+
+    backoffs = []
+    for attempt in range(1, settings.EMAIL_OUTBOX_MAX_ATTEMPTS + 1):
+        before = datetime.utcnow()
+        assert await email_outbox.process_outbox_batch() == 1
+        message = await outbox.find_one({})
+        assert message["attempts"] == attempt
+        if message["status"] == "pending":
+            backoffs.append(round((message["next_attempt_at"] - before).total_seconds() / 30))
+            # Coi như đã tới hạn retry
+            await outbox.update_one({"_id": message["_id"]}, {"$set": {"next_attempt_at": datetime.utcnow()}})
+
+    assert backoffs == [1, 2]
+    assert message["status"] == "failed"
+    assert "451" in message["last_error"]
+    assert await email_outbox.process_outbox_batch() == 0
+    assert str(message["_id"]) == message_id
+
+
+async def test_crashed_sends_count_towards_attempt_limit(outbox, smtp_server):
+    handler, _ = smtp_server
+    await email_outbox.enqueue_email("user@example.com", "subject", "body")
+
+    # Sender chết sau khi claim (không bao giờ ghi kết quả): lease hết hạn rồi claim lại
+    for attempt in range(1, settings.EMAIL_OUTBOX_MAX_ATTEMPTS + 1):
+        [message] = await email_outbox._claim_batch(outbox, 10)
+        assert message["attempts"] == attempt
+        await outbox.update_one(
+            {"_id": message["_id"]},
+            {"$set": {"lease_until": datetime.utcnow() - timedelta(seconds=1)}},
+        )
+
+    assert await email_outbox._claim_batch(outbox, 10) == []
+    assert await email_outbox.process_outbox_batch() == 0
+
+    message = await outbox.find_one({})
+    assert message["status"] == "failed"
+    assert "lease_until" not in message
+    assert handler.messages == []
@@ -0,0 +1,194 @@
+import asyncio
+import socket
+import time
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from config.settings import settings
+from middleware.jwt_auth import JWTAuthMiddleware
+from routes.guild_route import router as guild_router
+from services import guild_service
+from services.guild_events import GuildEventBus, guild_event_bus
+from utils.jwt import create_access_token, create_scoped_token
+
+uvicorn = pytest.importorskip("uvicorn")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+async def sse_server(mock_db, monkeypatch):
+    """App thật (JWT middleware + guild router) trên uvicorn cùng event loop với test"""
+    monkeypatch.setattr(settings, "GUILD_EVENTS_HEARTBEAT", 0.2)
+    app = FastAPI()
+    app.include_router(guild_router, prefix="/api")
+    app.add_middleware(JWTAuthMiddleware)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    await task
+
+
+async def _seed_guild(db, name, member_count):
+    result = await db.users.insert_many([{"name": f"user{i}", "user_type": "user"} for i in range(member_count)])
+    user_ids = [str(user_id) for user_id in result.inserted_ids]
+    guild_id = (await db.guilds.insert_one({"guild_name": name, "owner_id": user_ids[0]})).inserted_id
+    await db.guild_members.insert_many([{"guild_id": guild_id, "user_id": user_id} for user_id in user_ids])
+    return str(guild_id), user_ids
+
+
+async def _read_events(response, count):
+    """Đọc `count` event SSE (bỏ comment heartbeat), trả về data đã parse"""
+    events = []
+    async for line in response.aiter_lines():
+        if line.startswith("data: "):
+            events.append(orjson.loads(line[len("data: "):]))
+            if len(events) == count:
+                break
+    return events
+
+
+async def _wait_for_subscribers(guild_id, count, timeout=10):
+    deadline = time.monotonic() + timeout
+    while len(guild_event_bus._subscribers.get(guild_id, ())) != count:
+        assert time.monotonic() < deadline, guild_event_bus.stats()
+        await asyncio.sleep(0.02)
+
+
+async def test_event_source_can_authenticate_with_query_token(mock_db, sse_server):
+    guild_id, (user_id,) = await _seed_guild(mock_db, "Red Dragons", 1)
+    other_guild_id, _ = await _seed_guild(mock_db, "Blue Sharks", 1)
+    await mock_db.guild_members.insert_one({"guild_id": other_guild_id, "user_id": user_id})
+    access_token = create_access_token({"_id": user_id})
+
+    async with httpx.AsyncClient(base_url=sse_server, timeout=5) as http:
+        response = await http.post(
+            "/api/guild/events/token",
+            json={"guild_name": "Red Dragons"},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        assert response.status_code == 200
+        token = response.json()["token"]
+        assert response.json()["expires_in"] == settings.GUILD_EVENTS_TOKEN_TTL
+
+        # Như EventSource: không có header, token nằm trong query
+        async with http.stream("GET", "/api/guild/events", params={"guild_name": "Red Dragons", "token": token}) as stream:
+            assert stream.status_code == 200
+            await _wait_for_subscribers(guild_id, 1)
+            guild_event_bus.publish(guild_id, "member_joined", user_id="someone")
+            (event,) = await _read_events(stream, 1)
+            assert event["type"] == "member_joined"
+
+        # Access token thường không được đưa vào URL
+        response = await http.get("/api/guild/events", params={"guild_name": "Red Dragons", "token": access_token})
+        assert response.status_code == 401
+        # Token có scope không dùng được như access token
+        response = await http.post(
+            "/api/guild/events/token",
+            json={"guild_name": "Red Dragons"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 401
+        # Token gắn với guild đã cấp
+        response = await http.get("/api/guild/events", params={"guild_name": "Blue Sharks", "token": token})
+        assert response.status_code == 403
+        # Không có token
+        response = await http.get("/api/guild/events", params={"guild_name": "Red Dragons"})
+        assert response.status_code == 401
+
+
+async def test_sse_stress_many_clients(mock_db, sse_server):
+    clients, events = 200, 100
+    guild_id, user_ids = await _seed_guild(mock_db, "Stress", clients)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(base_url=sse_server, timeout=30, limits=limits) as http:
+        async def client(user_id):
+            token = create_scoped_token(user_id, "guild_events", 60, guild_id=guild_id)
+            async with http.stream("GET", "/api/guild/events", params={"guild_name": "Stress", "token": token}) as stream:
+                assert stream.status_code == 200
+                return await _read_events(stream, events)
+
+        tasks = [asyncio.create_task(client(user_id)) for user_id in user_ids]
+        await _wait_for_subscribers(guild_id, clients, timeout=30)
+
+        started = time.perf_counter()
+        for seq in range(events):
+            assert guild_event_bus.publish(guild_id, "member_joined", seq=seq) == clients
+            # Nhường loop để các stream đọc hàng đợi, như publish từ các request thật
+            await asyncio.sleep(0)
+        received = await asyncio.wait_for(asyncio.gather(*tasks), timeout=60)
+        elapsed = time.perf_counter() - started
+
+    for client_events in received:
+        assert [event["seq"] for event in client_events] == list(range(events))
+    print(f"guild events: {clients} clients x {events} events in {elapsed * 1000:.0f} ms")
+
+    # Client đóng kết nối: subscription được gỡ (phát hiện qua heartbeat)
+    await _wait_for_subscribers(guild_id, 0)
+
+
+async def test_slow_subscriber_is_disconnected_without_blocking_others():
+    bus = GuildEventBus(max_queue=10, overflow="disconnect")
+    fast = [bus.subscribe("g", f"fast{i}") for i in range(50)]
+    slow = bus.subscribe("g", "slow")
+
+    async def consume(subscription, count):
+        return [(await subscription.get())["seq"] for _ in range(count)]
+
+    consumers = [asyncio.create_task(consume(subscription, 100)) for subscription in fast]
+    for seq in range(100):
+        bus.publish("g", "tick", seq=seq)
+        await asyncio.sleep(0)
+
+    assert all(result == list(range(100)) for result in await asyncio.gather(*consumers))
+    assert await slow.get() is None
+    assert bus.stats()["disconnected"] == 1
+    assert bus.stats()["subscribers"] == 50
+
+
+async def test_slow_subscriber_drops_events_in_drop_mode():
+    bus = GuildEventBus(max_queue=10, overflow="drop")
+    slow = bus.subscribe("g", "slow")
+    for seq in range(25):
+        bus.publish("g", "tick", seq=seq)
+
+    assert slow.dropped == 15
+    assert [(await slow.get())["seq"] for _ in range(10)] == list(range(10))
+
+
+async def test_stream_ends_when_member_leaves(mock_db, sse_server):
+    guild_id, (owner_id, user_id, other_id) = await _seed_guild(mock_db, "Red Dragons", 3)
+
+    async with httpx.AsyncClient(base_url=sse_server, timeout=5) as http:
+        async def listen(member_id):
+            token = create_scoped_token(member_id, "guild_events", 60, guild_id=guild_id)
+            async with http.stream("GET", "/api/guild/events", params={"guild_name": "Red Dragons", "token": token}) as stream:
+                return [orjson.loads(line[len("data: "):]) async for line in stream.aiter_lines() if line.startswith("data: ")]
+
+        leaving = asyncio.create_task(listen(user_id))
+        staying = asyncio.create_task(listen(other_id))
+        await _wait_for_subscribers(guild_id, 2)
+
+        await guild_service.leave_guild(user_id, "Red Dragons")
+        # Stream của người rời guild kết thúc ngay, không chờ client ngắt
+        await asyncio.wait_for(leaving, timeout=2)
+        await _wait_for_subscribers(guild_id, 1)
+
+        guild_event_bus.publish(guild_id, "member_joined", user_id="someone")
+        # Chờ stream còn lại đọc hết hàng đợi rồi mới đóng guild (đóng sẽ xả hàng đợi)
+        while any(not s.queue.empty() for s in guild_event_bus._subscribers[guild_id]):
+            await asyncio.sleep(0.01)
+        guild_event_bus.close_guild(guild_id)
+        events = await asyncio.wait_for(staying, timeout=2)
+        assert [event["type"] for event in events] == ["member_left", "member_joined"]
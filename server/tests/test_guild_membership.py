@@ -0,0 +1,127 @@
+import asyncio
+import random
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING
+from migrations.guild_members import migrate_guild_members
+from routes.guild_route import get_guild_membership
+from services import guild_service
+from utils.pagination import encode_cursor
+
+
+@pytest.fixture(params=["mock_db", "mongo_db"])
+def db(request):
+    return request.getfixturevalue(request.param)
+
+
+async def _ensure_unique_indexes(db):
+    """mongo_db đã có toàn bộ index qua reconcile_indexes; mongomock chỉ cần các unique index"""
+    for collection, keys in (
+        (db.guilds, [("guild_name", ASCENDING)]),
+        (db.guild_members, [("guild_id", ASCENDING), ("user_id", ASCENDING)]),
+    ):
+        existing = [index["key"] for index in (await collection.index_information()).values()]
+        if keys not in existing:
+            await collection.create_index(keys, unique=True)
+
+
+async def _create_users(db, count):
+    result = await db.users.insert_many([{"name": f"user{i}", "total_point": i} for i in range(count)])
+    return [str(user_id) for user_id in result.inserted_ids]
+
+
+async def _member_count_matches(db, guild_name):
+    guild = await db.guilds.find_one({"guild_name": guild_name})
+    members = await db.guild_members.count_documents({"guild_id": guild["_id"]})
+    return guild["member_count"], members
+
+
+async def test_concurrent_join_leave_keeps_member_count(db):
+    await _ensure_unique_indexes(db)
+    owner, *user_ids = await _create_users(db, 31)
+    await guild_service.create_guild(owner, "Red Dragons", owner_name="owner")
+
+    # Mỗi user join 2 lần đồng thời (một lần phải bị từ chối)
+    joins = [guild_service.join_guild(user_id, "Red Dragons") for user_id in user_ids for _ in range(2)]
+    random.shuffle(joins)
+    results = await asyncio.gather(*joins, return_exceptions=True)
+    assert sum(1 for r in results if isinstance(r, ValueError)) == len(user_ids)
+    assert await _member_count_matches(db, "Red Dragons") == (len(user_ids) + 1, len(user_ids) + 1)
+
+    # Một nửa rời guild (mỗi người 2 lần đồng thời) trong lúc người mới join
+    leaving = user_ids[:15]
+    newcomers = await _create_users(db, 10)
+    ops = [guild_service.leave_guild(user_id, "Red Dragons") for user_id in leaving for _ in range(2)]
+    ops += [guild_service.join_guild(user_id, "Red Dragons") for user_id in newcomers]
+    random.shuffle(ops)
+    results = await asyncio.gather(*ops, return_exceptions=True)
+    assert sum(1 for r in results if isinstance(r, ValueError)) == len(leaving)
+
+    expected = 1 + len(user_ids) - len(leaving) + len(newcomers)
+    assert await _member_count_matches(db, "Red Dragons") == (expected, expected)
+
+
+async def test_explore_pages_through_guilds_without_created_at(db):
+    owner_ids = await _create_users(db, 1)
+    now = datetime.utcnow()
+    await db.guilds.insert_many([
+        {
+            "guild_name": f"guild-{i}",
+            "owner_id": owner_ids[0],
+            "member_count": 5 + i % 2,
+            # Guild cũ không có created_at
+            **({"created_at": now} if i % 3 else {}),
+        }
+        for i in range(12)
+    ])
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = await guild_service.get_guilds_with_min_members(min_members=5, limit=5, cursor=cursor)
+        seen += [guild["guild_name"] for guild in page]
+        assert all(guild["created_at"] for guild in page)
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(f"guild-{i}" for i in range(12))
+    assert len(seen) == len(set(seen))
+
+
+async def test_explore_rejects_malformed_created_at_cursor(db):
+    cursor = encode_cursor([5, "not-a-date", str(ObjectId())])
+    with pytest.raises(ValueError):
+        await guild_service.get_guilds_with_min_members(cursor=cursor)
+
+
+async def test_members_migration_handles_guild_without_created_at(mongo_db):
+    """Migration dùng bulk_write(UpdateOne) nên chạy trên Mongo thật"""
+    legacy_id = (await mongo_db.guilds.insert_one({"guild_name": "Legacy", "members": ["u1", "u2", "u1"]})).inserted_id
+    created_at = datetime(2024, 5, 1)
+    recent_id = (await mongo_db.guilds.insert_one(
+        {"guild_name": "Recent", "members": ["u3"], "created_at": created_at}
+    )).inserted_id
+
+    assert await migrate_guild_members() == 2
+
+    for guild_id, count in ((legacy_id, 2), (recent_id, 1)):
+        guild = await mongo_db.guilds.find_one({"_id": guild_id})
+        assert guild["member_count"] == count and "members" not in guild
+    legacy = await mongo_db.guild_members.find_one({"guild_id": legacy_id})
+    assert legacy["joined_at"] == legacy_id.generation_time.replace(tzinfo=None)
+    recent = await mongo_db.guild_members.find_one({"guild_id": recent_id})
+    assert recent["joined_at"] == created_at
+
+
+async def test_membership_endpoint(mock_db):
+    await _ensure_unique_indexes(mock_db)
+    owner, member, outsider = await _create_users(mock_db, 3)
+    await guild_service.create_guild(owner, "dragons", None)
+    await guild_service.join_guild(member, "dragons")
+
+    for user_id, expected in ((owner, True), (member, True), (outsider, False)):
+        response = await get_guild_membership("dragons", current_user=SimpleNamespace(id=user_id))
+        assert response == {"guild_name": "dragons", "is_member": expected}
+    response = await get_guild_membership("missing", current_user=SimpleNamespace(id=member))
+    assert response["is_member"] is False
@@ -0,0 +1,121 @@
+import os
+import random
+import time
+from datetime import datetime
+import pytest
+from services import guild_service
+from utils.text_search import build_search_fields, normalize_text, search_terms
+
+WORDS = ["rong", "lua", "rồng", "đỏ", "dragon", "red", "sky", "kick", "keeper", "vua", "bong", "da"]
+
+
+def _guild(i, rng):
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + f" {i}"
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 4)))
+    return {
+        "guild_name": name,
+        "description": description,
+        "owner_id": "owner",
+        "owner_name": "owner",
+        "member_count": rng.randint(1, 5),
+        "created_at": datetime.utcnow(),
+        **build_search_fields(name, description),
+    }
+
+
+def _expected(guilds, keyword):
+    """Xếp hạng tính trực tiếp trong Python theo đúng định nghĩa của search"""
+    terms = search_terms(keyword)
+    query_text = normalize_text(keyword)
+    ranked = []
+    for guild in guilds:
+        if not set(terms) <= set(guild["search_tokens"]):
+            continue
+        if guild["name_normalized"] == query_text:
+            score = 3
+        elif guild["name_normalized"].startswith(query_text):
+            score = 2
+        elif set(terms) <= set(guild["name_tokens"]):
+            score = 1
+        else:
+            score = 0
+        ranked.append((-score, -guild["member_count"], guild["_id"]))
+    return [str(guild_id) for _, _, guild_id in sorted(ranked)]
+
+
+async def _all_pages(keyword, limit):
+    ids, cursor = [], None
+    while True:
+        page, cursor = await guild_service.search_guilds_by_keyword(keyword, limit=limit, cursor=cursor)
+        ids += [guild["_id"] for guild in page]
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize("keyword", ["rong", "Rồng đỏ", "red", "dragon 1", "vua bong", "k", "da 3"])
+async def test_search_ranking_and_pages_match_reference(mock_db, keyword):
+    rng = random.Random(13)
+    guilds = [_guild(i, rng) for i in range(300)]
+    # Vài guild trùng tên từ khoá để có nhóm "trùng tên"
+    guilds.append({**_guild(300, rng), **build_search_fields(keyword, None), "guild_name": keyword})
+    await mock_db.guilds.insert_many(guilds)
+
+    expected = _expected(guilds, keyword)
+    assert expected
+    for limit in (1, 7, 50):
+        assert await _all_pages(keyword, limit) == expected
+
+
+async def test_symbol_only_names_are_searchable(mock_db):
+    rng = random.Random(7)
+    guilds = [_guild(i, rng) for i in range(20)]
+    for name, members in [("★★", 2), ("★★★", 4), ("⚽ FC", 3)]:
+        guilds.append({**_guild(len(guilds), rng), **build_search_fields(name, None),
+                       "guild_name": name, "member_count": members})
+    await mock_db.guilds.insert_many(guilds)
+
+    assert build_search_fields("★★", None)["name_normalized"] == "★★"
+    page, _ = await guild_service.search_guilds_by_keyword("★★")
+    assert [guild["guild_name"] for guild in page] == ["★★", "★★★"]
+    page, _ = await guild_service.search_guilds_by_keyword("   ")
+    assert page == []
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def test_search_is_index_bounded_at_scale(mongo_db):
+    """
+    Benchmark trên Mongo thật: GUILD_SEARCH_BENCH_SIZE guild (mặc định 100k). Mỗi nhóm xếp hạng
+    phải dùng index (không COLLSCAN); nhóm bằng nhau phải lấy thứ tự sort từ index (không SORT).
+    """
+    size = int(os.getenv("GUILD_SEARCH_BENCH_SIZE", "100000"))
+    rng = random.Random(7)
+    for start in range(0, size, 10000):
+        await mongo_db.guilds.insert_many([_guild(i, rng) for i in range(start, min(start + 10000, size))])
+
+    keyword = "red dragon"
+    terms = search_terms(keyword)
+    for tier, query in guild_service._search_tiers(normalize_text(keyword), terms):
+        explain = await mongo_db.guilds.find(query).sort([("member_count", -1), ("_id", 1)]).limit(21).explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        assert "COLLSCAN" not in stages, (tier, stages)
+        if tier != 2:
+            assert "SORT" not in stages, (tier, stages)
+
+    started = time.perf_counter()
+    pages, cursor = 0, None
+    while pages < 20:
+        _, cursor = await guild_service.search_guilds_by_keyword(keyword, limit=20, cursor=cursor)
+        pages += 1
+        if cursor is None:
+            break
+    elapsed = time.perf_counter() - started
+    print(f"guild search: {pages} pages over {size} guilds in {elapsed * 1000:.0f} ms")
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from services import guild_service, user_stats
+from services.guild_stats import get_guild_leaderboard, recompute_guild_stats
+
+
+async def _seed(db):
+    result = await db.users.insert_many([{"name": "owner", "total_point": 10}, {"name": "member", "total_point": 5}])
+    owner, member = (str(user_id) for user_id in result.inserted_ids)
+    await guild_service.create_guild(owner, "Red Dragons", owner_name="owner")
+    await guild_service.join_guild(member, "Red Dragons")
+    return owner, member
+
+
+async def test_point_changes_reach_guild_stats(mock_db):
+    owner, member = await _seed(mock_db)
+
+    await user_stats.increment_user_stats(member, total_point=20, kicked_win=2)
+
+    (guild,) = await get_guild_leaderboard()
+    assert (guild["member_count"], guild["total_points"], guild["kicked_wins"]) == (2, 35, 2)
+
+
+async def test_recompute_does_not_overwrite_concurrent_increments(mongo_db):
+    """$merge với pipeline whenMatched: chỉ chạy trên Mongo thật"""
+    owner, member = await _seed(mongo_db)
+    guild = await mongo_db.guilds.find_one({"guild_name": "Red Dragons"})
+    other_id = (await mongo_db.guilds.insert_one({"guild_name": "Blue Sharks", "owner_id": owner})).inserted_id
+    await mongo_db.guild_members.insert_one({"guild_id": other_id, "user_id": owner})
+
+    # Drift ở Red Dragons; Blue Sharks vừa được $inc sau khi recompute bắt đầu
+    await mongo_db.guild_stats.update_one(
+        {"_id": guild["_id"]}, {"$set": {"total_points": 999, "updated_at": datetime(2020, 1, 1), "extra": 1}}
+    )
+    concurrent = {"_id": other_id, "guild_name": "Blue Sharks", "member_count": 2, "total_points": 42,
+                  "updated_at": datetime.utcnow() + timedelta(hours=1)}
+    await mongo_db.guild_stats.insert_one(concurrent)
+
+    assert await recompute_guild_stats() == 2
+
+    red = await mongo_db.guild_stats.find_one({"_id": guild["_id"]})
+    assert (red["total_points"], red["member_count"], red["extra"]) == (15, 2, 1)
+    blue = await mongo_db.guild_stats.find_one({"_id": other_id})
+    assert (blue["total_points"], blue["member_count"]) == (42, 2)
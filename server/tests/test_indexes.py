@@ -0,0 +1,39 @@
+import pytest
+from database import indexes
+from database.indexes import INDEXES, USERS_EMAIL_INDEX, check_query_plans, index_confirmed, query_shapes, reconcile_indexes
+
+
+async def test_failed_collection_does_not_abort_reconcile(mock_db, monkeypatch):
+    reconcile_collection = indexes._reconcile_collection
+    monkeypatch.setattr(indexes, "_confirmed", set())
+
+    async def failing_users(collection, wanted, fix, drop_extra):
+        if collection.name == "users":
+            raise RuntimeError("E11000 duplicate key error collection: users index: email_1")
+        return await reconcile_collection(collection, wanted, fix, drop_extra)
+
+    monkeypatch.setattr(indexes, "_reconcile_collection", failing_users)
+    report = await reconcile_indexes(mock_db)
+
+    assert "E11000" in report["users"]["error"][0]
+    assert not index_confirmed("users", USERS_EMAIL_INDEX)
+    # Các collection khác vẫn được build index
+    assert "guild_name_1" in report["guilds"]["created"]
+    assert index_confirmed("guilds", "guild_name_1")
+    assert "guild_name_1" in await mock_db.guilds.index_information()
+
+
+async def test_query_shapes_cover_indexed_collections(mock_db):
+    shapes = query_shapes()
+    assert {collection for collection, _, _ in shapes} == set(INDEXES)
+    # Shape sinh từ service là query hợp lệ
+    for collection, query, sort in shapes:
+        cursor = mock_db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        await cursor.to_list(length=1)
+
+
+async def test_service_queries_do_not_collscan(mongo_db):
+    """mongo_db đã reconcile toàn bộ registry; mọi shape trong query_shapes() phải dùng index"""
+    assert await check_query_plans(mongo_db) == []
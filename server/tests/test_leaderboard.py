@@ -0,0 +1,133 @@
+import pytest
+from config.settings import settings
+from services import job_lease, user_stats
+from services import leaderboard as leaderboard_module
+from services.leaderboard import SNAPSHOT_LEASE, SNAPSHOT_META_ID, PlayerLeaderboard
+from services.week_rollover import WATERMARK_ID
+from utils.weekly_utils import get_last_weeks
+
+
+@pytest.fixture
+async def saved_snapshot(mock_db):
+    await mock_db.users.insert_many([
+        {"name": "a", "total_point": 30, "kicked_win": 2, "keep_win": 1},
+        {"name": "b", "total_point": 10, "kicked_win": 5},
+    ])
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.reload()
+    await leaderboard.save_snapshot()
+    return mock_db
+
+
+async def test_load_uses_snapshot_of_current_week_and_month(saved_snapshot):
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.load()
+    assert leaderboard.source == "snapshot"
+    assert [score for _, _, score in leaderboard.boards["weekly"].top(2)] == [30, 10]
+
+
+@pytest.mark.parametrize("field", ["week", "month"])
+async def test_load_rejects_snapshot_of_other_week_or_month(saved_snapshot, field):
+    await saved_snapshot.leaderboard_snapshots.update_one({"_id": SNAPSHOT_META_ID}, {"$set": {field: "stale"}})
+    # Điểm trong snapshot đã lỗi thời: phải quét lại users
+    await saved_snapshot.users.update_many({}, {"$set": {"total_point": 0}})
+
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.load()
+    assert leaderboard.source == "users"
+    assert leaderboard.month != "stale" and leaderboard.week != "stale"
+    assert [score for _, _, score in leaderboard.boards["weekly"].top(2)] == [0, 0]
+
+
+async def _roll_over(db, week):
+    """Như week_rollover trên process khác: điểm tuần đã chuyển đi và watermark đổi"""
+    await db.users.update_many({}, {"$set": {"total_point": 0}})
+    await db.job_checkpoints.update_one({"_id": WATERMARK_ID}, {"$set": {"week": week}}, upsert=True)
+
+
+async def test_every_process_reloads_after_week_rollover(saved_snapshot, monkeypatch):
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.load()
+    await _roll_over(saved_snapshot, "2026-41")
+
+    # Chưa tới lượt kiểm tra: vẫn là bảng cũ, không đọc watermark
+    await leaderboard.top("weekly", 2)
+    assert leaderboard._reload_task is None
+
+    monkeypatch.setattr(settings, "LEADERBOARD_ROLLOVER_CHECK_INTERVAL", 1)
+    leaderboard.rollover_checked_at -= 2
+    await leaderboard.top("weekly", 2)
+    await leaderboard._reload_task
+    assert leaderboard.rolled_week == "2026-41"
+    assert [score for _, _, score in leaderboard.boards["weekly"].top(2)] == [0, 0]
+
+    # Watermark không đổi thì không quét lại
+    loaded_at = leaderboard.loaded_at
+    leaderboard.rollover_checked_at -= 2
+    await leaderboard.top("weekly", 2)
+    await leaderboard._reload_task
+    assert leaderboard.loaded_at == loaded_at
+
+
+async def test_load_rejects_snapshot_taken_before_rollover(saved_snapshot):
+    await _roll_over(saved_snapshot, "2026-41")
+
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.load()
+    assert leaderboard.source == "users"
+    assert [score for _, _, score in leaderboard.boards["weekly"].top(2)] == [0, 0]
+
+
+async def test_point_changes_update_boards_immediately(saved_snapshot, monkeypatch):
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.load()
+    monkeypatch.setattr(user_stats, "player_leaderboard", leaderboard)
+    user_b = str((await saved_snapshot.users.find_one({"name": "b"}))["_id"])
+
+    user = await user_stats.increment_user_stats(user_b, total_point=25, keep_win=4)
+
+    assert (user["total_point"], user["keep_win"]) == (35, 4)
+    # Bảng đổi ngay, không cần reload
+    assert [(user_id, score) for _, user_id, score in leaderboard.boards["weekly"].top(1)] == [(user_b, 35)]
+    assert leaderboard.boards["monthly"].score(user_b) == 35
+    assert leaderboard.boards["all"].score(user_b) == 9
+    stored = await saved_snapshot.users.find_one({"_id": user["_id"]})
+    assert stored["week_points"] == {get_last_weeks(1)[0]: 25}
+
+    assert await user_stats.increment_user_stats(user_b) is None
+    with pytest.raises(ValueError):
+        await user_stats.increment_user_stats("64b7f0c2a1b2c3d4e5f60718", total_point=1)
+
+
+async def test_only_the_lease_holder_writes_snapshots(saved_snapshot):
+    # Fixture đã ghi snapshot (và giữ lease) bằng process này; giờ worker khác giữ lease
+    await job_lease.release_lease(SNAPSHOT_LEASE)
+    assert await job_lease.acquire_lease(SNAPSHOT_LEASE, 60, owner="other-worker")
+    before = await saved_snapshot.leaderboard_snapshots.count_documents({})
+
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.reload()
+    assert not await leaderboard.save_snapshot()
+    assert await saved_snapshot.leaderboard_snapshots.count_documents({}) == before
+
+
+async def test_snapshot_of_worker_that_lost_its_lease_is_discarded(saved_snapshot, monkeypatch):
+    meta = await saved_snapshot.leaderboard_snapshots.find_one({"_id": SNAPSHOT_META_ID})
+    # Lease hết hạn trong lúc worker này ghi chunk: worker khác đã nhận lease
+    results = iter([True, False])
+
+    async def acquire(name, seconds):
+        return next(results)
+
+    monkeypatch.setattr(leaderboard_module, "acquire_lease", acquire)
+    leaderboard = PlayerLeaderboard()
+    await leaderboard.reload()
+    assert not await leaderboard.save_snapshot()
+
+    # Meta và chunk của snapshot đang dùng còn nguyên, chunk của lần ghi dở bị xoá
+    assert (await saved_snapshot.leaderboard_snapshots.find_one({"_id": SNAPSHOT_META_ID})) == meta
+    ids = await saved_snapshot.leaderboard_snapshots.distinct("snapshot_id")
+    assert ids == [meta["snapshot_id"]]
+    restored = PlayerLeaderboard()
+    await restored.load()
+    assert restored.source == "snapshot"
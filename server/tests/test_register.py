@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from routes import users as users_routes
+
+
+class _FailingInsert:
+    """Bọc collection users: insert_one lỗi (không phải DuplicateKeyError)"""
+
+    def __init__(self, collection, error):
+        self._collection = collection
+        self._error = error
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def insert_one(self, document):
+        raise self._error
+
+
+@pytest.fixture
+async def register_env(mock_db, monkeypatch):
+    async def fake_hash(password):
+        return f"hashed:{password}"
+
+    async def fake_skill(skill_type):
+        return f"{skill_type}-skill"
+
+    monkeypatch.setattr(users_routes, "hash_password_async", fake_hash)
+    monkeypatch.setattr(users_routes, "get_random_skill", fake_skill)
+    await mock_db.wallets.insert_one({
+        "public_address": "0xabc",
+        "mnemonic": "enc-mnemonic",
+        "private_key": "enc-key",
+        "status": "available",
+    })
+    return mock_db
+
+
+async def test_register_claims_wallet(register_env, monkeypatch):
+    async def enqueue(email, token):
+        return "message-id"
+
+    monkeypatch.setattr(users_routes, "enqueue_verification_email", enqueue)
+    response = await users_routes.register_user(
+        users_routes.RegularAuthRequest(email="new@example.com", password="secret123")
+    )
+
+    assert response["evm_address"] == "0xabc"
+    wallet = await register_env.wallets.find_one({})
+    assert wallet["status"] == "claimed"
+    user = await register_env.users.find_one({"email": "new@example.com"})
+    assert user["evm_private_key"] == "enc-key"
+
+
+@pytest.mark.parametrize("error", [RuntimeError("connection reset"), ValueError("bad document")])
+async def test_wallet_released_when_insert_fails(register_env, monkeypatch, error):
+    users = register_env.users
+
+    async def failing_users_collection():
+        return _FailingInsert(users, error)
+
+    monkeypatch.setattr(users_routes, "get_users_collection", failing_users_collection)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await users_routes.register_user(
+            users_routes.RegularAuthRequest(email="new@example.com", password="secret123")
+        )
+
+    assert exc_info.value.status_code == 500
+    wallet = await register_env.wallets.find_one({})
+    assert wallet["status"] == "available"
+    assert wallet["mnemonic"] == "enc-mnemonic"
+    assert wallet["private_key"] == "enc-key"
+    assert "user_id" not in wallet
+
+
+async def test_precheck_rejects_duplicate_email_until_index_confirmed(register_env, monkeypatch):
+    monkeypatch.setattr(users_routes, "index_confirmed", lambda collection, name: False)
+    await register_env.users.insert_one({"email": "taken@example.com"})
+
+    with pytest.raises(HTTPException) as exc_info:
+        await users_routes.register_user(
+            users_routes.RegularAuthRequest(email="taken@example.com", password="secret123")
+        )
+
+    assert exc_info.value.status_code == 400
+    # Bị chặn trước khi claim ví
+    assert (await register_env.wallets.find_one({}))["status"] == "available"
+    assert await register_env.users.count_documents({"email": "taken@example.com"}) == 1
+
+
+async def test_wallet_released_when_request_cancelled_after_claim(register_env, monkeypatch):
+    claimed = asyncio.Event()
+    real_claim = users_routes.claim_wallet
+
+    async def claim(user_id):
+        wallet = await real_claim(user_id)
+        claimed.set()
+        return wallet
+
+    async def slow_hash(password):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(users_routes, "claim_wallet", claim)
+    monkeypatch.setattr(users_routes, "hash_password_async", slow_hash)
+
+    request = asyncio.create_task(users_routes.register_user(
+        users_routes.RegularAuthRequest(email="new@example.com", password="secret123")
+    ))
+    await claimed.wait()
+    request.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await request
+
+    wallet = await register_env.wallets.find_one({})
+    assert wallet["status"] == "available"
+    assert wallet["private_key"] == "enc-key"
+    assert await register_env.users.count_documents({}) == 0
+
+
+async def test_wallet_released_when_skill_lookup_fails(register_env, monkeypatch):
+    async def no_skill(skill_type):
+        raise HTTPException(status_code=500, detail=f"No {skill_type} skills found in database")
+
+    monkeypatch.setattr(users_routes, "get_random_skill", no_skill)
+
+    with pytest.raises(HTTPException):
+        await users_routes.register_user(
+            users_routes.RegularAuthRequest(email="new@example.com", password="secret123")
+        )
+
+    assert (await register_env.wallets.find_one({}))["status"] == "available"
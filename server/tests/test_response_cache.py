@@ -0,0 +1,51 @@
+import httpx
+import pytest
+from middleware.response_cache import ResponseCacheMiddleware
+from utils.response_cache import invalidate_cache_tag, response_cache
+
+
+@pytest.fixture
+def client():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": str(len(calls)).encode()})
+
+    response_cache.clear()
+    middleware = ResponseCacheMiddleware(app)
+    transport = httpx.ASGITransport(app=middleware)
+    return httpx.AsyncClient(transport=transport, base_url="http://test"), calls
+
+
+@pytest.mark.parametrize("path", ["/api/guild/explore", "/api/guild/search?keyword=a", "/api/guild/leaderboard"])
+async def test_guild_listings_are_cached_until_invalidated(client, path):
+    http, calls = client
+    first = await http.get(path)
+    second = await http.get(path)
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert second.text == first.text
+    assert len(calls) == 1
+
+    invalidate_cache_tag("guilds")
+    third = await http.get(path)
+    assert third.headers["x-cache"] == "MISS"
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize("path", [
+    "/api/leaderboard",
+    "/api/leaderboard/weekly",
+    "/api/leaderboard/monthly",
+    "/api/users/64b7f0c2a1b2c3d4e5f60718",
+    "/api/skills/",
+    "/api/skills/type/kicker",
+])
+async def test_public_paths_without_invalidation_are_not_cached(client, path):
+    http, calls = client
+    for _ in range(2):
+        response = await http.get(path)
+        assert "x-cache" not in response.headers
+    assert len(calls) == 2
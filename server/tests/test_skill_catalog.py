@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from services import skill_catalog as skill_catalog_module
+from services.skill_catalog import SkillCatalog
+
+
+async def test_empty_load_is_retried(mock_db):
+    catalog = SkillCatalog(ttl=600)
+
+    assert await catalog.random_skill("kicker") is None
+    assert catalog._loaded_at is None
+
+    await mock_db.skills.insert_one({"type": "kicker", "name": "Power Shot"})
+    assert await catalog.random_skill("kicker") == "Power Shot"
+
+
+async def test_failed_load_is_retried(mock_db, monkeypatch):
+    catalog = SkillCatalog(ttl=600)
+    await mock_db.skills.insert_one({"type": "kicker", "name": "Power Shot"})
+    get_skills = skill_catalog_module.get_skills_collection
+
+    async def broken():
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(skill_catalog_module, "get_skills_collection", broken)
+    with pytest.raises(RuntimeError):
+        await catalog.random_skill("kicker")
+    assert catalog._loaded_at is None
+
+    monkeypatch.setattr(skill_catalog_module, "get_skills_collection", get_skills)
+    assert await catalog.random_skill("kicker") == "Power Shot"
+
+
+async def test_concurrent_first_callers_load_once(mock_db, monkeypatch):
+    catalog = SkillCatalog(ttl=600)
+    await mock_db.skills.insert_one({"type": "kicker", "name": "Power Shot"})
+    get_skills = skill_catalog_module.get_skills_collection
+    loads = 0
+
+    async def counting():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(0)
+        return await get_skills()
+
+    monkeypatch.setattr(skill_catalog_module, "get_skills_collection", counting)
+    results = await asyncio.gather(*[catalog.random_skill("kicker") for _ in range(10)])
+
+    assert results == ["Power Shot"] * 10
+    assert loads == 1
+
+
+async def test_missing_type_triggers_reload(mock_db):
+    catalog = SkillCatalog(ttl=600, miss_reload_interval=0)
+    await mock_db.skills.insert_one({"type": "kicker", "name": "Power Shot"})
+    assert await catalog.random_skill("goalkeeper") is None
+
+    await mock_db.skills.insert_one({"type": "goalkeeper", "name": "Iron Wall"})
+    assert await catalog.random_skill("goalkeeper") is None
+    await catalog._reload_task
+    assert await catalog.random_skill("goalkeeper") == "Iron Wall"
@@ -0,0 +1,18 @@
+from services import user_history
+
+
+async def test_invite_codes_page_newest_first(mock_db):
+    # code ngẫu nhiên, không theo thứ tự thời gian
+    codes = ["QZ7", "AB1", "MK4", "CC9", "ZA2"]
+    for code in codes:
+        await mock_db.user_invite_codes.insert_one({"user_id": "user", "code": code})
+    await mock_db.user_invite_codes.insert_one({"user_id": "other", "code": "XX0"})
+
+    seen, cursor = [], None
+    while True:
+        items, cursor = await user_history.get_history_page("invite_code", "user", limit=2, cursor=cursor)
+        seen.extend(item["code"] for item in items)
+        if cursor is None:
+            break
+
+    assert seen == list(reversed(codes))
@@ -0,0 +1,36 @@
+from migrations.users_duplicate_emails import quarantine_duplicate_emails
+
+
+async def test_quarantine_duplicate_emails(mock_db):
+    result = await mock_db.users.insert_many([
+        {"email": "dup@example.com", "is_verified": False, "total_point": 5},
+        {"email": "dup@example.com", "is_verified": True, "total_point": 10},
+        {"email": "dup@example.com", "is_verified": False, "total_point": 1},
+        {"email": "solo@example.com", "total_point": 7},
+        {"email": None, "user_type": "guest"},
+        {"email": None, "user_type": "guest"},
+    ])
+    unverified, primary, third, solo = [str(_id) for _id in result.inserted_ids[:4]]
+    guild = (await mock_db.guilds.insert_one({"guild_name": "g", "owner_id": unverified, "member_count": 1})).inserted_id
+    await mock_db.guild_members.insert_one({"guild_id": guild, "user_id": unverified})
+
+    # Dry run chỉ báo cáo
+    report = await quarantine_duplicate_emails(dry_run=True)
+    assert report == [{"email": "dup@example.com", "primary_id": primary, "duplicate_ids": [unverified, third]}]
+    assert await mock_db.users.count_documents({"email": "dup@example.com"}) == 3
+
+    assert len(await quarantine_duplicate_emails()) == 1
+    # Chạy lại không còn nhóm trùng
+    assert await quarantine_duplicate_emails() == []
+
+    kept = await mock_db.users.find_one({"email": "dup@example.com"})
+    assert str(kept["_id"]) == primary
+    assert kept["total_point"] == 10
+    quarantined = await mock_db.users.find({"duplicate_of": primary}).sort("_id", 1).to_list(length=None)
+    assert [str(user["_id"]) for user in quarantined] == [unverified, third]
+    assert all(user["duplicate_email"] == "dup@example.com" and "email" not in user for user in quarantined)
+    # Điểm và guild của tài khoản bị cách ly giữ nguyên
+    assert [user["total_point"] for user in quarantined] == [5, 1]
+    assert (await mock_db.guilds.find_one({"_id": guild}))["owner_id"] == unverified
+    assert await mock_db.guild_members.count_documents({"user_id": unverified}) == 1
+    assert (await mock_db.users.find_one({"email": "solo@example.com"}))["total_point"] == 7
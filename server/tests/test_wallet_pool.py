@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+from config.settings import settings
+from services import job_lease, wallet_pool
+
+
+def _fake_wallets(count):
+    return [{"address": f"0x{i}", "mnemonic": "m", "private_key": "k"} for i in range(count)]
+
+
+async def test_lease_is_exclusive_until_expired(mock_db):
+    assert await job_lease.acquire_lease("job", 60, owner="a")
+    assert not await job_lease.acquire_lease("job", 60, owner="b")
+    # Chủ lease gia hạn được
+    assert await job_lease.acquire_lease("job", 60, owner="a")
+
+    await job_lease.release_lease("job", owner="a")
+    assert await job_lease.acquire_lease("job", 60, owner="b")
+
+    # Lease hết hạn thì owner khác nhận được
+    assert await job_lease.acquire_lease("expiring", -1, owner="a")
+    assert await job_lease.acquire_lease("expiring", 60, owner="b")
+
+
+async def test_refill_skips_when_another_worker_holds_lease(mock_db, monkeypatch):
+    async def generate(count):
+        return _fake_wallets(count)
+
+    monkeypatch.setattr(wallet_pool, "_generate_wallets", generate)
+    await job_lease.acquire_lease(wallet_pool.REFILL_LEASE, 60, owner="other-worker")
+
+    assert await wallet_pool.refill_wallet_pool() == 0
+    assert await mock_db.wallets.count_documents({}) == 0
+
+
+async def test_concurrent_workers_do_not_overfill(mock_db, monkeypatch):
+    monkeypatch.setattr(settings, "WALLET_POOL_SIZE", 30)
+    monkeypatch.setattr(settings, "WALLET_POOL_BATCH_SIZE", 7)
+
+    async def generate(count):
+        await asyncio.sleep(0)
+        return _fake_wallets(count)
+
+    monkeypatch.setattr(wallet_pool, "_generate_wallets", generate)
+
+    # Mỗi task là một "worker" với owner riêng như các process uvicorn khác nhau
+    owner = contextvars.ContextVar("owner")
+    acquire, release = job_lease.acquire_lease, job_lease.release_lease
+    monkeypatch.setattr(wallet_pool, "acquire_lease", lambda name, seconds: acquire(name, seconds, owner.get()))
+    monkeypatch.setattr(wallet_pool, "release_lease", lambda name: release(name, owner.get()))
+
+    async def worker(name):
+        owner.set(name)
+        return await wallet_pool.refill_wallet_pool()
+
+    results = await asyncio.gather(*[worker(f"worker-{i}") for i in range(4)])
+
+    assert sorted(results) == [0, 0, 0, settings.WALLET_POOL_SIZE]
+    assert await mock_db.wallets.count_documents({"status": "available"}) == settings.WALLET_POOL_SIZE
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+from services import week_rollover
+from utils import weekly_utils
+from utils.time_utils import VIETNAM_TZ
+from utils.weekly_utils import get_last_weeks, weekly_points_update
+
+SUNDAY = datetime(2026, 10, 18, 12, 0, tzinfo=VIETNAM_TZ)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [SUNDAY]
+    monkeypatch.setattr(weekly_utils, "get_vietnam_time", lambda: now[0])
+    return now
+
+
+def _week(now):
+    return get_last_weeks(1, now)[0]
+
+
+async def _watermark(db):
+    return (await db.job_checkpoints.find_one({"_id": week_rollover.WATERMARK_ID}))["week"]
+
+
+async def test_first_run_seeds_watermark_without_rolling(mock_db, clock):
+    await mock_db.users.insert_one({"total_point": 50})
+
+    assert await week_rollover.run_week_rollover() is None
+    # Điểm đang có là của tuần hiện tại: không bị đưa vào tuần trước
+    assert (await mock_db.users.find_one({}))["total_point"] == 50
+    assert await mock_db.user_week_history.count_documents({}) == 0
+    assert await _watermark(mock_db) == get_last_weeks(2, SUNDAY)[0]
+    assert await week_rollover.run_week_rollover() is None
+
+
+async def test_done_week_advances_watermark_after_crash(mock_db, clock):
+    await week_rollover.run_week_rollover()
+    week = _week(SUNDAY)
+    await mock_db.job_checkpoints.insert_one({"_id": f"week_rollover:{week}", "week": week, "status": "done"})
+
+    clock[0] = SUNDAY + timedelta(days=1)
+    assert await week_rollover.run_week_rollover() is None
+    assert await _watermark(mock_db) == week
+
+
+# Các test dưới rollover thật (bulk_write UpdateOne, mongomock không chạy được với pymongo hiện tại)
+
+async def test_points_after_the_boundary_stay_in_the_new_week(mongo_db, clock):
+    user_id = (await mongo_db.users.insert_one({"total_point": 0})).inserted_id
+    await week_rollover.run_week_rollover()
+    await mongo_db.users.update_one({"_id": user_id}, {"$inc": weekly_points_update(40, SUNDAY)})
+    # Điểm cộng không qua weekly_points_update tính cho tuần chưa rollover
+    await mongo_db.users.update_one({"_id": user_id}, {"$inc": {"total_point": 10}})
+
+    # 0h30 thứ 2: user đã có điểm tuần mới trước khi job chạy
+    clock[0] = SUNDAY + timedelta(hours=12, minutes=30)
+    await mongo_db.users.update_one({"_id": user_id}, {"$inc": weekly_points_update(7, clock[0])})
+
+    checkpoint = await week_rollover.run_week_rollover()
+    assert checkpoint["week"] == _week(SUNDAY) and checkpoint["rolled"] == 1
+    entry = await mongo_db.user_week_history.find_one({"user_id": str(user_id)})
+    assert (entry["week"], entry["point"]) == (_week(SUNDAY), 50)
+    user = await mongo_db.users.find_one({"_id": user_id})
+    assert (user["total_point"], user["week_points"]) == (7, {_week(clock[0]): 7})
+    assert await _watermark(mongo_db) == _week(SUNDAY)
+
+    # Tuần đã rollover không chạy lại, kể cả khi chỉ định qua CLI
+    assert await week_rollover.run_week_rollover() is None
+    for week in (_week(SUNDAY), get_last_weeks(2, SUNDAY)[0]):
+        with pytest.raises(ValueError):
+            await week_rollover.run_week_rollover(week)
+    assert (await mongo_db.users.find_one({"_id": user_id}))["total_point"] == 7
+    assert (await mongo_db.user_week_history.find_one({"user_id": str(user_id)}))["point"] == 50
+
+
+async def test_missed_weeks_roll_in_order(mongo_db, clock):
+    user_id = (await mongo_db.users.insert_one({"total_point": 0})).inserted_id
+    await week_rollover.run_week_rollover()
+    weeks = [SUNDAY + timedelta(weeks=i) for i in range(3)]
+    for points, now in zip((5, 6, 7), weeks):
+        await mongo_db.users.update_one({"_id": user_id}, {"$inc": weekly_points_update(points, now)})
+
+    clock[0] = weeks[-1]
+    rolled = []
+    while (checkpoint := await week_rollover.run_week_rollover()) is not None:
+        rolled.append(checkpoint["week"])
+
+    assert rolled == [_week(now) for now in weeks[:-1]]
+    history = {e["week"]: e["point"] async for e in mongo_db.user_week_history.find({"user_id": str(user_id)})}
+    assert history == {_week(weeks[0]): 5, _week(weeks[1]): 6}
+    user = await mongo_db.users.find_one({"_id": user_id})
+    assert (user["total_point"], user["week_points"]) == (7, {_week(weeks[-1]): 7})
@@ -0,0 +1,154 @@
+"""
+Lịch tuần memo hoá phải cho kết quả giống hệt bản cũ (trước khi memo) cho mọi ngày 1995-2060.
+Bản cũ được chép nguyên văn bên dưới làm chuẩn so sánh.
+"""
+from datetime import date, datetime, timedelta
+import pytz
+from services.user_stats import load_weekly_stats
+from utils import weekly_utils
+from utils.time_utils import VIETNAM_TZ, to_vietnam_time
+
+FIRST_YEAR, LAST_YEAR = 1995, 2060
+
+
+# --- Bản cũ của utils/weekly_utils.py ---
+
+def _old_get_week_number(date: datetime) -> str:
+    date = to_vietnam_time(date)
+    year = date.year
+    first_day = datetime(year, 1, 1)
+    first_day = to_vietnam_time(first_day)
+    while first_day.weekday() != 0:
+        first_day += timedelta(days=1)
+    delta = date - first_day
+    week = (delta.days // 7) + 1
+    if week > 52:
+        next_year = year + 1
+        next_first_day = datetime(next_year, 1, 1)
+        next_first_day = to_vietnam_time(next_first_day)
+        while next_first_day.weekday() != 0:
+            next_first_day += timedelta(days=1)
+        if date >= next_first_day:
+            return f"{next_year}-01"
+    return f"{year}-{week:02d}"
+
+
+def _old_get_week_dates(week_number: str):
+    year, week = map(int, week_number.split("-"))
+    first_day = datetime(year, 1, 1)
+    first_day = to_vietnam_time(first_day)
+    while first_day.weekday() != 0:
+        first_day += timedelta(days=1)
+    start_date = first_day + timedelta(weeks=week-1)
+    return [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+
+
+def _old_get_last_5_weeks(current_week: str):
+    year, week = map(int, current_week.split("-"))
+    weeks = []
+    for i in range(4, -1, -1):
+        if week - i >= 0:
+            weeks.append(f"{year}-{week-i:02d}")
+        else:
+            prev_year = year - 1
+            prev_week = 52 + (week - i)
+            weeks.append(f"{prev_year}-{prev_week:02d}")
+    return weeks
+
+
+# ---
+
+def _every_day():
+    day = date(FIRST_YEAR, 1, 1)
+    while day.year <= LAST_YEAR:
+        yield day
+        day += timedelta(days=1)
+
+
+def test_week_number_matches_old_implementation_every_day():
+    utc = pytz.utc
+    for day in _every_day():
+        for moment in (
+            datetime(day.year, day.month, day.day, 0, 0),
+            datetime(day.year, day.month, day.day, 23, 59, 59),
+            VIETNAM_TZ.localize(datetime(day.year, day.month, day.day, 12, 0)),
+            # 17:30 UTC là 00:30 ngày hôm sau ở Việt Nam
+            utc.localize(datetime(day.year, day.month, day.day, 17, 30)),
+        ):
+            assert weekly_utils.get_week_number(moment) == _old_get_week_number(moment), moment
+
+
+def test_week_dates_match_old_implementation_every_week():
+    for year in range(FIRST_YEAR, LAST_YEAR + 1):
+        for week in range(0, 54):
+            label = f"{year}-{week:02d}"
+            assert weekly_utils.get_week_dates(label) == _old_get_week_dates(label), label
+
+
+def test_week_dates_contain_their_days():
+    for day in _every_day():
+        label = weekly_utils.week_of_date(day)
+        dates = weekly_utils.get_week_dates(label)
+        # Tuần 00 bắt đầu ở thứ 2 của năm trước; mọi ngày khác nằm đúng trong tuần của nó
+        assert day.strftime("%Y-%m-%d") in dates, (day, label)
+
+
+def test_last_weeks_match_old_implementation_inside_a_year():
+    """Trong năm (tuần >= 5) bản cũ đúng; qua năm mới bản cũ giả định 52 tuần nên chỉ so sánh ở đây"""
+    for day in _every_day():
+        now = VIETNAM_TZ.localize(datetime(day.year, day.month, day.day, 9, 0))
+        current = _old_get_week_number(now)
+        if int(current.split("-")[1]) < 5:
+            continue
+        assert weekly_utils.get_last_weeks(5, now) == _old_get_last_5_weeks(current), day
+
+
+def test_last_weeks_are_consecutive_mondays_across_years():
+    for day in _every_day():
+        now = VIETNAM_TZ.localize(datetime(day.year, day.month, day.day, 9, 0))
+        weeks = weekly_utils.get_last_weeks(5, now)
+        # Mỗi tuần mang nhãn theo thứ 2 của nó (ngày thuộc tuần 00 mang nhãn tuần cuối năm trước)
+        assert weeks[-1] == weekly_utils.week_of_date(day - timedelta(days=day.weekday()))
+        mondays = [date.fromisoformat(weekly_utils.get_week_dates(week)[0]) for week in weeks]
+        assert all(b - a == timedelta(weeks=1) for a, b in zip(mondays, mondays[1:])), (day, weeks)
+        assert len(set(weeks)) == 5
+        # Rollover so sánh nhãn dạng chuỗi và đi tuần kế tiếp bằng next_week
+        assert weeks == sorted(weeks)
+        assert all(weekly_utils.next_week(a) == b for a, b in zip(weeks, weeks[1:])), (day, weeks)
+
+
+def test_weekly_stats_layout():
+    now = VIETNAM_TZ.localize(datetime(2026, 1, 2, 9, 0))
+    user = {
+        "total_point": 7,
+        "week_history": [{"week": "2025-51", "point": 3}],
+        "weekly_logins": {"2026-00": {"2026-01-01": {"login": True}}, "2025-52": {"2025-12-29": {"login": True}}},
+    }
+    stats = weekly_utils.get_weekly_stats(user, now)
+
+    assert [week["week"] for week in stats] == ["2025-48", "2025-49", "2025-50", "2025-51", "2025-52"]
+    assert [week["total_points"] for week in stats] == [0, 0, 0, 3, 7]
+    # Tuần vắt qua năm mới: ngày 2026 được đọc từ nhãn 2026-00
+    logins = {d["date"]: d["has_login"] for d in stats[-1]["dates"]}
+    assert logins["2025-12-29"] and logins["2026-01-01"]
+    assert not logins["2025-12-30"]
+
+
+async def test_weekly_stats_for_many_users_in_one_batch(mock_db):
+    now = VIETNAM_TZ.localize(datetime(2026, 1, 2, 9, 0))
+    weeks = weekly_utils.get_last_weeks(5, now)
+    result = await mock_db.users.insert_many([
+        {"total_point": i, "weekly_logins": {weeks[-1]: {"2025-12-29": {"login": True}}} if i % 2 else {}}
+        for i in range(5)
+    ])
+    user_ids = [str(user_id) for user_id in result.inserted_ids]
+    await mock_db.user_week_history.insert_many([
+        {"user_id": user_id, "week": weeks[3], "point": 10 + i} for i, user_id in enumerate(user_ids)
+    ])
+
+    stats = await load_weekly_stats(user_ids + ["64b7f0c2a1b2c3d4e5f60718", "bad-id"], now)
+
+    assert set(stats) == set(user_ids)
+    for i, user_id in enumerate(user_ids):
+        assert [week["total_points"] for week in stats[user_id]] == [0, 0, 0, 10 + i, i]
+        assert stats[user_id][-1]["dates"][0]["has_login"] == bool(i % 2)
@@ -0,0 +1,23 @@
+from typing import Any, Optional
+from config.settings import settings
+from models.user import AuthPrincipal
+from utils.cache import TTLCache
+
+# Cache user đã xác thực theo user_id, tránh find_one trên mỗi request
+user_cache = TTLCache(
+    max_size=settings.AUTH_USER_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL,
+)
+
+
+def get_cached_user(user_id: str) -> Optional[AuthPrincipal]:
+    return user_cache.get(str(user_id))
+
+
+def cache_user(user_id: str, user: AuthPrincipal) -> None:
+    user_cache.set(str(user_id), user)
+
+
+def invalidate_user(user_id: Any) -> None:
+    """Gọi sau mỗi lần ghi vào document user để request sau đọc lại từ DB"""
+    user_cache.invalidate(str(user_id))
@@ -1,28 +1,23 @@
 import smtplib
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Optional
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-def send_verification_email(email: str, token: str):
+# Email settings
+SMTP_EMAIL = os.getenv("SMTP_EMAIL")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+
+def build_verification_email(email: str, token: str) -> dict:
     """
-    Gửi email xác thực cho người dùng mới
+    Tạo nội dung email xác thực (lưu được vào outbox)
     """
-    # Email settings
-    sender_email = os.getenv("SMTP_EMAIL")
-    sender_password = os.getenv("SMTP_PASSWORD")
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-
-    # Create message
-    msg = MIMEMultipart()
-    msg['From'] = sender_email
-    msg['To'] = email
-    msg['Subject'] = "Xác thực tài khoản RepAI-Kickin"
-
-    # Email body
     verification_link = f"http://localhost:3000/verify-email?token={token}"
     body = f"""
     Xin chào!
@@ -37,21 +32,98 @@ def send_verification_email(email: str, token: str):
     Trân trọng,
     Team RepAI-Kickin
     """
+    return {
+        "to": email,
+        "subject": "Xác thực tài khoản RepAI-Kickin",
+        "body": body,
+    }
 
+def build_mime_message(to: str, subject: str, body: str, sender: Optional[str] = None) -> str:
+    msg = MIMEMultipart()
+    msg['From'] = sender or SMTP_EMAIL
+    msg['To'] = to
+    msg['Subject'] = subject
     msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+
+class SMTPConnection:
+    """
+    Kết nối SMTP dùng lại giữa nhiều lần gửi (STARTTLS + login chỉ một lần).
+    Tự đóng khi idle quá `idle_timeout` giây, tự mở lại khi gửi tiếp.
+    Không thread-safe: chỉ dùng từ một sender tại một thời điểm.
+    Mặc định lấy server / tài khoản từ biến môi trường SMTP_*.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 60,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = True,
+        from_addr: Optional[str] = None,
+    ):
+        self.idle_timeout = idle_timeout
+        self.host = host or SMTP_SERVER
+        self.port = port or SMTP_PORT
+        self.username = username if username is not None else SMTP_EMAIL
+        self.password = password if password is not None else SMTP_PASSWORD
+        self.starttls = starttls
+        self.from_addr = from_addr or self.username
+        self._server: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
 
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _sendmail(self, to: str, subject: str, body: str) -> None:
+        message = build_mime_message(to, subject, body, self.from_addr)
+        self._server.sendmail(self.from_addr, to, message)
+
+    def send(self, to: str, subject: str, body: str) -> None:
+        """Gửi một email; ném exception nếu thất bại để caller retry"""
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+        if self._server is None:
+            self._server = self._connect()
+
+        try:
+            self._sendmail(to, subject, body)
+        except smtplib.SMTPServerDisconnected:
+            # Server đã đóng kết nối idle: mở lại và thử đúng một lần nữa
+            self._server = self._connect()
+            self._sendmail(to, subject, body)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+def send_verification_email(email: str, token: str):
+    """
+    Gửi email xác thực cho người dùng mới (đồng bộ, mở kết nối riêng).
+    Luồng đăng ký dùng outbox trong services.email_outbox thay vì hàm này.
+    """
+    message = build_verification_email(email, token)
+    connection = SMTPConnection()
     try:
-        # Create SMTP session
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        
-        # Send email
-        text = msg.as_string()
-        server.sendmail(sender_email, email, text)
-        server.quit()
-        
+        connection.send(message["to"], message["subject"], message["body"])
         return True
     except Exception as e:
         print(f"Error sending email: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+    finally:
+        connection.close()
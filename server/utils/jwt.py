@@ -1,10 +1,20 @@
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-import os
+import hashlib
+import time
+from config.settings import settings
+from utils.cache import TTLCache
 
-SECRET_KEY = os.getenv("JWT_KEY", "default_secret_key")
-ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = 180  # 3 giờ
+# Nguồn cấu hình JWT duy nhất: config.settings
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
+
+# Cache token đã verify: sha256(token) -> claims, hết hạn không muộn hơn claim exp
+verified_token_cache = TTLCache(
+    max_size=settings.JWT_CACHE_MAX_SIZE,
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -13,9 +23,33 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_scoped_token(user_id: str, scope: str, ttl_seconds: int, **claims) -> str:
+    """
+    Token ngắn hạn chỉ dùng được cho route có đúng `scope` (xem QUERY_TOKEN_ROUTES trong
+    middleware.jwt_auth), vd. SSE guild events: EventSource không gửi được header Authorization
+    nên token đi qua query string.
+    """
+    return create_access_token({"_id": user_id, "scope": scope, **claims}, timedelta(seconds=ttl_seconds))
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify chữ ký và trả về claims, dùng cache để không verify lại cùng một token.
+    Ném JWTError nếu token không hợp lệ. Claims trả về dùng chung, không được sửa.
+    """
+    cache_key = hashlib.sha256(token.encode()).digest()
+    payload = verified_token_cache.get(cache_key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    exp = payload.get("exp")
+    # Token không có exp thì không cache, lần sau verify lại
+    if isinstance(exp, (int, float)):
+        verified_token_cache.set(cache_key, payload, ttl=exp - time.time())
+    return payload
+
 def verify_access_token(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        return decode_access_token(token)
     except JWTError:
-        return None 
\ No newline at end of file
+        return None 
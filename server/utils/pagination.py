@@ -0,0 +1,28 @@
+import base64
+import json
+from typing import Any, List
+
+# Các endpoint danh sách trả list như cũ; cursor trang sau nằm trong header này
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Đóng gói các giá trị sort key của item cuối trang thành cursor opaque"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidCursor("Cursor không hợp lệ")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Cursor không hợp lệ")
+    return values
+
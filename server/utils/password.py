@@ -1,9 +1,146 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
 from passlib.context import CryptContext
+from config.settings import settings
+from utils.logger import api_logger
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PasswordHashQueueFull(Exception):
+    """Hàng đợi hash mật khẩu đã đầy, request nên được từ chối (503)"""
+
+
+def _build_context(rounds: int) -> CryptContext:
+    # min/max = rounds để verify_and_update rehash khi cost thay đổi (cả tăng lẫn giảm)
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+bcrypt_rounds = settings.PASSWORD_BCRYPT_ROUNDS
+pwd_context = _build_context(bcrypt_rounds)
+
+def configure_bcrypt_rounds(rounds: int) -> None:
+    global bcrypt_rounds, pwd_context
+    bcrypt_rounds = rounds
+    pwd_context = _build_context(rounds)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password) 
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int = 10, max_rounds: int = 16) -> int:
+    """
+    Chọn cost bcrypt lớn nhất mà một lần hash trên máy này không vượt quá target_ms.
+    Mỗi lần tăng 1 round thì thời gian tăng gấp đôi, nên chỉ cần đo một lần ở min_rounds.
+    """
+    context = _build_context(min_rounds)
+    start = time.perf_counter()
+    context.hash("calibration-password")
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if elapsed_ms <= 0 or elapsed_ms >= target_ms:
+        return min_rounds
+    extra = int(math.floor(math.log2(target_ms / elapsed_ms)))
+    return max(min_rounds, min(max_rounds, min_rounds + extra))
+
+
+class PasswordHasher:
+    """
+    Chạy bcrypt trên thread pool riêng (bcrypt nhả GIL) để không block event loop.
+    Số job đang chờ/chạy bị giới hạn bởi max_pending; vượt quá thì từ chối ngay.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHashQueueFull("Password hashing queue is full")
+
+        submitted_at = time.perf_counter()
+        started_at = submitted_at
+
+        def job():
+            nonlocal started_at
+            started_at = time.perf_counter()
+            return fn(*args)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), job)
+        finally:
+            finished_at = time.perf_counter()
+            self.pending -= 1
+            self.completed += 1
+            self.total_wait_ms += (started_at - submitted_at) * 1000
+            self.total_run_ms += (finished_at - started_at) * 1000
+            self.max_latency_ms = max(self.max_latency_ms, (finished_at - submitted_at) * 1000)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.completed or 1
+        return {
+            "workers": self.workers,
+            "bcrypt_rounds": bcrypt_rounds,
+            "queue_depth": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / done, 2),
+            "avg_run_ms": round(self.total_run_ms / done, 2),
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Trả về (hợp lệ, hash mới nếu cần rehash theo cost hiện tại)"""
+    return await password_hasher.run(_verify_and_update, plain_password, hashed_password)
+
+async def init_password_hasher() -> None:
+    """Gọi khi startup: calibrate cost bcrypt nếu có cấu hình PASSWORD_HASH_TARGET_MS"""
+    target_ms = settings.PASSWORD_HASH_TARGET_MS
+    if not target_ms:
+        return
+    rounds = await password_hasher.run(calibrate_bcrypt_rounds, target_ms)
+    configure_bcrypt_rounds(rounds)
+    api_logger.info(f"🔐 bcrypt rounds calibrated to {rounds} (target {target_ms}ms)")
+
+def close_password_hasher() -> None:
+    password_hasher.shutdown()
@@ -0,0 +1,67 @@
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import parse_qsl
+from config.settings import settings
+from utils.cache import TTLCache
+
+# Allowlist các path được cache và tag của chúng. Chỉ cache path có hook invalidate:
+# mọi ghi vào guild / guild_stats đều gọi invalidate_cache_tag("guilds"). Path public khác
+# (leaderboard người chơi, /api/users/{id}, skills) thay đổi mà không invalidate nên không cache.
+CACHEABLE_PATHS: Dict[str, str] = {
+    "/api/guild/explore": "guilds",
+    "/api/guild/search": "guilds",
+    "/api/guild/leaderboard": "guilds",
+}
+
+CachedResponse = Tuple[int, list, bytes]  # (status, raw headers, body)
+
+
+def _normalize_path(path: str) -> str:
+    return path.rstrip("/") or "/"
+
+
+def tag_for_path(path: str) -> Optional[str]:
+    """Tag của path nếu path nằm trong allowlist cache, None nếu không được cache"""
+    return CACHEABLE_PATHS.get(_normalize_path(path))
+
+
+class ResponseCache:
+    """
+    LRU + TTL cho response của các GET public trong CACHEABLE_PATHS, key theo path + query
+    đã chuẩn hoá.
+    Invalidate theo tag bằng cách tăng "generation" của tag: key cũ không còn được
+    tra tới và tự bị đẩy ra bởi LRU/TTL, nên invalidate là O(1).
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._store = TTLCache(max_size=max_size, ttl=ttl)
+        self._generations: Dict[str, int] = {}
+        self.invalidations = 0
+
+    def make_key(self, path: str, query_string: bytes) -> Hashable:
+        path = _normalize_path(path)
+        query = tuple(sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)))
+        tag = tag_for_path(path)
+        return (tag, self._generations.get(tag, 0), path, query)
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        return self._store.get(key)
+
+    def set(self, key: Hashable, response: CachedResponse) -> None:
+        self._store.set(key, response)
+
+    def invalidate_tag(self, tag: str) -> None:
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._store.clear()
+
+    def stats(self) -> dict:
+        return {**self._store.stats(), "invalidations": self.invalidations}
+
+
+response_cache = ResponseCache(max_size=settings.CACHE_MAX_SIZE, ttl=settings.CACHE_TTL)
+
+
+def invalidate_cache_tag(tag: str) -> None:
+    response_cache.invalidate_tag(tag)
@@ -0,0 +1,65 @@
+import re
+import unicodedata
+from typing import Iterable, List, Optional
+
+# Độ dài prefix tối đa được lưu cho mỗi từ; từ khoá dài hơn bị cắt về độ dài này
+MAX_PREFIX_LENGTH = 15
+# Chỉ index chừng này từ đầu của description để giới hạn kích thước document
+MAX_DESCRIPTION_WORDS = 30
+MAX_QUERY_TERMS = 5
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d), gộp khoảng trắng"""
+    if not text:
+        return ""
+    text = text.lower().replace("đ", "d")
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(_WORD_RE.findall(text))
+
+
+def normalize_name(text: Optional[str]) -> str:
+    """
+    Như normalize_text; nếu không còn ký tự chữ/số nào (tên toàn ký hiệu, emoji, chữ ngoài
+    bảng latin) thì dùng chữ thường gộp khoảng trắng để tên vẫn so khớp được nguyên tên / prefix
+    """
+    return normalize_text(text) or " ".join((text or "").lower().split())
+
+
+def _prefixes(words: Iterable[str]) -> List[str]:
+    tokens = set()
+    for word in words:
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            tokens.add(word[:length])
+    return sorted(tokens)
+
+
+def build_search_fields(guild_name: str, description: Optional[str]) -> dict:
+    """
+    Các field phục vụ search lưu kèm guild:
+    - name_normalized: tên đã chuẩn hoá (so khớp chính xác / prefix của cả tên), xem normalize_name
+    - name_tokens: prefix của từng từ trong tên (dùng để chấm điểm)
+    - search_tokens: name_tokens + prefix các từ trong description (có multikey index)
+    """
+    name_normalized = normalize_name(guild_name)
+    name_words = normalize_text(guild_name).split()
+    description_words = normalize_text(description).split()[:MAX_DESCRIPTION_WORDS]
+    name_tokens = _prefixes(name_words)
+    return {
+        "name_normalized": name_normalized,
+        "name_tokens": name_tokens,
+        "search_tokens": sorted(set(name_tokens) | set(_prefixes(description_words))),
+    }
+
+
+def search_terms(keyword: str) -> List[str]:
+    """Tách từ khoá thành các term đã chuẩn hoá, khớp được với search_tokens"""
+    terms = []
+    for word in normalize_text(keyword).split():
+        term = word[:MAX_PREFIX_LENGTH]
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_QUERY_TERMS]
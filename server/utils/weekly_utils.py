@@ -1,36 +1,37 @@
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from utils.time_utils import get_vietnam_time, to_vietnam_time, format_vietnam_time
 
+# Lịch tuần (giờ Việt Nam), tính sẵn và memo theo năm. Quy ước giữ nguyên như trước:
+# tuần 01 bắt đầu từ thứ 2 đầu tiên của năm, các ngày trước đó thuộc tuần 00 và cuối năm
+# có thể có tuần 53. Nhãn YYYY-WW luôn theo năm dương lịch của ngày (key của weekly_logins).
+
+@lru_cache(maxsize=None)
+def _first_monday(year: int) -> date:
+    first_day = date(year, 1, 1)
+    return first_day + timedelta(days=(7 - first_day.weekday()) % 7)
+
+@lru_cache(maxsize=None)
+def _year_weeks(year: int) -> Dict[int, Tuple[str, ...]]:
+    """Tuần -> 7 ngày (YYYY-MM-DD) của mọi tuần trong năm, từ tuần 00 tới tuần cuối"""
+    first_monday = _first_monday(year)
+    last_week = (date(year, 12, 31) - first_monday).days // 7 + 1
+    return {
+        week: tuple(
+            (first_monday + timedelta(weeks=week - 1, days=i)).strftime("%Y-%m-%d") for i in range(7)
+        )
+        for week in range(0, last_week + 1)
+    }
+
+def week_of_date(day: date) -> str:
+    """Nhãn tuần YYYY-WW của một ngày theo lịch Việt Nam"""
+    week = (day - _first_monday(day.year)).days // 7 + 1
+    return f"{day.year}-{week:02d}"
+
 def get_week_number(date: datetime) -> str:
     """Lấy số tuần trong năm theo định dạng YYYY-WW"""
-    # Chuyển đổi về giờ Việt Nam
-    date = to_vietnam_time(date)
-    
-    # Tính tuần dựa trên ngày đầu tiên của năm
-    year = date.year
-    first_day = datetime(year, 1, 1)
-    first_day = to_vietnam_time(first_day)
-    
-    # Điều chỉnh để ngày đầu tiên là thứ 2
-    while first_day.weekday() != 0:
-        first_day += timedelta(days=1)
-    
-    # Tính số tuần
-    delta = date - first_day
-    week = (delta.days // 7) + 1
-    
-    # Nếu tuần > 52, có thể là tuần đầu tiên của năm sau
-    if week > 52:
-        next_year = year + 1
-        next_first_day = datetime(next_year, 1, 1)
-        next_first_day = to_vietnam_time(next_first_day)
-        while next_first_day.weekday() != 0:
-            next_first_day += timedelta(days=1)
-        if date >= next_first_day:
-            return f"{next_year}-01"
-    
-    return f"{year}-{week:02d}"
+    return week_of_date(to_vietnam_time(date).date())
 
 def get_current_week() -> str:
     """Lấy tuần hiện tại"""
@@ -39,85 +40,143 @@ def get_current_week() -> str:
 def get_week_dates(week_number: str) -> List[str]:
     """Lấy danh sách các ngày trong tuần theo định dạng YYYY-MM-DD"""
     year, week = map(int, week_number.split("-"))
-    
-    # Tìm ngày đầu tiên của năm
-    first_day = datetime(year, 1, 1)
-    first_day = to_vietnam_time(first_day)
-    
-    # Điều chỉnh để ngày đầu tiên là thứ 2
-    while first_day.weekday() != 0:
-        first_day += timedelta(days=1)
-    
-    # Tính ngày đầu tiên của tuần cần tìm
-    start_date = first_day + timedelta(weeks=week-1)
-    
-    # Tạo danh sách 7 ngày trong tuần
-    return [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    dates = _year_weeks(year).get(week)
+    if dates is None:
+        start_date = _first_monday(year) + timedelta(weeks=week - 1)
+        return [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(7)]
+    return list(dates)
+
+def get_last_weeks(count: int = 5, now: Optional[datetime] = None) -> List[str]:
+    """
+    count tuần gần nhất (cũ -> mới), bao gồm tuần hiện tại. Lùi theo thứ 2 của từng tuần nên
+    qua năm mới đúng cả với năm có 53 tuần; mỗi tuần mang nhãn của ngày thứ 2 của nó.
+    """
+    today = (to_vietnam_time(now) if now else get_vietnam_time()).date()
+    monday = today - timedelta(days=today.weekday())
+    return [week_of_date(monday - timedelta(weeks=i)) for i in range(count - 1, -1, -1)]
+
+def get_current_month_weeks(now: Optional[datetime] = None) -> Tuple[str, List[str]]:
+    """
+    Tháng (YYYY-MM) của tuần hiện tại, tính theo ngày thứ 2 của tuần, và nhãn các tuần có
+    thứ 2 nằm trong tháng đó (tới tuần hiện tại)
+    """
+    today = (to_vietnam_time(now) if now else get_vietnam_time()).date()
+    monday = today - timedelta(days=today.weekday())
+    weeks = []
+    day = monday
+    while day.month == monday.month:
+        weeks.append(week_of_date(day))
+        day -= timedelta(weeks=1)
+    return monday.strftime("%Y-%m"), weeks[::-1]
 
 def get_last_5_weeks() -> List[str]:
     """Lấy danh sách 5 tuần gần nhất, bao gồm tuần hiện tại"""
-    current_week = get_current_week()
-    year, week = map(int, current_week.split("-"))
-    weeks = []
-    
-    for i in range(4, -1, -1):  # 4 tuần trước + tuần hiện tại
-        if week - i >= 0:
-            weeks.append(f"{year}-{week-i:02d}")
-        else:
-            # Nếu tuần trước thuộc năm trước
-            prev_year = year - 1
-            prev_week = 52 + (week - i)  # 52 tuần trong năm
-            weeks.append(f"{prev_year}-{prev_week:02d}")
-    
-    return weeks
-
-def update_weekly_login(user_data: Dict, points: int = 0) -> Dict:
-    """Cập nhật thông tin đăng nhập theo tuần"""
-    current_date = get_vietnam_time()
+    return get_last_weeks(5)
+
+def weekly_login_update(points: int = 0, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    $set ghi nhận đăng nhập hôm nay bằng dotted path `weekly_logins.<tuần>.<ngày>`:
+    chỉ ghi một field, không cần đọc/ghi lại cả map weekly_logins
+    """
+    current_date = to_vietnam_time(now) if now else get_vietnam_time()
     current_week = get_week_number(current_date)
     current_date_str = current_date.strftime("%Y-%m-%d")
-    
-    # Khởi tạo weekly_logins nếu chưa có
-    if "weekly_logins" not in user_data:
-        user_data["weekly_logins"] = {}
-    
-    # Xóa dữ liệu cũ của ngày hiện tại trong tất cả các tuần
-    for week in list(user_data["weekly_logins"].keys()):
-        if current_date_str in user_data["weekly_logins"][week]:
-            del user_data["weekly_logins"][week][current_date_str]
-    
-    # Khởi tạo dữ liệu cho tuần hiện tại nếu chưa có
-    if current_week not in user_data["weekly_logins"]:
-        user_data["weekly_logins"][current_week] = {}
-    
-    # Ghi nhận đăng nhập cho ngày hiện tại, lưu cả điểm
-    user_data["weekly_logins"][current_week][current_date_str] = {"login": True, "points": points}
-    
-    return user_data
-
-def get_weekly_stats(user_data: Dict) -> List[Dict]:
-    """Lấy thống kê đăng nhập của 5 tuần gần nhất"""
-    weeks = get_last_5_weeks()
-    stats = []
+    return {
+        f"weekly_logins.{current_week}.{current_date_str}": {"login": True, "points": points},
+        "last_login_week": current_week,
+    }
+
+def weekly_points_update(points: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    $inc cộng điểm tuần: total_point và `week_points.<tuần>` cùng lúc. Nhãn tuần theo thứ 2
+    của tuần (như rollover) để rollover biết phần nào của total_point thuộc tuần đã kết thúc.
+    """
+    week = get_last_weeks(1, now)[0]
+    return {"total_point": points, f"week_points.{week}": points}
+
+def next_week(week_number: str) -> str:
+    """Nhãn của tuần ngay sau tuần `week_number` (theo thứ 2 của tuần)"""
+    monday = datetime.strptime(get_week_dates(week_number)[0], "%Y-%m-%d").date()
+    return week_of_date(monday + timedelta(weeks=1))
+
+def weekly_login_retention_cutoff() -> str:
+    """Tuần cũ nhất còn giữ chi tiết: tuần đầu trong 5 tuần mà get_weekly_stats hiển thị"""
+    return get_last_5_weeks()[0]
+
+def weekly_login_compaction_pipeline(cutoff_week: str) -> List[Dict[str, Any]]:
+    """
+    Update pipeline (chạy trên server, không read-modify-write) gộp các tuần cũ hơn
+    cutoff_week trong weekly_logins vào weekly_login_summary:
+    {"weeks": số tuần, "days": số ngày đăng nhập, "points": tổng điểm, "last_week": tuần mới nhất đã gộp}
+    Key tuần dạng YYYY-WW nên so sánh chuỗi đúng thứ tự thời gian.
+    """
+    old_days = {"$objectToArray": "$$week.v"}
+    return [
+        {"$set": {"_weeks": {"$objectToArray": {"$ifNull": ["$weekly_logins", {}]}}}},
+        {"$set": {"_old": {"$filter": {"input": "$_weeks", "as": "week", "cond": {"$lt": ["$$week.k", cutoff_week]}}}}},
+        {"$set": {
+            "weekly_logins": {"$arrayToObject": {
+                "$filter": {"input": "$_weeks", "as": "week", "cond": {"$gte": ["$$week.k", cutoff_week]}}
+            }},
+            "weekly_login_summary": {"$cond": [
+                {"$eq": [{"$size": "$_old"}, 0]},
+                "$weekly_login_summary",
+                {
+                    "weeks": {"$add": [{"$ifNull": ["$weekly_login_summary.weeks", 0]}, {"$size": "$_old"}]},
+                    "days": {"$add": [
+                        {"$ifNull": ["$weekly_login_summary.days", 0]},
+                        {"$sum": {"$map": {"input": "$_old", "as": "week", "in": {"$size": old_days}}}},
+                    ]},
+                    "points": {"$add": [
+                        {"$ifNull": ["$weekly_login_summary.points", 0]},
+                        {"$sum": {"$map": {"input": "$_old", "as": "week", "in": {"$sum": {"$map": {
+                            "input": old_days, "as": "day", "in": {"$ifNull": ["$$day.v.points", 0]},
+                        }}}}}},
+                    ]},
+                    "last_week": {"$max": ["$weekly_login_summary.last_week", {"$max": "$_old.k"}]},
+                },
+            ]},
+        }},
+        {"$unset": ["_weeks", "_old"]},
+    ]
+
+def _weeks_layout(weeks: List[str]) -> List[Tuple[str, List[Tuple[str, str]]]]:
+    """Mỗi tuần: các (ngày, nhãn tuần lưu ngày đó trong weekly_logins)"""
+    layout = []
+    for week in weeks:
+        days = []
+        for day in get_week_dates(week):
+            # Tuần vắt qua năm mới: ngày của năm kia được lưu dưới nhãn tuần khác
+            days.append((day, week_of_date(datetime.strptime(day, "%Y-%m-%d").date())))
+        layout.append((week, days))
+    return layout
+
+def _weekly_stats(user_data: Dict, layout: List[Tuple[str, List[Tuple[str, str]]]]) -> List[Dict]:
     week_history_map = {w['week']: w['point'] for w in user_data.get('week_history', [])}
+    weekly_logins = user_data.get("weekly_logins") or {}
     total_point = user_data.get("total_point", 0)
-    for idx, week in enumerate(weeks):
-        week_dates = get_week_dates(week)
+    stats = []
+    for idx, (week, days) in enumerate(layout):
         # Lấy điểm tuần từ week_history nếu có, tuần hiện tại thì lấy total_point
-        if idx == len(weeks) - 1:
+        if idx == len(layout) - 1:
             week_point = total_point
         else:
             week_point = week_history_map.get(week, 0)
-        week_data = {
+        stats.append({
             "week": week,
-            "dates": [],
-            "total_points": week_point
-        }
-        for date in week_dates:
-            has_login = bool(user_data.get("weekly_logins", {}).get(week, {}).get(date, False))
-            week_data["dates"].append({
-                "date": date,
-                "has_login": has_login
-            })
-        stats.append(week_data)
-    return stats 
\ No newline at end of file
+            "dates": [
+                {"date": day, "has_login": bool(weekly_logins.get(stored_week, {}).get(day, False))}
+                for day, stored_week in days
+            ],
+            "total_points": week_point,
+        })
+    return stats
+
+def get_weekly_stats_batch(users: Iterable[Dict], now: Optional[datetime] = None) -> List[List[Dict]]:
+    """Thống kê 5 tuần cho nhiều user: lịch tuần chỉ tính một lần cho cả batch"""
+    layout = _weeks_layout(get_last_weeks(5, now))
+    return [_weekly_stats(user_data, layout) for user_data in users]
+
+def get_weekly_stats(user_data: Dict, now: Optional[datetime] = None) -> List[Dict]:
+    """Lấy thống kê đăng nhập của 5 tuần gần nhất"""
+    return get_weekly_stats_batch([user_data], now)[0]